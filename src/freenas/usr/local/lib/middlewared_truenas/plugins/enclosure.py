@@ -10,7 +10,7 @@ import os
 import re
 import subprocess
 
-from middlewared.schema import Dict, Int, Str, accepts
+from middlewared.schema import Dict, Int, List, Str, accepts
 from middlewared.service import CallError, CRUDService, filterable, private
 from middlewared.service_exception import MatchNotFound
 import middlewared.sqlalchemy as sa
@@ -223,6 +223,40 @@ class EnclosureService(CRUDService):
         if disk_enclosure != disk['enclosure']:
             self.middleware.call_sync('disk.update', id, {'enclosure': disk_enclosure})
 
+    @private
+    @accepts(List("ids", items=[Str("id")]))
+    def sync_disks(self, ids):
+        """
+        Same as `sync_disk` for multiple disks at once, querying enclosures only once.
+        """
+        if not ids:
+            return
+
+        disk_enclosures = {}
+        for enclosure in self.middleware.call_sync("enclosure.query"):
+            for element in enclosure["elements"]:
+                if element["name"] != "Array Device Slot":
+                    continue
+
+                for slot in element["elements"]:
+                    device = slot["data"].get("Device")
+                    if device:
+                        disk_enclosures.setdefault(device, {
+                            "number": enclosure["number"],
+                            "slot": slot["slot"],
+                        })
+
+                break
+
+        for disk in self.middleware.call_sync(
+            'disk.query',
+            [['identifier', 'in', ids]],
+            {"extra": {'include_expired': True}}
+        ):
+            disk_enclosure = disk_enclosures.get(disk["name"])
+            if disk_enclosure != disk['enclosure']:
+                self.middleware.call_sync('disk.update', disk['identifier'], {'enclosure': disk_enclosure})
+
     @private
     @accepts(Str("pool", null=True, default=None))
     def sync_zpool(self, pool):
@@ -20,7 +20,7 @@ class VolumeVersionAlertSource(AlertSource):
 
     async def check(self):
         alerts = []
-        for pool in await self.middleware.call("pool.query"):
+        for pool in await self.middleware.call("pool.query", [], {"select": ["id", "name"]}):
             if not await self.middleware.call("pool.is_upgraded", pool["id"]):
                 alerts.append(Alert(
                     VolumeVersionAlertClass,
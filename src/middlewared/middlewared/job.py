@@ -345,6 +345,8 @@ class Job(object):
 
     def abort(self):
         if self.loop is not None and self.future is not None:
+            # Synchronous methods running in a thread can't be cancelled, they should check `aborted` themselves
+            self.aborted = True
             self.loop.call_soon_threadsafe(self.future.cancel)
         elif self.state == State.WAITING:
             self.aborted = True
@@ -369,7 +371,8 @@ class Job(object):
 
             self.future = asyncio.ensure_future(self.__run_body())
             try:
-                await self.future
+                with self.middleware.method_stats.measure(self.method_name, 'job'):
+                    await self.future
             except Exception as e:
                 handled = adapt_exception(e)
                 if handled is not None:
@@ -10,6 +10,8 @@ from .service_exception import adapt_exception, CallError, CallException, Valida
 from .utils import osc, start_daemon_thread, sw_version
 from .utils.debug import get_frame_details, get_threads_stacks
 from .utils.lock import SoftHardSemaphore, SoftHardSemaphoreLimit
+from .utils.loop_monitor import LoopMonitor
+from .utils.method_stats import MethodStats
 from .utils.io_thread_pool_executor import IoThreadPoolExecutor
 from .utils.plugins import LoadPluginsMixin
 from .utils.profile import profile_wrap
@@ -39,7 +41,6 @@ import itertools
 import multiprocessing
 import os
 import pickle
-import re
 import queue
 import setproctitle
 import signal
@@ -792,6 +793,13 @@ class ShellApplication(object):
         await self.middleware.run_in_thread(t_worker.join)
 
 
+# Bounds of isolated thread pools used by services and methods prone to bursts of slow calls
+THREAD_POOLS = {
+    'device': {'min_workers': 1, 'max_workers': 8},
+}
+THREAD_POOLS_DEFAULT = {'min_workers': 1, 'max_workers': 10}
+
+
 class PreparedCall:
     def __init__(self, args=None, executor=None, job=None):
         self.args = args
@@ -805,7 +813,7 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
 
     def __init__(
         self, loop_debug=False, loop_monitor=True, overlay_dirs=None, debug_level=None,
-        log_handler=None, startup_seq_path=None,
+        log_handler=None, startup_seq_path=None, thread_pools=None,
         log_format='[%(asctime)s] (%(levelname)s) %(name)s.%(funcName)s():%(lineno)d - %(message)s'
     ):
         super().__init__(overlay_dirs)
@@ -825,6 +833,13 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
         self.app = None
         self.loop = None
         self.run_in_thread_executor = IoThreadPoolExecutor('IoThread', 20)
+        self.__thread_pools = {}
+        # `thread_pools` overrides bounds of the isolated thread pools (e.g. `{'device': {'max_workers': 16}}`)
+        self.__thread_pools_bounds = dict(THREAD_POOLS, **{
+            name: dict(THREAD_POOLS.get(name, THREAD_POOLS_DEFAULT), **bounds)
+            for name, bounds in (thread_pools or {}).items()
+        })
+        self.__thread_pools_lock = threading.Lock()
         self.__thread_id = threading.get_ident()
         # Spawn new processes for ProcessPool instead of forking
         multiprocessing.set_start_method('spawn')
@@ -843,6 +858,8 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
         self.__console_io = False if os.path.exists(self.CONSOLE_ONCE_PATH) else None
         self.__terminate_task = None
         self.jobs = JobsQueue(self)
+        self.method_stats = MethodStats()
+        self.loop_lag = LoopMonitor()
 
     def __init_services(self):
         from middlewared.service import CoreService
@@ -1146,6 +1163,28 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
         """
         return await self.run_in_executor(self.__ws_threadpool, method, *args, **kwargs)
 
+    def get_thread_pool(self, name):
+        """
+        Returns isolated thread pool `name` (as used by `@threaded('name')` or service `Config.thread_pool = 'name'`)
+        so slow methods can not exhaust the shared thread pool.
+
+        Pool bounds are taken from `THREAD_POOLS` unless they were overridden with `thread_pools` (`--thread-pool`
+        command line option).
+        """
+        try:
+            return self.__thread_pools[name]
+        except KeyError:
+            with self.__thread_pools_lock:
+                if name not in self.__thread_pools:
+                    self.__thread_pools[name] = IoThreadPoolExecutor(
+                        f'IoThread-{name}', **self.__thread_pools_bounds.get(name, THREAD_POOLS_DEFAULT),
+                    )
+
+                return self.__thread_pools[name]
+
+    def get_thread_pools(self):
+        return [self.run_in_thread_executor] + list(self.__thread_pools.values())
+
     def __init_procpool(self):
         self.__procpool = concurrent.futures.ProcessPoolExecutor(
             max_workers=5,
@@ -1205,6 +1244,9 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
         else:
             executor = self.__ws_threadpool
 
+        if isinstance(executor, str):
+            executor = self.get_thread_pool(executor)
+
         return PreparedCall(args=args, executor=executor)
 
     async def _call(
@@ -1217,18 +1259,21 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
 
         if asyncio.iscoroutinefunction(methodobj):
             self.logger.trace('Calling %r in current IO loop', name)
-            return await methodobj(*prepared_call.args)
+            with self.method_stats.measure(name, 'loop'):
+                return await methodobj(*prepared_call.args)
 
         if serviceobj._config.process_pool:
             self.logger.trace('Calling %r in process pool', name)
-            if isinstance(serviceobj, middlewared.service.CRUDService):
-                service_name, method_name = name.rsplit('.', 1)
-                if method_name in ['create', 'update', 'delete']:
-                    name = f'{service_name}.do_{method_name}'
-            return await self._call_worker(name, *prepared_call.args)
+            with self.method_stats.measure(name, 'process'):
+                if isinstance(serviceobj, middlewared.service.CRUDService):
+                    service_name, method_name = name.rsplit('.', 1)
+                    if method_name in ['create', 'update', 'delete']:
+                        name = f'{service_name}.do_{method_name}'
+                return await self._call_worker(name, *prepared_call.args)
 
         self.logger.trace('Calling %r in executor %r', name, prepared_call.executor)
-        return await self.run_in_executor(prepared_call.executor, methodobj, *prepared_call.args)
+        with self.method_stats.measure(name, 'thread'):
+            return await self.run_in_executor(prepared_call.executor, methodobj, *prepared_call.args)
 
     async def _call_worker(self, name, *args, job=None):
         return await self.run_in_proc(main_worker, name, args, job)
@@ -1254,9 +1299,41 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
         return [method.accepts[i].dump(arg) if i < len(method.accepts) else arg
                 for i, arg in enumerate(args)]
 
-    async def call(self, name, *params, pipes=None, job_on_progress_cb=None, app=None, profile=False):
+    def _trusted_method(self, serviceobj, methodobj):
+        """
+        Returns a version of `methodobj` that skips arguments copying and validation or `None` if the method is not
+        eligible for trusted calls (public methods, jobs, methods that need an application or run in process pool).
+        """
+        if not (serviceobj._config.private or hasattr(methodobj, '_private')):
+            return None
+
+        if hasattr(methodobj, '_job') or hasattr(methodobj, '_pass_app') or serviceobj._config.process_pool:
+            return None
+
+        trusted_call = getattr(methodobj, 'trusted_call', None)
+        if trusted_call is None:
+            # Method does not use `@accepts` so there is nothing to skip
+            return methodobj
+
+        return types.MethodType(trusted_call, methodobj.__self__)
+
+    async def call(self, name, *params, pipes=None, job_on_progress_cb=None, app=None, profile=False, trusted=False):
+        """
+        `trusted` can be set by internal callers of private methods to skip arguments deep copy and validation.
+        Callee is allowed to modify the arguments in place so caller must not reuse them afterwards.
+        """
         serviceobj, methodobj = self._method_lookup(name)
 
+        if trusted and not profile:
+            trusted_methodobj = self._trusted_method(serviceobj, methodobj)
+            if trusted_methodobj is not None:
+                if asyncio.iscoroutinefunction(trusted_methodobj):
+                    self.logger.trace('Calling %r in current IO loop (trusted)', name)
+                    with self.method_stats.measure(name, 'loop'):
+                        return await trusted_methodobj(*params)
+
+                methodobj = trusted_methodobj
+
         if profile:
             methodobj = profile_wrap(methodobj)
 
@@ -1276,18 +1353,23 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
 
         if asyncio.iscoroutinefunction(methodobj):
             self.logger.trace('Calling %r in main IO loop', name)
-            return self.run_coroutine(methodobj(*prepared_call.args))
+            with self.method_stats.measure(name, 'loop'):
+                return self.run_coroutine(methodobj(*prepared_call.args))
 
         if serviceobj._config.process_pool:
             self.logger.trace('Calling %r in process pool', name)
-            return self.run_coroutine(self._call_worker(name, *prepared_call.args))
-
-        if not self._in_executor(prepared_call.executor):
-            self.logger.trace('Calling %r in executor %r', name, prepared_call.executor)
-            return self.run_coroutine(self.run_in_executor(prepared_call.executor, methodobj, *prepared_call.args))
+            with self.method_stats.measure(name, 'process'):
+                return self.run_coroutine(self._call_worker(name, *prepared_call.args))
+
+        with self.method_stats.measure(name, 'thread'):
+            if not self._in_executor(prepared_call.executor):
+                self.logger.trace('Calling %r in executor %r', name, prepared_call.executor)
+                return self.run_coroutine(
+                    self.run_in_executor(prepared_call.executor, methodobj, *prepared_call.args)
+                )
 
-        self.logger.trace('Calling %r in current thread', name)
-        return methodobj(*prepared_call.args)
+            self.logger.trace('Calling %r in current thread', name)
+            return methodobj(*prepared_call.args)
 
     def _in_executor(self, executor):
         if isinstance(executor, concurrent.futures.thread.ThreadPoolExecutor):
@@ -1405,40 +1487,12 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
             await connection.on_close()
         return ws
 
-    _loop_monitor_ignore_frames = (
-        (
-            re.compile(r'\s+File ".+/middlewared/main\.py", line [0-9]+, in run_in_thread\s+'
-                       'return await self.loop.run_in_executor'),
-            'run_in_thread'
-        ),
-    )
-
     def _loop_monitor_thread(self):
         """
-        Thread responsible for checking current tasks that are taking too long
-        to finish and printing the stack.
-
-        DISCLAIMER/TODO: This is not free of race condition so it may show
-        false positives.
+        Thread responsible for measuring event loop lag and printing the stack
+        of the code that is blocking it for too long.
         """
-        osc.set_thread_name('loop_monitor')
-        last = None
-        while True:
-            time.sleep(2)
-            current = asyncio.current_task(loop=self.loop)
-            if current is None:
-                last = None
-                continue
-            if last == current:
-                frame = sys._current_frames()[self.__thread_id]
-                stack = traceback.format_stack(frame, limit=10)
-                for regex, name in self._loop_monitor_ignore_frames:
-                    if any(regex.match(s) for s in stack):
-                        self.logger.warn('%s seems to be blocking event loop', name)
-                        break
-                else:
-                    self.logger.warn(''.join(['Task seems blocked:\n'] + stack))
-            last = current
+        self.loop_lag.run(self.loop, self.__thread_id)
 
     def run(self):
 
@@ -1564,6 +1618,17 @@ class Middleware(LoadPluginsMixin, RunInThreadMixin, ServiceCallMixin):
         self.loop.stop()
 
 
+def thread_pool_arg(value):
+    """
+    Parses `--thread-pool NAME=MAX_WORKERS` command line option.
+    """
+    name, sep, max_workers = value.partition('=')
+    if not name or not sep or not max_workers.isdigit() or int(max_workers) < 1:
+        raise argparse.ArgumentTypeError(f'{value!r} is not in NAME=MAX_WORKERS format')
+
+    return name, int(max_workers)
+
+
 def main():
     # Workaround for development
     modpath = os.path.realpath(os.path.join(
@@ -1579,6 +1644,7 @@ def main():
     parser.add_argument('--disable-loop-monitor', '-L', action='store_true')
     parser.add_argument('--loop-debug', action='store_true')
     parser.add_argument('--overlay-dirs', '-o', action='append')
+    parser.add_argument('--thread-pool', action='append', type=thread_pool_arg, default=[])
     parser.add_argument('--debug-level', choices=[
         'TRACE',
         'DEBUG',
@@ -1620,6 +1686,7 @@ def main():
         debug_level=args.debug_level,
         log_handler=args.log_handler,
         startup_seq_path=startup_seq_path,
+        thread_pools={name: {'max_workers': max_workers} for name, max_workers in args.thread_pool},
     ).run()
 
 
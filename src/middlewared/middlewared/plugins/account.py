@@ -787,7 +787,7 @@ class UserService(CRUDService):
                     )
                 elif not any(
                     data['home'] == i['path'] or data['home'].startswith(i['path'] + '/')
-                    for i in await self.middleware.call('pool.query')
+                    for i in await self.middleware.call('pool.query', [], {'select': ['path']})
                 ):
                     verrors.add(
                         f'{schema}.home',
@@ -1,12 +1,19 @@
-from middlewared.schema import Any, Str, accepts, Int
-from middlewared.service import Service, private
+from middlewared.schema import Any, Dict, Int, Str, accepts
+from middlewared.service import Service, periodic, private
 from middlewared.utils import filter_list
+from middlewared.utils.cache import LRUCache
 
-from collections import namedtuple
-import time
 import pickle
 import pwd
 import grp
+import threading
+
+DEFAULT_NAMESPACE = 'default'
+NAMESPACES = {
+    # Items cached here (e.g. directory services users/groups) are expected to stay until explicitly removed
+    DEFAULT_NAMESPACE: {'max_entries': None, 'max_bytes': None},
+    'catalogs': {'max_entries': 64, 'max_bytes': 64 * 1024 * 1024},
+}
 
 
 class CacheService(Service):
@@ -16,77 +23,103 @@ class CacheService(Service):
 
     def __init__(self, *args, **kwargs):
         super(CacheService, self).__init__(*args, **kwargs)
-        self.__cache = {}
-        self.kv_tuple = namedtuple('Cache', ['value', 'timeout'])
+        self.__namespaces = {name: LRUCache(**limits) for name, limits in NAMESPACES.items()}
+        self.__namespaces_lock = threading.Lock()
+
+    def _namespace(self, namespace, create=False):
+        """
+        Namespaces other than `NAMESPACES` are only created when something is put in them (`create`), otherwise
+        `None` is returned for them so that lookups of arbitrary namespaces do not keep empty caches forever.
+        """
+        try:
+            return self.__namespaces[namespace]
+        except KeyError:
+            if not create:
+                return None
 
-    @accepts(Str('key'))
-    def has_key(self, key):
+            with self.__namespaces_lock:
+                return self.__namespaces.setdefault(namespace, LRUCache(**NAMESPACES[DEFAULT_NAMESPACE]))
+
+    @accepts(Str('key'), Str('namespace', default=DEFAULT_NAMESPACE))
+    def has_key(self, key, namespace):
         """
         Check if given `key` is in cache.
         """
-        return key in self.__cache
+        cache = self._namespace(namespace)
+        return cache is not None and key in cache
 
-    @accepts(Str('key'))
-    def get(self, key):
+    @accepts(Str('key'), Str('namespace', default=DEFAULT_NAMESPACE))
+    def get(self, key, namespace):
         """
         Get `key` from cache.
 
         Raises:
             KeyError: not found in the cache
         """
+        cache = self._namespace(namespace)
+        if cache is None:
+            raise KeyError(key)
 
-        if self.__cache[key].timeout > 0:
-            self.get_timeout(key)
-
-        return self.__cache[key].value
+        return cache.get(key)
 
-    @accepts(Str('key'), Any('value'), Int('timeout', default=0))
-    def put(self, key, value, timeout):
+    @accepts(Str('key'), Any('value'), Int('timeout', default=0), Str('namespace', default=DEFAULT_NAMESPACE))
+    def put(self, key, value, timeout, namespace):
         """
         Put `key` of `value` in the cache.
-        """
-
-        if timeout != 0:
-            timeout = time.monotonic() + timeout
 
-        v = self.kv_tuple(value=value, timeout=timeout)
-        self.__cache[key] = v
+        Least recently used keys of the `namespace` are evicted if it exceeds its size limits.
+        """
+        self._namespace(namespace, True).put(key, value, timeout)
 
-    @accepts(Str('key'))
-    def pop(self, key):
+    @accepts(Str('key'), Str('namespace', default=DEFAULT_NAMESPACE))
+    def pop(self, key, namespace):
         """
         Removes and returns `key` from cache.
         """
-        cache = self.__cache.pop(key, None)
-
+        cache = self._namespace(namespace)
         if cache is not None:
-            cache = cache.value
-
-        return cache
+            return cache.pop(key)
 
     @private
-    def get_timeout(self, key):
-        """
-        Check if 'key' has expired
-        """
-        now = time.monotonic()
-        value, timeout = self.__cache[key]
-
-        if now >= timeout:
-            # Bust the cache
-            del self.__cache[key]
-
-            raise KeyError(f'{key} has expired')
-
-    @private
-    def get_or_put(self, key, timeout, method):
+    def get_or_put(self, key, timeout, method, namespace=DEFAULT_NAMESPACE):
         try:
-            return self.get(key)
+            return self.get(key, namespace)
         except KeyError:
             value = method()
-            self.put(key, value, timeout)
+            self.put(key, value, timeout, namespace)
             return value
 
+    @accepts(
+        Str('namespace'),
+        Dict(
+            'cache_namespace_limits',
+            Int('max_entries', null=True, default=None),
+            Int('max_bytes', null=True, default=None),
+        ),
+    )
+    def configure_namespace(self, namespace, limits):
+        """
+        Set size limits of `namespace`. `null` means unbounded.
+        """
+        self._namespace(namespace, True).resize(limits['max_entries'], limits['max_bytes'])
+
+    @periodic(60, run_on_start=False)
+    @private
+    def expire(self):
+        """
+        Actively remove expired keys so that keys that are never read again do not linger in memory.
+        """
+        for namespace in list(self.__namespaces.values()):
+            namespace.expire()
+
+    @accepts()
+    def stats(self):
+        """
+        Returns entries count, approximate memory usage (in bytes), size limits and hit/miss/eviction/expiration
+        counters for each cache namespace.
+        """
+        return {name: namespace.stats() for name, namespace in list(self.__namespaces.items())}
+
 
 class DSCache(Service):
 
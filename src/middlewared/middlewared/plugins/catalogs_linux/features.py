@@ -24,8 +24,11 @@ class CatalogService(Service):
 
     @private
     def get_feature_map(self, cache=True):
-        if cache and self.middleware.call_sync('cache.has_key', 'catalog_feature_map'):
-            return self.middleware.call_sync('cache.get', 'catalog_feature_map')
+        if cache:
+            try:
+                return self.middleware.call_sync('cache.get', 'catalog_feature_map', 'catalogs')
+            except KeyError:
+                pass
 
         catalog = self.middleware.call_sync(
             'catalog.get_instance', self.middleware.call_sync('catalog.official_catalog_label')
@@ -38,7 +41,7 @@ class CatalogService(Service):
         with open(path, 'r') as f:
             mapping = json.loads(f.read())
 
-        self.middleware.call_sync('cache.put', 'catalog_feature_map', mapping, 86400)
+        self.middleware.call_sync('cache.put', 'catalog_feature_map', mapping, 86400, 'catalogs')
 
         return mapping
 
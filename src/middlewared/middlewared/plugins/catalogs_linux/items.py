@@ -30,9 +30,13 @@ class CatalogService(Service):
         """
         catalog = self.middleware.call_sync('catalog.get_instance', label)
 
-        if options['cache'] and self.middleware.call_sync('cache.has_key', f'catalog_{label}_train_details'):
-            return self.middleware.call_sync('cache.get', f'catalog_{label}_train_details')
-        elif not os.path.exists(catalog['location']):
+        if options['cache']:
+            try:
+                return self.middleware.call_sync('cache.get', f'catalog_{label}_train_details', 'catalogs')
+            except KeyError:
+                pass
+
+        if not os.path.exists(catalog['location']):
             self.middleware.call_sync('catalog.update_git_repository', catalog, True)
 
         # We make sure we do not dive into library folder and not consider it a train
@@ -52,7 +56,7 @@ class CatalogService(Service):
                     **self.item_details(item_location)
                 }
 
-        self.middleware.call_sync('cache.put', f'catalog_{label}_train_details', trains, 86400)
+        self.middleware.call_sync('cache.put', f'catalog_{label}_train_details', trains, 86400, 'catalogs')
         if label == self.middleware.call_sync('catalog.official_catalog_label'):
             # Update feature map cache whenever official catalog is updated
             self.middleware.call_sync('catalog.get_feature_map', False)
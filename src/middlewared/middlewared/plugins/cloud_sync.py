@@ -1,6 +1,7 @@
 from middlewared.alert.base import Alert, AlertCategory, AlertClass, AlertLevel, OneShotAlertClass
 from middlewared.common.attachment import LockableFSAttachmentDelegate
 from middlewared.rclone.base import BaseRcloneRemote
+from middlewared.rclone.rcd import RcloneRcd
 from middlewared.schema import accepts, Bool, Cron, Dict, Int, List, Patch, Str
 from middlewared.service import (
     CallError, CRUDService, ValidationErrors, filterable, item_method, job, private, TaskPathService,
@@ -23,6 +24,7 @@ from Crypto.Cipher import AES
 from Crypto.Util import Counter
 from datetime import datetime
 import enum
+import humanfriendly
 import json
 import logging
 import os
@@ -38,27 +40,31 @@ REMOTES = {}
 
 OAUTH_URL = "https://freenas.org/oauth"
 
+RCD_ENABLED_KEY = "cloud_sync_rcd_enabled"
+
 RcloneConfigTuple = namedtuple("RcloneConfigTuple", ["config_path", "remote_path", "extra_args"])
 
 logger = logging.getLogger(__name__)
 
 
 class RcloneConfig:
-    def __init__(self, cloud_sync):
+    """
+    Writes rclone configuration for `cloud_sync` to a temporary file or, if `rcd` is specified, registers its remotes
+    with the rclone remote control daemon (`config_path` is `None` in that case).
+    """
+
+    def __init__(self, cloud_sync, rcd=None):
         self.cloud_sync = cloud_sync
+        self.rcd = rcd
 
         self.provider = REMOTES[self.cloud_sync["credentials"]["provider"]]
 
         self.config = None
         self.tmp_file = None
         self.tmp_file_exclude = None
+        self.rcd_remotes = []
 
     async def __aenter__(self):
-        self.tmp_file = tempfile.NamedTemporaryFile(mode="w+")
-
-        # Make sure only root can read it as there is sensitive data
-        os.chmod(self.tmp_file.name, 0o600)
-
         config = dict(self.cloud_sync["credentials"]["attributes"], type=self.provider.rclone_type)
         config = dict(config, **await self.provider.get_credentials_extra(self.cloud_sync["credentials"]))
         if "pass" in config:
@@ -66,43 +72,68 @@ class RcloneConfig:
 
         remote_path = None
         extra_args = []
+        encrypted = None
 
         if "attributes" in self.cloud_sync:
             config.update(dict(self.cloud_sync["attributes"], **await self.provider.get_task_extra(self.cloud_sync)))
 
             remote_path = get_remote_path(self.provider, self.cloud_sync["attributes"])
-            remote_path = f"remote:{remote_path}"
 
             if self.cloud_sync["encryption"]:
-                self.tmp_file.write("[encrypted]\n")
-                self.tmp_file.write("type = crypt\n")
-                self.tmp_file.write(f"remote = {remote_path}\n")
-                self.tmp_file.write("filename_encryption = {}\n".format(
-                    "standard" if self.cloud_sync["filename_encryption"] else "off"))
-                self.tmp_file.write("password = {}\n".format(
-                    rclone_encrypt_password(self.cloud_sync["encryption_password"])))
+                encrypted = {
+                    "type": "crypt",
+                    "filename_encryption": "standard" if self.cloud_sync["filename_encryption"] else "off",
+                    "password": rclone_encrypt_password(self.cloud_sync["encryption_password"]),
+                }
                 if self.cloud_sync["encryption_salt"]:
-                    self.tmp_file.write("password2 = {}\n".format(
-                        rclone_encrypt_password(self.cloud_sync["encryption_salt"])))
-
-                remote_path = "encrypted:/"
+                    encrypted["password2"] = rclone_encrypt_password(self.cloud_sync["encryption_salt"])
 
             extra_args.extend(["--exclude", ".zfs", "--exclude", ".zfs/**"])
 
-            if self.cloud_sync.get("exclude"):
+            if self.cloud_sync.get("exclude") and self.rcd is None:
                 self.tmp_file_exclude = tempfile.NamedTemporaryFile(mode="w+")
                 self.tmp_file_exclude.write("\n".join(self.cloud_sync["exclude"]))
                 self.tmp_file_exclude.flush()
                 extra_args.extend(["--exclude-from", self.tmp_file_exclude.name])
 
+        self.config = config
+
+        if self.rcd is not None:
+            remote = await self.rcd.create_remote(config)
+            self.rcd_remotes.append(remote)
+            if remote_path is not None:
+                remote_path = f"{remote}:{remote_path}"
+                if encrypted is not None:
+                    remote = await self.rcd.create_remote(dict(encrypted, remote=remote_path))
+                    self.rcd_remotes.append(remote)
+                    remote_path = f"{remote}:/"
+
+            return RcloneConfigTuple(None, remote_path, extra_args)
+
+        self.tmp_file = tempfile.NamedTemporaryFile(mode="w+")
+
+        # Make sure only root can read it as there is sensitive data
+        os.chmod(self.tmp_file.name, 0o600)
+
+        if remote_path is not None:
+            remote_path = f"remote:{remote_path}"
+            if encrypted is not None:
+                self.tmp_file.write("[encrypted]\n")
+                self.tmp_file.write("type = crypt\n")
+                self.tmp_file.write(f"remote = {remote_path}\n")
+                self.tmp_file.write("filename_encryption = {}\n".format(encrypted["filename_encryption"]))
+                self.tmp_file.write("password = {}\n".format(encrypted["password"]))
+                if "password2" in encrypted:
+                    self.tmp_file.write("password2 = {}\n".format(encrypted["password2"]))
+
+                remote_path = "encrypted:/"
+
         self.tmp_file.write("[remote]\n")
         for k, v in config.items():
             self.tmp_file.write(f"{k} = {v}\n")
 
         self.tmp_file.flush()
 
-        self.config = config
-
         return RcloneConfigTuple(self.tmp_file.name, remote_path, extra_args)
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -112,6 +143,8 @@ class RcloneConfig:
             self.tmp_file.close()
         if self.tmp_file_exclude:
             self.tmp_file_exclude.close()
+        for remote in reversed(self.rcd_remotes):
+            await self.rcd.delete_remote(remote)
 
 
 def get_remote_path(provider, attributes):
@@ -134,61 +167,36 @@ def check_local_path(path):
         raise CallError(f"Directory {path!r} must reside within volume mount point")
 
 
-async def rclone(middleware, job, cloud_sync, dry_run=False):
+async def rclone(middleware, job, cloud_sync, dry_run=False, rcd=None):
     await middleware.call("network.general.will_perform_activity", "cloud_sync")
 
     await middleware.run_in_thread(check_local_path, cloud_sync["path"])
 
-    # Use a temporary file to store rclone file
-    async with RcloneConfig(cloud_sync) as config:
-        args = [
-            "rclone",
-            "--config", config.config_path,
-            "-v",
-            "--stats", "1s",
-        ]
-
-        if cloud_sync["attributes"].get("fast_list"):
-            args.append("--fast-list")
-
-        if cloud_sync["follow_symlinks"]:
-            args.extend(["-L"])
-
-        if cloud_sync["transfers"]:
-            args.extend(["--transfers", str(cloud_sync["transfers"])])
-
-        if cloud_sync["bwlimit"]:
-            args.extend(["--bwlimit", " ".join([
-                f"{limit['time']},{str(limit['bandwidth']) + 'b' if limit['bandwidth'] else 'off'}"
-                for limit in cloud_sync["bwlimit"]
-            ])])
-
-        if dry_run:
-            args.extend(["--dry-run"])
-
-        args += config.extra_args
-
-        args += shlex.split(cloud_sync["args"])
-
-        args += [cloud_sync["transfer_mode"].lower()]
+    if rcd is not None and not rclone_rcd_compatible(cloud_sync):
+        rcd = None
 
+    # Use a temporary file (or temporary rclone remote control daemon remotes) to store rclone config
+    rclone_config = RcloneConfig(cloud_sync, rcd)
+    async with rclone_config as config:
         snapshot = None
         path = cloud_sync["path"]
         if cloud_sync["direction"] == "PUSH":
             if cloud_sync["snapshot"]:
-                dataset, recursive = get_dataset_recursive(
-                    await middleware.call("zfs.dataset.query"), cloud_sync["path"])
+                dataset = await middleware.call("zfs.mountpoints.resolve", os.path.normpath(cloud_sync["path"]))
+                if dataset["dataset"] is None:
+                    raise CallError(f"Unable to find dataset for {cloud_sync['path']!r}")
+
                 snapshot_name = f"cloud_sync-{cloud_sync['id']}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
 
-                snapshot = {"dataset": dataset["name"], "name": snapshot_name}
-                await middleware.call("zfs.snapshot.create", dict(snapshot, recursive=recursive))
+                snapshot = {"dataset": dataset["dataset"], "name": snapshot_name}
+                await middleware.call("zfs.snapshot.create", dict(snapshot, recursive=dataset["children"]))
 
                 relpath = os.path.relpath(path, dataset["mountpoint"])
                 path = os.path.normpath(os.path.join(dataset["mountpoint"], ".zfs", "snapshot", snapshot_name, relpath))
 
-            args.extend([path, config.remote_path])
+            src, dst = path, config.remote_path
         else:
-            args.extend([config.remote_path, path])
+            src, dst = config.remote_path, path
 
         env = {}
         for k, v in (
@@ -206,46 +214,29 @@ async def rclone(middleware, job, cloud_sync, dry_run=False):
 
         await run_script(job, env, cloud_sync["pre_script"], "Pre-script")
 
-        job.middleware.logger.debug("Running %r", args)
-        proc = await Popen(
-            args,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-        )
-        check_cloud_sync = asyncio.ensure_future(rclone_check_progress(job, proc))
-        cancelled_error = None
-        try:
+        if rcd is None:
+            await rclone_process(middleware, job, cloud_sync, config, src, dst, dry_run, snapshot)
+        else:
             try:
-                await proc.wait()
-            except asyncio.CancelledError as e:
-                cancelled_error = e
-                try:
-                    await middleware.call("service.terminate_process", proc.pid)
-                except CallError as e:
-                    job.middleware.logger.warning(f"Error terminating rclone on cloud sync abort: {e!r}")
-        finally:
-            await asyncio.wait_for(check_cloud_sync, None)
-
-        if snapshot:
-            await middleware.call("zfs.snapshot.remove", snapshot)
-
-        if cancelled_error is not None:
-            raise cancelled_error
-        if proc.returncode != 0:
-            message = f"rclone failed with exit code {proc.returncode}"
-            if "dropbox__restricted_content" in job.internal_data:
-                message = "DropBox restricted content"
-            raise ValueError(message)
+                await rclone_rcd_sync(job, rcd, cloud_sync, src, dst, dry_run)
+            finally:
+                if snapshot:
+                    await middleware.call("zfs.snapshot.remove", snapshot)
 
         await run_script(job, env, cloud_sync["post_script"], "Post-script")
 
         refresh_credentials = REMOTES[cloud_sync["credentials"]["provider"]].refresh_credentials
         if refresh_credentials:
+            if rcd is None:
+                ini = configparser.ConfigParser()
+                ini.read(config.config_path)
+                remote_config = ini["remote"]
+            else:
+                remote_config = await rcd.get_remote(rclone_config.rcd_remotes[0])
+
             credentials_attributes = cloud_sync["credentials"]["attributes"].copy()
             updated = False
-            ini = configparser.ConfigParser()
-            ini.read(config.config_path)
-            for key, value in ini["remote"].items():
+            for key, value in remote_config.items():
                 if (key in refresh_credentials and
                         key in credentials_attributes and
                         credentials_attributes[key] != value):
@@ -258,6 +249,181 @@ async def rclone(middleware, job, cloud_sync, dry_run=False):
                 })
 
 
+async def rclone_process(middleware, job, cloud_sync, config, src, dst, dry_run, snapshot):
+    args = [
+        "rclone",
+        "--config", config.config_path,
+        "-v",
+        "--stats", "1s",
+    ]
+
+    if cloud_sync["attributes"].get("fast_list"):
+        args.append("--fast-list")
+
+    if cloud_sync["follow_symlinks"]:
+        args.extend(["-L"])
+
+    if cloud_sync["transfers"]:
+        args.extend(["--transfers", str(cloud_sync["transfers"])])
+
+    if cloud_sync["bwlimit"]:
+        args.extend(["--bwlimit", " ".join([
+            f"{limit['time']},{str(limit['bandwidth']) + 'b' if limit['bandwidth'] else 'off'}"
+            for limit in cloud_sync["bwlimit"]
+        ])])
+
+    if dry_run:
+        args.extend(["--dry-run"])
+
+    args += config.extra_args
+
+    args += shlex.split(cloud_sync["args"])
+
+    args += [cloud_sync["transfer_mode"].lower()]
+
+    args.extend([src, dst])
+
+    job.middleware.logger.debug("Running %r", args)
+    proc = await Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    check_cloud_sync = asyncio.ensure_future(rclone_check_progress(job, proc))
+    cancelled_error = None
+    try:
+        try:
+            await proc.wait()
+        except asyncio.CancelledError as e:
+            cancelled_error = e
+            try:
+                await middleware.call("service.terminate_process", proc.pid)
+            except CallError as e:
+                job.middleware.logger.warning(f"Error terminating rclone on cloud sync abort: {e!r}")
+    finally:
+        await asyncio.wait_for(check_cloud_sync, None)
+
+    if snapshot:
+        await middleware.call("zfs.snapshot.remove", snapshot)
+
+    if cancelled_error is not None:
+        raise cancelled_error
+    if proc.returncode != 0:
+        message = f"rclone failed with exit code {proc.returncode}"
+        if "dropbox__restricted_content" in job.internal_data:
+            message = "DropBox restricted content"
+        raise ValueError(message)
+
+
+def rclone_rcd_compatible(cloud_sync):
+    # Arbitrary command line arguments can't be translated to remote control API calls and bandwidth limit is
+    # global for the remote control daemon.
+    return not cloud_sync["args"].strip() and not cloud_sync["bwlimit"]
+
+
+async def rclone_rcd_sync(job, rcd, cloud_sync, src, dst, dry_run):
+    config = {"DryRun": dry_run}
+    if cloud_sync["attributes"].get("fast_list"):
+        config["UseListR"] = True
+    if cloud_sync["follow_symlinks"]:
+        config["CopyLinks"] = True
+    if cloud_sync["transfers"]:
+        config["Transfers"] = cloud_sync["transfers"]
+
+    params = {
+        "srcFs": src,
+        "dstFs": dst,
+        "_async": True,
+        "_config": config,
+        "_filter": {"ExcludeRule": [".zfs", ".zfs/**"] + (cloud_sync.get("exclude") or [])},
+    }
+    if cloud_sync["transfer_mode"] == "MOVE":
+        params["deleteEmptySrcDirs"] = False
+
+    job.middleware.logger.debug("Running rclone remote control sync/%s %r -> %r", cloud_sync["transfer_mode"].lower(),
+                                src, dst)
+    jobid = (await rcd.call(f"sync/{cloud_sync['transfer_mode'].lower()}", **params))["jobid"]
+    try:
+        status = await rclone_rcd_check_progress(job, rcd, jobid)
+    except asyncio.CancelledError:
+        try:
+            await rcd.call("job/stop", jobid=jobid)
+        except CallError as e:
+            job.middleware.logger.warning(f"Error stopping rclone job on cloud sync abort: {e!r}")
+        raise
+
+    if not status["success"]:
+        raise ValueError(f"rclone failed: {status['error']}")
+
+
+async def rclone_rcd_check_progress(job, rcd, jobid, interval=1, log_interval=300):
+    i = 0
+    while True:
+        status = await rcd.call("job/status", jobid=jobid)
+        stats = await rcd.call("core/stats", group=f"job/{jobid}")
+
+        progress, description = rclone_rcd_format_stats(stats)
+        job.set_progress(progress, description)
+
+        # Prevents clogging job logs with progress reports every second
+        if status["finished"] or i % log_interval == 0:
+            job.logs_fd.write(f"{description}\n".encode("utf-8", "ignore"))
+            for transfer in stats.get("transferring") or []:
+                job.logs_fd.write((
+                    f" * {transfer['name']}: {transfer.get('percentage', 0)}% "
+                    f"({humanfriendly.format_size(transfer.get('speed') or 0)}/s)\n"
+                ).encode("utf-8", "ignore"))
+
+        if status["finished"]:
+            if stats.get("lastError"):
+                job.logs_fd.write(f"Last error: {stats['lastError']}\n".encode("utf-8", "ignore"))
+
+            return status
+
+        i += 1
+        await asyncio.sleep(interval)
+
+
+async def rclone_rcd_decrypt_names(rcd, remote, names):
+    """
+    Returns `{encrypted: decrypted}` for all `names` that crypt `remote` can decrypt.
+    """
+    async def decode(names):
+        return (await rcd.call("backend/command", command="decode", fs=f"{remote}:", arg=names))["result"]
+
+    try:
+        return dict(zip(names, await decode(names)))
+    except CallError:
+        # `decode` fails as a whole if any of the names can't be decrypted, decrypt them one by one then
+        pass
+
+    result = {}
+    for name in names:
+        try:
+            result[name] = (await decode([name]))[0]
+        except CallError:
+            pass
+
+    return result
+
+
+def rclone_rcd_format_stats(stats):
+    bytes_ = stats.get("bytes") or 0
+    total_bytes = stats.get("totalBytes") or 0
+    progress = int(100 * bytes_ / total_bytes) if total_bytes else 0
+
+    description = (
+        f"{humanfriendly.format_size(bytes_)} / {humanfriendly.format_size(total_bytes)}, "
+        f"{humanfriendly.format_size(stats.get('speed') or 0)}/s"
+    )
+    if stats.get("eta") is not None:
+        description += f", ETA {humanfriendly.format_timespan(stats['eta'])}"
+    if stats.get("errors"):
+        description += f", {stats['errors']} errors"
+
+    return progress, description
+
+
 async def run_script(job, env, hook, script_name):
     hook = hook.strip()
     if not hook:
@@ -428,31 +594,6 @@ def rclone_encrypt_password(password):
     return base64.urlsafe_b64encode(encrypted).decode("ascii").rstrip("=")
 
 
-def get_dataset_recursive(datasets, directory):
-    datasets = [
-        dict(dataset, prefixlen=len(
-            os.path.dirname(os.path.commonprefix([dataset["mountpoint"] + "/", directory + "/"]))))
-        for dataset in datasets
-        if dataset["mountpoint"]
-    ]
-
-    dataset = sorted(
-        [
-            dataset
-            for dataset in datasets
-            if (directory + "/").startswith(dataset["mountpoint"] + "/")
-        ],
-        key=lambda dataset: dataset["prefixlen"],
-        reverse=True
-    )[0]
-
-    return dataset, any(
-        (ds["mountpoint"] + "/").startswith(directory + "/")
-        for ds in datasets
-        if ds != dataset
-    )
-
-
 class _FsLockCore(aiorwlock._RWLockCore):
     def _release(self, lock_type):
         if self._r_state == 0 and self._w_state == 0:
@@ -680,6 +821,8 @@ class CloudSyncService(TaskPathService):
     remote_fs_lock_manager = FsLockManager()
     share_task_type = 'CloudSync'
 
+    rcd = None
+
     class Config:
         datastore = "tasks.cloudsync"
         datastore_extend = "cloudsync.extend"
@@ -1014,7 +1157,12 @@ class CloudSyncService(TaskPathService):
         await self.middleware.call("network.general.will_perform_activity", "cloud_sync")
 
         decrypt_filenames = config.get("encryption") and config.get("filename_encryption")
-        async with RcloneConfig(config) as config:
+        rcd = self.rcd if self.rcd is not None and self.rcd.is_running() else None
+        rclone_config = RcloneConfig(config, rcd)
+        async with rclone_config as config:
+            if rcd is not None:
+                return await self._ls_rcd(rcd, rclone_config.rcd_remotes, path, decrypt_filenames)
+
             proc = await run(["rclone", "--config", config.config_path, "lsjson", "remote:" + path],
                              check=False, encoding="utf8", errors="ignore")
             if proc.returncode == 0:
@@ -1043,6 +1191,51 @@ class CloudSyncService(TaskPathService):
             else:
                 raise CallError(proc.stderr, extra={"excerpt": lsjson_error_excerpt(proc.stderr)})
 
+    async def _ls_rcd(self, rcd, remotes, path, decrypt_filenames):
+        try:
+            result = (await rcd.call("operations/list", fs=f"{remotes[0]}:", remote=path))["list"]
+        except CallError as e:
+            raise CallError(e.errmsg, extra={"excerpt": lsjson_error_excerpt(e.errmsg)})
+
+        if decrypt_filenames and result and len(remotes) > 1:
+            decrypted_names = await rclone_rcd_decrypt_names(rcd, remotes[1], [item["Name"] for item in result])
+            for item in result:
+                if item["Name"] in decrypted_names:
+                    item["Decrypted"] = decrypted_names[item["Name"]]
+
+        return result
+
+    @private
+    @accepts(Bool("enable"))
+    async def rcd_enable(self, enable):
+        """
+        Start (or stop) long-lived rclone remote control daemon that will be used for syncs and remote directory
+        listing instead of spawning a new `rclone` process each time.
+        """
+        await self.middleware.call("keyvalue.set", RCD_ENABLED_KEY, enable)
+
+        if enable:
+            if self.rcd is None:
+                self.rcd = RcloneRcd()
+
+            await self.rcd.start()
+        elif self.rcd is not None:
+            await self.rcd.stop()
+
+    @private
+    async def rcd_setup(self):
+        if not await self.middleware.call("keyvalue.get", RCD_ENABLED_KEY, False):
+            return
+
+        try:
+            await self.rcd_enable(True)
+        except Exception:
+            self.logger.error("Error starting rclone remote control daemon", exc_info=True)
+
+    async def terminate(self):
+        if self.rcd is not None:
+            await self.rcd.stop()
+
     @item_method
     @accepts(
         Int("id"),
@@ -1110,7 +1303,8 @@ class CloudSyncService(TaskPathService):
             async with self.remote_fs_lock_manager.lock(f"{credentials['id']}/{remote_path}", remote_direction):
                 job.set_progress(0, "Starting")
                 try:
-                    await rclone(self.middleware, job, cloud_sync, options["dry_run"])
+                    rcd = self.rcd if self.rcd is not None and self.rcd.is_running() else None
+                    await rclone(self.middleware, job, cloud_sync, options["dry_run"], rcd)
                     if "id" in cloud_sync:
                         await self.middleware.call("alert.oneshot_delete", "CloudSyncTaskFailed", cloud_sync["id"])
                 except Exception:
@@ -1249,3 +1443,5 @@ async def setup(middleware):
 
     await middleware.call('pool.dataset.register_attachment_delegate', CloudSyncFSAttachmentDelegate(middleware))
     await middleware.call('network.general.register_activity', 'cloud_sync', 'Cloud sync')
+
+    asyncio.ensure_future(middleware.call('cloudsync.rcd_setup'))
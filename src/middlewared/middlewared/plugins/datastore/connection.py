@@ -49,6 +49,29 @@ class DatastoreService(Service):
 
     @private
     async def execute_write(self, stmt, return_last_insert_rowid=False):
+        sql, binds = self._compile(stmt)
+
+        return await self.middleware.run_in_executor(self.thread_pool, self._execute_write, sql, binds,
+                                                     return_last_insert_rowid)
+
+    @private
+    async def execute_write_many(self, stmts):
+        """
+        Executes a list of `(stmt, return_last_insert_rowid, expect_single_row)` in a single transaction.
+
+        If any of the statements marked with `expect_single_row` does not affect exactly one row, the whole
+        transaction is rolled back and `RuntimeError` is raised.
+
+        Returns list of results in the same order as `stmts`.
+        """
+        queries = [
+            self._compile(stmt) + (return_last_insert_rowid, expect_single_row)
+            for stmt, return_last_insert_rowid, expect_single_row in stmts
+        ]
+
+        return await self.middleware.run_in_executor(self.thread_pool, self._execute_write_many, queries)
+
+    def _compile(self, stmt):
         compiled = stmt.compile(self.engine)
 
         sql = compiled.string
@@ -62,8 +85,7 @@ class DatastoreService(Service):
             else:
                 binds.append(value)
 
-        return await self.middleware.run_in_executor(self.thread_pool, self._execute_write, sql, binds,
-                                                     return_last_insert_rowid)
+        return sql, binds
 
     def _execute_write(self, sql, binds, return_last_insert_rowid):
         result = self.connection.execute(sql, binds)
@@ -75,6 +97,25 @@ class DatastoreService(Service):
 
         return result
 
+    def _execute_write_many(self, queries):
+        results = []
+        with self.connection.begin():
+            for sql, binds, return_last_insert_rowid, expect_single_row in queries:
+                result = self.connection.execute(sql, binds)
+                if expect_single_row and result.rowcount != 1:
+                    raise RuntimeError(f'{result.rowcount} rows were affected, expecting one')
+
+                if return_last_insert_rowid:
+                    result = self._fetchall("SELECT last_insert_rowid()")[0][0]
+
+                results.append(result)
+
+        # Only report statements that were actually committed
+        for sql, binds, *_ in queries:
+            self.middleware.call_hook_inline("datastore.post_execute_write", sql, binds)
+
+        return results
+
     @private
     async def fetchall(self, *args):
         return await self.middleware.run_in_executor(self.thread_pool, self._fetchall, *args)
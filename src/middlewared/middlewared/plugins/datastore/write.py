@@ -1,13 +1,18 @@
 from sqlalchemy import and_, types
 from sqlalchemy.sql import sqltypes
 
-from middlewared.schema import accepts, Any, Dict, Str
+from middlewared.schema import accepts, Any, Dict, List, Str
 from middlewared.service import Service
 
 from .filter import FilterMixin
 from .schema import SchemaMixin
 
 
+def is_rowid(pk_column):
+    # Only `INTEGER PRIMARY KEY` is an alias for SQLite `rowid` (its subclasses like `BIGINT` are not)
+    return type(pk_column.type) is sqltypes.Integer
+
+
 class DatastoreService(Service, FilterMixin, SchemaMixin):
 
     class Config:
@@ -20,16 +25,10 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         """
         table = self._get_table(name)
         insert, relationships = self._extract_relationships(table, options['prefix'], data)
-
-        for column in table.c:
-            if column.default is not None:
-                insert.setdefault(column.name, column.default.arg)
-            if not column.nullable:
-                if isinstance(column.type, (types.String, types.Text)):
-                    insert.setdefault(column.name, '')
+        self._insert_defaults(table, insert)
 
         pk_column = self._get_pk(table)
-        return_last_insert_rowid = type(pk_column.type) == sqltypes.Integer
+        return_last_insert_rowid = is_rowid(pk_column)
         result = await self.middleware.call('datastore.execute_write', table.insert().values(**insert),
                                             return_last_insert_rowid)
         if return_last_insert_rowid:
@@ -61,10 +60,7 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
         else:
             id = id_or_filters
 
-        for column in table.c:
-            if column.foreign_keys:
-                if column.name[:-3] in data:
-                    data[column.name] = data.pop(column.name[:-3])
+        self._rename_foreign_keys(table, data)
 
         update, relationships = self._extract_relationships(table, options['prefix'], data)
 
@@ -82,6 +78,82 @@ class DatastoreService(Service, FilterMixin, SchemaMixin):
 
         return id
 
+    @accepts(
+        Str('name'),
+        List('operations', items=[Dict('operation', additional_attrs=True)]),
+        Dict('options', Str('prefix', default='')),
+    )
+    async def bulk(self, name, operations, options):
+        """
+        Execute a list of `operations` on `name` in a single transaction.
+
+        Each operation is one of:
+          - {"type": "INSERT", "data": {...}}
+          - {"type": "UPDATE", "id": id, "data": {...}}
+          - {"type": "DELETE", "id": id}
+
+        Either all operations are applied or none of them is. Many-to-many relationships are not supported.
+
+        Returns list of primary keys of affected rows in the same order as `operations`.
+        """
+        table = self._get_table(name)
+        pk_column = self._get_pk(table)
+        return_last_insert_rowid = is_rowid(pk_column)
+
+        stmts = []
+        inserts = {}
+        for i, operation in enumerate(operations):
+            if operation['type'] == 'DELETE':
+                stmts.append((table.delete().where(pk_column == operation['id']), False, False))
+                continue
+
+            data = operation['data'].copy()
+            self._rename_foreign_keys(table, data)
+            values, relationships = self._extract_relationships(table, options['prefix'], data)
+            if relationships:
+                raise ValueError(f'Relationships are not supported in bulk writes to {name!r}')
+
+            if operation['type'] == 'INSERT':
+                self._insert_defaults(table, values)
+                inserts[i] = values
+                stmts.append((table.insert().values(**values), return_last_insert_rowid, False))
+            elif operation['type'] == 'UPDATE':
+                stmts.append((table.update().values(**values).where(pk_column == operation['id']), False, True))
+            else:
+                raise ValueError(f'Invalid operation type {operation["type"]!r}')
+
+        results = await self.middleware.call('datastore.execute_write_many', stmts)
+
+        pks = []
+        for i, (operation, result) in enumerate(zip(operations, results)):
+            if operation['type'] == 'INSERT':
+                pk = result if return_last_insert_rowid else inserts[i][pk_column.name]
+                await self.middleware.call('datastore.send_insert_events', name, inserts[i])
+            elif operation['type'] == 'UPDATE':
+                pk = operation['id']
+                await self.middleware.call('datastore.send_update_events', name, pk)
+            else:
+                pk = operation['id']
+                await self.middleware.call('datastore.send_delete_events', name, pk)
+
+            pks.append(pk)
+
+        return pks
+
+    def _insert_defaults(self, table, insert):
+        for column in table.c:
+            if column.default is not None:
+                insert.setdefault(column.name, column.default.arg)
+            if not column.nullable:
+                if isinstance(column.type, (types.String, types.Text)):
+                    insert.setdefault(column.name, '')
+
+    def _rename_foreign_keys(self, table, data):
+        for column in table.c:
+            if column.foreign_keys:
+                if column.name[:-3] in data:
+                    data[column.name] = data.pop(column.name[:-3])
+
     def _extract_relationships(self, table, prefix, data):
         relationships = self._get_relationships(table)
 
@@ -4,11 +4,12 @@ import pyudev
 import re
 import subprocess
 import json
+import threading
 
 import libsgio
 
 from .device_info_base import DeviceInfoBase
-from middlewared.service import private, Service
+from middlewared.service import private, Service, threaded
 from middlewared.utils import run
 
 RE_DISK_SERIAL = re.compile(r'Unit serial number:\s*(.*)')
@@ -24,6 +25,18 @@ class DeviceService(Service, DeviceInfoBase):
     GPU = None
     HOST_TYPE = None
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # In-memory disks inventory built on first use and then updated incrementally from udev events:
+        # disks reported as changed are marked dirty and only these are re-read on next access.
+        self.disks = None
+        # disk name -> number of the udev event that made it dirty
+        self.disks_dirty = {}
+        self.disks_events = 0
+        self.disks_generation = 0
+        self.disks_lock = threading.RLock()
+
+    @threaded('device')
     def get_serials(self):
         devices = []
         for tty in map(lambda t: os.path.basename(t), glob.glob('/dev/ttyS*')):
@@ -61,21 +74,30 @@ class DeviceService(Service, DeviceInfoBase):
             devices.append(serial_dev)
         return devices
 
+    @threaded('device')
     def get_disks(self):
+        while True:
+            with self.disks_lock:
+                if self.disks is None:
+                    self.disks = self.retrieve_disks()
+                    self.disks_dirty.clear()
+                    self.disks_generation += 1
+
+            self.refresh_dirty_disks()
+
+            with self.disks_lock:
+                # Inventory might have been invalidated while dirty disks were being refreshed
+                if self.disks is not None:
+                    return {name: disk.copy() for name, disk in self.disks.items()}
+
+    @private
+    def retrieve_disks(self):
         disks = {}
         disks_data = self.retrieve_disks_data()
 
         for block_device in pyudev.Context().list_devices(subsystem='block', DEVTYPE='disk'):
-            if block_device.sys_name.startswith(('sr', 'md', 'dm-', 'loop', 'zd')):
-                continue
-            if RE_NVME_PRIVATE_NAMESPACE.match(block_device.sys_name):
+            if not self.is_disk(block_device):
                 continue
-            device_type = os.path.join('/sys/block', block_device.sys_name, 'device/type')
-            if os.path.exists(device_type):
-                with open(device_type, 'r') as f:
-                    if f.read().strip() != '0':
-                        continue
-            # nvme drives won't have this
 
             try:
                 disks[block_device.sys_name] = self.get_disk_details(block_device, self.disk_default.copy(), disks_data)
@@ -87,7 +109,111 @@ class DeviceService(Service, DeviceInfoBase):
         return disks
 
     @private
-    def retrieve_disks_data(self):
+    def is_disk(self, block_device):
+        if block_device.sys_name.startswith(('sr', 'md', 'dm-', 'loop', 'zd')):
+            return False
+        if RE_NVME_PRIVATE_NAMESPACE.match(block_device.sys_name):
+            return False
+        device_type = os.path.join('/sys/block', block_device.sys_name, 'device/type')
+        if os.path.exists(device_type):
+            with open(device_type, 'r') as f:
+                if f.read().strip() != '0':
+                    return False
+        # nvme drives won't have this
+
+        return True
+
+    @private
+    def refresh_dirty_disks(self):
+        # Disks are re-read without holding the lock so other inventory consumers and udev events are not blocked
+        # by lsblk and sysfs reads.
+        with self.disks_lock:
+            if self.disks is None or not self.disks_dirty:
+                return
+
+            inventory = self.disks
+            dirty = dict(self.disks_dirty)
+
+        disks = {}
+        for name in dirty:
+            try:
+                disks[name] = self.retrieve_disk(name)
+            except Exception as e:
+                self.middleware.logger.debug('Failed to retrieve disk details for %s : %s', name, str(e))
+                disks[name] = None
+
+        with self.disks_lock:
+            if self.disks is not inventory:
+                # Inventory was invalidated in the meantime and will be rebuilt entirely
+                return
+
+            for name, disk in disks.items():
+                if self.disks_dirty.get(name) != dirty[name]:
+                    # Disk was changed or removed again while it was being read, what we have is stale
+                    continue
+
+                if disk is None:
+                    self.disks.pop(name, None)
+                else:
+                    self.disks[name] = disk
+
+                del self.disks_dirty[name]
+
+            self.disks_generation += 1
+
+    @private
+    def retrieve_disk(self, name):
+        try:
+            block_device = pyudev.Devices.from_name(pyudev.Context(), 'block', name)
+        except pyudev.DeviceNotFoundByNameError:
+            return None
+
+        if not self.is_disk(block_device):
+            return None
+
+        return self.get_disk_details(
+            block_device, self.disk_default.copy(), self.retrieve_disks_data([os.path.join('/dev', name)]),
+        )
+
+    @private
+    def disk_changed(self, name, action):
+        """
+        Mark disk `name` inventory entry as stale because of udev `action` event so it is re-read on next access.
+        """
+        with self.disks_lock:
+            if self.disks is None:
+                return
+
+            if action == 'remove':
+                self.disks.pop(name, None)
+                self.disks_dirty.pop(name, None)
+                self.disks_generation += 1
+            else:
+                self.disks_events += 1
+                self.disks_dirty[name] = self.disks_events
+
+    @private
+    def invalidate_disks(self):
+        """
+        Drop disks inventory so it is entirely rebuilt on next access.
+        """
+        with self.disks_lock:
+            self.disks = None
+            self.disks_dirty.clear()
+
+    @private
+    def get_disks_generation(self):
+        """
+        Returns disks inventory generation number which changes whenever disks inventory is updated. Consumers can
+        use it to find out whether disks might have changed since they last retrieved them.
+        """
+        self.refresh_dirty_disks()
+
+        with self.disks_lock:
+            return self.disks_generation
+
+    @private
+    def retrieve_disks_data(self, paths=None):
 
         # some disk information will fail to be retrived
         # based on what type of guest this is. For example,
@@ -101,7 +227,7 @@ class DeviceService(Service, DeviceInfoBase):
 
         lsblk_disks = {}
         disks_cp = subprocess.run(
-            ['lsblk', '-OJdb'],
+            ['lsblk', '-OJdb'] + (paths or []),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
         )
@@ -120,15 +246,20 @@ class DeviceService(Service, DeviceInfoBase):
 
         return lsblk_disks
 
+    @threaded('device')
     def get_disk(self, name):
-        disk = self.disk_default.copy()
-        context = pyudev.Context()
+        with self.disks_lock:
+            if self.disks is not None and name in self.disks and name not in self.disks_dirty:
+                return self.disks[name].copy()
+
         try:
-            block_device = pyudev.Devices.from_name(context, 'block', name)
+            block_device = pyudev.Devices.from_name(pyudev.Context(), 'block', name)
         except pyudev.DeviceNotFoundByNameError:
             return None
 
-        return self.get_disk_details(block_device, disk, self.retrieve_disks_data())
+        return self.get_disk_details(
+            block_device, self.disk_default.copy(), self.retrieve_disks_data([os.path.join('/dev', name)]),
+        )
 
     @private
     def get_rotational_rate(self, device_path):
@@ -253,6 +384,7 @@ class DeviceService(Service, DeviceInfoBase):
         else:
             self.middleware.logger.error('Unable to retrieve %r disk logical block size at %r', name, path)
 
+    @threaded('device')
     def get_storage_devices_topology(self):
         disks = self.get_disks()
         topology = {}
@@ -20,6 +20,13 @@ def udev_events(middleware):
     monitor.filter_by(subsystem='block')
     monitor.filter_by(subsystem='net')
     for device in iter(monitor.poll, None):
+        if device.subsystem == 'block' and device.device_type == 'disk':
+            # Disks inventory must be up to date before any hook consumer tries to retrieve disk details
+            try:
+                middleware.call_sync('device.disk_changed', device.sys_name, device.action)
+            except Exception:
+                middleware.logger.error('Failed to update disks inventory for %r', device.sys_name, exc_info=True)
+
         middleware.call_hook_sync(f'udev.{device.subsystem}', data={**dict(device), 'SYS_NAME': device.sys_name})
 
 
@@ -23,6 +23,7 @@ async def remove_disk(middleware, disk_name):
     if osc.IS_FREEBSD:
         await middleware.call('disk.multipath_sync')
     await middleware.call('alert.oneshot_delete', 'SMART', disk_name)
+    await middleware.call('disk.smart_data_expire', disk_name)
     # If a disk dies we need to reconfigure swaps so we are not left
     # with a single disk mirror swap, which may be a point of failure.
     asyncio.ensure_future(middleware.call('disk.swaps_configure'))
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from middlewared.common.smart.smartctl import SMARTCTL_POWERMODES
+from middlewared.plugins.smart import parse_smart_selftest_results
+from middlewared.service import accepts, Int, private, Service, Str
+
+from .temperature import get_temperature
+
+
+class DiskService(Service):
+    # How long (in seconds) `smartctl` output for a disk is reused
+    SMART_DATA_MAX_AGE = 60
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.smart_data_cache = {}
+        self.smart_data_locks = {}
+
+    @private
+    @accepts(
+        Str('name'),
+        Str('powermode', enum=SMARTCTL_POWERMODES, default=SMARTCTL_POWERMODES[0]),
+        Int('max_age', null=True, default=None),
+    )
+    async def smart_data(self, name, powermode, max_age):
+        """
+        Returns parsed `smartctl -a` output for disk `name`.
+
+        `smartctl` is run at most once every `max_age` seconds (`SMART_DATA_MAX_AGE` by default) for each disk,
+        concurrent callers share the same invocation. `powermode` is passed to `smartctl -n` so disks that are in
+        a low power state are not woken up. In that case the last successfully read data is returned with
+        `available` set to `false` (or `null` if the disk was never read).
+        """
+        if max_age is None:
+            max_age = self.SMART_DATA_MAX_AGE
+
+        lock = self.smart_data_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            entry = self.smart_data_cache.get(name)
+            if entry is not None and time.monotonic() - entry['checked'] < max_age:
+                # Do not reuse failed attempt if the caller is willing to wake up the disk and the previous one was not
+                if entry['available'] or entry['powermode'] == powermode:
+                    return entry['data']
+
+            output = await self.middleware.call('disk.smartctl', name, ['-a', '-n', powermode.lower()],
+                                                {'silent': True})
+
+            if output is None:
+                if entry is None or entry['data'] is None:
+                    data = None
+                else:
+                    data = dict(entry['data'], available=False)
+            else:
+                data = {
+                    'available': True,
+                    'timestamp': time.time(),
+                    'temperature': get_temperature(output),
+                    'tests': parse_smart_selftest_results(output),
+                    'output': output,
+                }
+
+            self.smart_data_cache[name] = {
+                'checked': time.monotonic(),
+                'available': output is not None,
+                'powermode': powermode,
+                'data': data,
+            }
+
+            return data
+
+    @private
+    async def smart_data_expire(self, name=None):
+        """
+        Removes cached S.M.A.R.T. data for disk `name` (or for all disks), e.g. when it is removed from the system.
+        """
+        names = list(self.smart_data_locks) if name is None else [name]
+        for name in names:
+            self.smart_data_cache.pop(name, None)
+            # Lock that is held will be needed again by its waiters
+            lock = self.smart_data_locks.get(name)
+            if lock is not None and not lock.locked():
+                self.smart_data_locks.pop(name)
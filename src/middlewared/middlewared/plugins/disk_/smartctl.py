@@ -33,6 +33,9 @@ class DiskService(Service):
                     disks,
                     await asyncio_map(functools.partial(get_smartctl_args, self.middleware, devices), disks, 8)
                 ))
+
+                # Disk names might have been changed
+                await self.middleware.call('disk.smart_data_expire')
             except Exception:
                 self.logger.error("update_smartctl_args_for_disks failed", exc_info=True)
             finally:
@@ -93,101 +93,122 @@ class DiskService(Service, ServiceChangeMixin):
         }
         self.logger.info('Found disks: %r', log_info)
 
+        # Compute identifiers of all system disks once instead of translating every database entry separately.
+        # Only the disk in question is passed so that the identifier methods do not have to validate (and copy)
+        # the whole inventory for every call.
+        idents = {}
+        names = {}
+        for name, sys_disk in sys_disks.items():
+            ident = await self.middleware.call('disk.device_to_identifier', name, {name: sys_disk})
+            idents[name] = ident
+            if ident:
+                # If several disks share the same identifier we are probably dealing with multipath here
+                names.setdefault(ident, name)
+
+        now = datetime.utcnow()
+        expiretime = now + timedelta(days=self.DISK_EXPIRECACHE_DAYS)
+
+        rows = {}
+        inserted = set()
+        updated = set()
+        deleted = {}
         seen_disks = {}
-        serials = []
-        changed = False
+        serials = set()
+        enclosure_sync = []
         for disk in (
             await self.middleware.call('datastore.query', 'storage.disk', [], {'order_by': ['disk_expiretime']})
         ):
             original_disk = disk.copy()
+            rows[disk['disk_identifier']] = disk
 
-            name = await self.middleware.call('disk.identifier_to_device', disk['disk_identifier'], sys_disks)
-            if (
-                    not name or
-                    name in seen_disks or
-                    await self.middleware.call('disk.device_to_identifier', name) != disk['disk_identifier']
-            ):
+            name = names.get(disk['disk_identifier'])
+            if not name or name in seen_disks:
                 # If we cant translate the identifier to a device, give up
                 # If name has already been seen once then we are probably
                 # dealing with with multipath here
                 if not disk['disk_expiretime']:
-                    disk['disk_expiretime'] = datetime.utcnow() + timedelta(days=self.DISK_EXPIRECACHE_DAYS)
-                    await self.middleware.call('datastore.update', 'storage.disk', disk['disk_identifier'], disk)
-                    changed = True
-                elif disk['disk_expiretime'] < datetime.utcnow():
+                    disk['disk_expiretime'] = expiretime
+                    updated.add(disk['disk_identifier'])
+                elif disk['disk_expiretime'] < now:
                     # Disk expire time has surpassed, go ahead and remove it
-                    for extent in await self.middleware.call(
-                        'iscsi.extent.query', [['type', '=', 'DISK'], ['path', '=', disk['disk_identifier']]]
-                    ):
-                        await self.middleware.call('iscsi.extent.delete', extent['id'])
-                    if disk['disk_kmip_uid']:
-                        asyncio.ensure_future(self.middleware.call(
-                            'kmip.reset_sed_disk_password', disk['disk_identifier'], disk['disk_kmip_uid']
-                        ))
-                    await self.middleware.call('datastore.delete', 'storage.disk', disk['disk_identifier'])
-                    changed = True
+                    deleted[disk['disk_identifier']] = rows.pop(disk['disk_identifier'])
                 continue
             else:
                 disk['disk_expiretime'] = None
                 disk['disk_name'] = name
 
-            if name in sys_disks:
-                await self._map_device_disk_to_db(disk, sys_disks[name])
+            await self._map_device_disk_to_db(disk, sys_disks[name])
 
-            serial = (disk['disk_serial'] or '') + (sys_disks.get(name, {}).get('lunid') or '')
+            serial = (disk['disk_serial'] or '') + (sys_disks[name].get('lunid') or '')
             if serial:
-                serials.append(serial)
+                serials.add(serial)
 
-            # If for some reason disk is not identified as a system disk
-            # mark it to expire.
-            if name not in sys_disks and not disk['disk_expiretime']:
-                disk['disk_expiretime'] = datetime.utcnow() + timedelta(days=self.DISK_EXPIRECACHE_DAYS)
             # Do not issue unnecessary updates, they are slow on HA systems and cause severe boot delays
             # when lots of drives are present
             if self._disk_changed(disk, original_disk):
-                await self.middleware.call('datastore.update', 'storage.disk', disk['disk_identifier'], disk)
-                changed = True
+                updated.add(disk['disk_identifier'])
 
-            await self.middleware.call('enclosure.sync_disk', disk['disk_identifier'])
+            enclosure_sync.append(disk['disk_identifier'])
 
             seen_disks[name] = disk
 
         for name in sys_disks:
-            if name not in seen_disks:
-                disk_identifier = await self.middleware.call('disk.device_to_identifier', name, sys_disks)
-                qs = await self.middleware.call(
-                    'datastore.query', 'storage.disk', [('disk_identifier', '=', disk_identifier)]
-                )
-                if qs:
-                    new = False
-                    disk = qs[0]
-                else:
-                    new = True
-                    disk = {'disk_identifier': disk_identifier}
-                original_disk = disk.copy()
-                disk['disk_name'] = name
-                await self._map_device_disk_to_db(disk, sys_disks[name])
-                serial = disk['disk_serial'] + (sys_disks[name]['lunid'] or '')
-                if serial:
-                    if serial in serials:
-                        # Probably dealing with multipath here, do not add another
-                        continue
-                    else:
-                        serials.append(serial)
-
-                if not new:
-                    # Do not issue unnecessary updates, they are slow on HA systems and cause severe boot delays
-                    # when lots of drives are present
-                    if self._disk_changed(disk, original_disk):
-                        await self.middleware.call('datastore.update', 'storage.disk', disk['disk_identifier'], disk)
-                        changed = True
+            if name in seen_disks:
+                continue
+
+            disk_identifier = idents[name]
+            disk = rows.get(disk_identifier)
+            if disk is None:
+                new = True
+                disk = {'disk_identifier': disk_identifier}
+            else:
+                new = False
+            original_disk = disk.copy()
+            disk['disk_name'] = name
+            await self._map_device_disk_to_db(disk, sys_disks[name])
+            serial = disk['disk_serial'] + (sys_disks[name]['lunid'] or '')
+            if serial:
+                if serial in serials:
+                    # Probably dealing with multipath here, do not add another
+                    disk.update(original_disk)
+                    continue
                 else:
-                    await self.middleware.call('datastore.insert', 'storage.disk', disk)
-                    changed = True
+                    serials.add(serial)
+
+            if new:
+                rows[disk_identifier] = disk
+                inserted.add(disk_identifier)
+            elif self._disk_changed(disk, original_disk):
+                updated.add(disk_identifier)
+
+            enclosure_sync.append(disk_identifier)
+
+        if deleted:
+            for extent in await self.middleware.call(
+                'iscsi.extent.query', [['type', '=', 'DISK'], ['path', 'in', list(deleted)]]
+            ):
+                await self.middleware.call('iscsi.extent.delete', extent['id'])
+
+        operations = (
+            [{'type': 'DELETE', 'id': ident} for ident in deleted] +
+            [{'type': 'UPDATE', 'id': ident, 'data': rows[ident]} for ident in updated - inserted] +
+            [{'type': 'INSERT', 'data': rows[ident]} for ident in inserted]
+        )
+        self.logger.debug(
+            'Disks sync: %d inserted, %d updated, %d deleted', len(inserted), len(updated - inserted), len(deleted)
+        )
+        if operations:
+            await self.middleware.call('datastore.bulk', 'storage.disk', operations)
+
+        for disk in deleted.values():
+            if disk['disk_kmip_uid']:
+                asyncio.ensure_future(self.middleware.call(
+                    'kmip.reset_sed_disk_password', disk['disk_identifier'], disk['disk_kmip_uid']
+                ))
 
-                await self.middleware.call('enclosure.sync_disk', disk['disk_identifier'])
+        await self.middleware.call('enclosure.sync_disks', enclosure_sync)
 
-        if changed:
+        if operations:
             await self.middleware.call('disk.restart_services_after_sync')
         return 'OK'
 
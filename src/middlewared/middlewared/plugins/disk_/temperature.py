@@ -89,12 +89,11 @@ class DiskService(Service):
                 except Exception:
                     pass
 
-        output = await self.middleware.call('disk.smartctl', name, ['-a', '-n', powermode.lower()],
-                                            {'silent': True})
-        if output is None:
+        data = await self.middleware.call('disk.smart_data', name, powermode)
+        if data is None or not data['available']:
             return None
 
-        return get_temperature(output)
+        return data['temperature']
 
     @accepts(
         List('names', items=[Str('name')]),
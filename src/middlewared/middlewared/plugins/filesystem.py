@@ -4,29 +4,31 @@ try:
 except ImportError:
     acl = None
 import errno
-import functools
 import grp
+import itertools
 import os
 import pwd
-import select
 import shutil
 
-import psutil
-try:
-    import pyinotify
-except ImportError:
-    pyinotify = None
-
 from middlewared.main import EventSource
-from middlewared.schema import Bool, Dict, Int, Ref, Str, accepts
+from middlewared.schema import Bool, Dict, Int, List, Ref, Str, accepts
 from middlewared.service import private, CallError, Service, job
 from middlewared.utils import filter_list, osc
-from middlewared.utils.path import is_child
+from middlewared.plugins.filesystem_.mounts import MountTableCache
+from middlewared.plugins.filesystem_.tail import TailBrokers
+from middlewared.plugins.filesystem_.utils import posix_acl_is_trivial
 from middlewared.plugins.pwenc import PWENC_FILE_SECRET
 
+# `filesystem.listdir` entries fields that are known without calling stat(2)
+LISTDIR_SCANDIR_ATTRS = {'name', 'path', 'type'}
+
 
 class FilesystemService(Service):
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.mount_table = MountTableCache()
+
     @accepts(Str('path', required=True), Ref('query-filters'), Ref('query-options'))
     def listdir(self, path, filters=None, options=None):
         """
@@ -42,6 +44,14 @@ class FilesystemService(Service):
           uid(int): user id of entry owner
           gid(int): group id of entry onwer
           acl(bool): extended ACL is present on file
+
+        `query-options.extra.retrieve_acl` and `query-options.extra.retrieve_realpath` can be set to false to skip
+        determining `acl` and `realpath` (of SYMLINK entries) which are then `null`. The same happens if they are
+        not included in `query-options.select`.
+
+        Filters by `name`, `path` and `type` are applied while the directory is being read. If results are not
+        ordered (or ordered by these fields only), `query-options.offset` and `query-options.limit` are applied
+        before the rest of entries data is retrieved.
         """
         if not os.path.exists(path):
             raise CallError(f'Directory {path} does not exist', errno.ENOENT)
@@ -49,36 +59,103 @@ class FilesystemService(Service):
         if not os.path.isdir(path):
             raise CallError(f'Path {path} is not a directory', errno.ENOTDIR)
 
-        rv = []
-        for entry in os.scandir(path):
-            if entry.is_symlink():
-                etype = 'SYMLINK'
-            elif entry.is_dir():
-                etype = 'DIRECTORY'
-            elif entry.is_file():
-                etype = 'FILE'
+        filters = filters or []
+        options = options or {}
+        extra = options.get('extra') or {}
+        select = options.get('select') or []
+        retrieve_acl = extra.get('retrieve_acl', True) and (not select or 'acl' in select)
+        retrieve_realpath = extra.get('retrieve_realpath', True) and (not select or 'realpath' in select)
+
+        pre_filters = []
+        post_filters = []
+        for f in filters:
+            # `OR` (and anything else that is not a plain `[attr, op, value]` filter) is applied with all the data
+            if len(f) == 3 and isinstance(f[0], str) and f[0] in LISTDIR_SCANDIR_ATTRS:
+                pre_filters.append(f)
             else:
-                etype = 'OTHER'
-
-            data = {
-                'name': entry.name,
-                'path': entry.path,
-                'realpath': os.path.realpath(entry.path) if etype == 'SYMLINK' else entry.path,
-                'type': etype,
-            }
-            try:
-                stat = entry.stat()
-                data.update({
-                    'size': stat.st_size,
-                    'mode': stat.st_mode,
-                    'acl': False if self.acl_is_trivial(data["realpath"]) else True,
-                    'uid': stat.st_uid,
-                    'gid': stat.st_gid,
-                })
-            except FileNotFoundError:
-                data.update({'size': None, 'mode': None, 'acl': None, 'uid': None, 'gid': None})
-            rv.append(data)
-        return filter_list(rv, filters=filters or [], options=options or {})
+                post_filters.append(f)
+
+        entries = self._listdir_scandir(path, pre_filters)
+
+        order_by = options.get('order_by') or []
+        if post_filters or any(o.lstrip('-') not in LISTDIR_SCANDIR_ATTRS for o in order_by):
+            # All the data is required to filter or order the entries
+            return filter_list(
+                [self._listdir_entry(entry, data, retrieve_acl, retrieve_realpath) for entry, data in entries],
+                filters=post_filters,
+                options=options,
+            )
+
+        if options.get('count') is True:
+            return sum(1 for i in entries)
+
+        if order_by:
+            # Same semantics as `filter_list` ordering
+            entries = list(entries)
+            for o in order_by:
+                if o.startswith('-'):
+                    entries = sorted(entries, key=lambda x: x[1][o[1:]], reverse=True)
+                else:
+                    entries = sorted(entries, key=lambda x: x[1][o])
+
+        if options.get('get') is True:
+            offset, limit = 0, 1
+        else:
+            offset, limit = options.get('offset') or 0, options.get('limit') or None
+
+        return filter_list(
+            [
+                self._listdir_entry(entry, data, retrieve_acl, retrieve_realpath)
+                for entry, data in itertools.islice(entries, offset, offset + limit if limit else None)
+            ],
+            options={k: options[k] for k in ('select', 'get') if k in options},
+        )
+
+    def _listdir_scandir(self, path, filters):
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_symlink():
+                    etype = 'SYMLINK'
+                elif entry.is_dir():
+                    etype = 'DIRECTORY'
+                elif entry.is_file():
+                    etype = 'FILE'
+                else:
+                    etype = 'OTHER'
+
+                data = {
+                    'name': entry.name,
+                    'path': entry.path,
+                    'type': etype,
+                }
+                if filters and not filter_list([data], filters):
+                    continue
+
+                yield entry, data
+
+    def _listdir_entry(self, entry, data, retrieve_acl, retrieve_realpath):
+        if data['type'] != 'SYMLINK':
+            data['realpath'] = entry.path
+        elif retrieve_realpath:
+            data['realpath'] = os.path.realpath(entry.path)
+        else:
+            data['realpath'] = None
+
+        try:
+            stat = entry.stat()
+            data.update({
+                'size': stat.st_size,
+                'mode': stat.st_mode,
+                'acl': None,
+                'uid': stat.st_uid,
+                'gid': stat.st_gid,
+            })
+            if retrieve_acl:
+                data['acl'] = not self._acl_is_trivial(data['realpath'] or entry.path)
+        except FileNotFoundError:
+            data.update({'size': None, 'mode': None, 'acl': None, 'uid': None, 'gid': None})
+
+        return data
 
     @accepts(Str('path'))
     def stat(self, path):
@@ -225,22 +302,42 @@ class FilesystemService(Service):
         Raises:
             CallError(ENOENT) - Path not found
         """
+        return self._statfs(path, self.mount_table.get())
+
+    @accepts(List('paths', items=[Str('path')]))
+    def statfs_many(self, paths):
+        """
+        Return stats from the filesystems of given `paths` as a dictionary where keys are paths and values are
+        the same as `filesystem.statfs` returns (or `null` if the path is not found).
+        """
+        mounts = self.mount_table.get()
+        result = {}
+        for path in paths:
+            try:
+                result[path] = self._statfs(path, mounts)
+            except CallError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+                result[path] = None
+
+        return result
+
+    def _statfs(self, path, mounts):
         try:
             st = os.statvfs(path)
         except FileNotFoundError:
             raise CallError('Path not found.', errno.ENOENT)
 
-        for partition in sorted(psutil.disk_partitions(), key=lambda p: len(p.mountpoint), reverse=True):
-            if is_child(os.path.realpath(path), partition.mountpoint):
-                break
-        else:
+        partition = mounts.lookup(os.path.realpath(path))
+        if partition is None:
             raise CallError('Unable to find mountpoint.')
 
         return {
             'flags': [],
-            'fstype': partition.fstype,
-            'source': partition.device,
-            'dest': partition.mountpoint,
+            'fstype': partition['fstype'],
+            'source': partition['source'],
+            'dest': partition['mountpoint'],
             'blocksize': st.f_frsize,
             'total_blocks': st.f_blocks,
             'free_blocks': st.f_bfree,
@@ -264,9 +361,11 @@ class FilesystemService(Service):
         if not os.path.exists(path):
             raise CallError(f'Path not found [{path}].', errno.ENOENT)
 
+        return self._acl_is_trivial(path)
+
+    def _acl_is_trivial(self, path):
         if osc.IS_LINUX:
-            posix1e_acl = self.middleware.call_sync('filesystem.getacl_posix1e', path, True)
-            return True if len(posix1e_acl['acl']) == 3 else False
+            return posix_acl_is_trivial(path)
 
         if not os.pathconf(path, 64):
             return True
@@ -285,6 +384,8 @@ class FileFollowTailEventSource(EventSource):
     However `path` is required for this.
     """
 
+    brokers = TailBrokers()
+
     def run(self):
         if ':' in self.arg:
             path, lines = self.arg.rsplit(':', 1)
@@ -296,78 +397,15 @@ class FileFollowTailEventSource(EventSource):
             # FIXME: Error?
             return
 
-        bufsize = 8192
-        fsize = os.stat(path).st_size
-        if fsize < bufsize:
-            bufsize = fsize
-        i = 0
-        with open(path) as f:
-            data = []
-            while True:
-                i += 1
-                if bufsize * i > fsize:
-                    break
-                f.seek(fsize - bufsize * i)
-                data.extend(f.readlines())
-                if len(data) >= lines or f.tell() == 0:
-                    break
-
-            self.send_event('ADDED', fields={'data': ''.join(data[-lines:])})
-            f.seek(fsize)
-
-            if osc.IS_FREEBSD:
-                gen = self._follow_freebsd(f)
-            else:
-                gen = self._follow_linux(path, f)
-
-            for data in gen:
-                self.send_event('ADDED', fields={'data': data})
-
-    def _follow_freebsd(self, f):
-        kqueue = select.kqueue()
-
-        ev = [select.kevent(
-            f.fileno(),
-            filter=select.KQ_FILTER_VNODE,
-            flags=select.KQ_EV_ADD | select.KQ_EV_ENABLE | select.KQ_EV_CLEAR,
-            fflags=select.KQ_NOTE_DELETE | select.KQ_NOTE_EXTEND | select.KQ_NOTE_WRITE | select.KQ_NOTE_ATTRIB,
-        )]
-        kqueue.control(ev, 0, 0)
-
-        while not self._cancel.is_set():
-            events = kqueue.control([], 1, 1)
-            if not events:
-                continue
-            # TODO: handle other file operations other than just extend/write
-            yield f.read()
-
-    def _follow_linux(self, path, f):
-        queue = []
-        watch_manager = pyinotify.WatchManager()
-        notifier = pyinotify.Notifier(watch_manager)
-        watch_manager.add_watch(path, pyinotify.IN_MODIFY, functools.partial(self._follow_linux_callback, queue, f))
-
-        data = f.read()
-        if data:
-            yield data
-
-        while not self._cancel.is_set():
-            notifier.process_events()
-
-            data = "".join(queue)
-            if data:
-                yield data
-            queue[:] = []
-
-            if notifier.check_events():
-                notifier.read_events()
-
-        notifier.stop()
-
-    def _follow_linux_callback(self, queue, f, event):
-        data = f.read()
-        if data:
-            queue.append(data)
+        # All the subscribers following the same file share one reader
+        broker, subscriber = self.brokers.subscribe(path, lines)
+        try:
+            while not self._cancel.is_set():
+                data = subscriber.get(timeout=1)
+                if data:
+                    self.send_event('ADDED', fields={'data': data})
+        finally:
+            self.brokers.unsubscribe(broker, subscriber)
 
 
 def setup(middleware):
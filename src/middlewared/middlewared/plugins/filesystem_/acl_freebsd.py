@@ -93,7 +93,8 @@ class FilesystemService(Service, ACLBase):
             raise CallError(f"Changing permissions on paths outside of /mnt is not permitted: {path}",
                             errno.EPERM)
 
-        if os.path.realpath(path) in [x['path'] for x in self.middleware.call_sync('pool.query')]:
+        pools_paths = [x['path'] for x in self.middleware.call_sync('pool.query', [], {'select': ['path']})]
+        if os.path.realpath(path) in pools_paths:
             raise CallError(f"Changing permissions of root level dataset is not permitted: {path}",
                             errno.EPERM)
 
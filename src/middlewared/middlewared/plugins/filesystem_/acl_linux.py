@@ -6,6 +6,8 @@ import stat as pystat
 from middlewared.service import private, CallError, Service
 from middlewared.plugins.smb import SMBBuiltin
 from .acl_base import ACLBase, ACLDefault, ACLType
+from .utils import posix_acl_from_dacl
+from .walk import PermissionsWalkAborted, PermissionsWalker
 
 
 class FilesystemService(Service, ACLBase):
@@ -32,10 +34,27 @@ class FilesystemService(Service, ACLBase):
             raise CallError(f"Changing permissions on paths outside of /mnt is not permitted: {path}",
                             errno.EPERM)
 
-        if os.path.realpath(path) in [x['path'] for x in self.middleware.call_sync('pool.query')]:
+        pools_paths = [x['path'] for x in self.middleware.call_sync('pool.query', [], {'select': ['path']})]
+        if os.path.realpath(path) in pools_paths:
             raise CallError(f"Changing permissions of root level dataset is not permitted: {path}",
                             errno.EPERM)
 
+    def _walk(self, job, walker, path, description):
+        job.set_progress(10, description)
+
+        def progress(done, total):
+            job.set_progress(
+                10 + int(89 * done / total), f'{description} Processed {done} of approximately {total} files.'
+            )
+
+        try:
+            walker.walk(path, progress=progress, is_aborted=lambda: job.aborted)
+        except PermissionsWalkAborted:
+            raise CallError(f'Changing permissions of {path} was aborted.')
+
+        if walker.errors:
+            raise CallError(f'Failed to change permissions of [{path}]: {", ".join(walker.errors)}')
+
     def chown(self, job, data):
         job.set_progress(0, 'Preparing to change owner.')
 
@@ -51,23 +70,9 @@ class FilesystemService(Service, ACLBase):
         else:
             if uid == -1 and gid == -1:
                 return
-            job.set_progress(10, f'Recursively changing owner of {data["path"]}.')
-            # TODO: plumb in acltool to handle recursive / traverse so that we
-            # don't break mountpoints
-            # self.acltool(data['path'], 'chown', uid, gid, options)
-            if gid == -1:
-                chown = subprocess.run(['chown', '-R', str(uid), data['path']],
-                                       check=False, capture_output=True)
-            elif uid == -1:
-                chown = subprocess.run(['chgrp', '-R', str(gid), data['path']],
-                                       check=False, capture_output=True)
-            else:
-                chown = subprocess.run(['chown', '-R', f'{uid}:{gid}', data['path']],
-                                       check=False, capture_output=True)
-
-            if chown.returncode != 0:
-                raise CallError(f"Failed to chown [{data['path']}]: "
-                                f"{chown.stderr.decode()}")
+
+            walker = PermissionsWalker(uid, gid, traverse=options['traverse'])
+            self._walk(job, walker, data['path'], f'Recursively changing owner of {data["path"]}.')
 
             job.set_progress(100, 'Finished changing owner.')
 
@@ -91,50 +96,18 @@ class FilesystemService(Service, ACLBase):
         if mode is not None:
             mode = int(mode, 8)
 
-        stripacl = subprocess.run(['setfacl', '-b', data['path']],
-                                  check=False, capture_output=True)
-        if stripacl.returncode != 0:
-            raise CallError(f"Failed to remove POSIX1e ACL from [{data['path']}]: "
-                            f"{stripacl.stderr.decode()}")
-
-        if mode:
-            os.chmod(data['path'], mode)
-
-        os.chown(data['path'], uid, gid)
+        walker = PermissionsWalker(uid, gid, mode, strip_acl=True)
+        walker.apply(data['path'])
+        if walker.errors:
+            raise CallError(f"Failed to set permissions of [{data['path']}]: {', '.join(walker.errors)}")
 
         if not options['recursive']:
             job.set_progress(100, 'Finished setting permissions.')
             return
 
-        action = 'clone' if mode else 'strip'
-        job.set_progress(10, f'Recursively setting permissions on {data["path"]}.')
-        if action == 'strip':
-            stripacl = subprocess.run(['setfacl', '-bR', data['path']],
-                                      check=False, capture_output=True)
-            if stripacl.returncode != 0:
-                raise CallError(f"Failed to remove POSIX1e ACL from [{data['path']}]: "
-                                f"{stripacl.stderr.decode()}")
-
-        if uid != -1 or gid != -1:
-            if gid == -1:
-                chown = subprocess.run(['chown', '-R', str(uid), data['path']],
-                                       check=False, capture_output=True)
-            elif uid == -1:
-                chown = subprocess.run(['chgrp', '-R', str(gid), data['path']],
-                                       check=False, capture_output=True)
-            else:
-                chown = subprocess.run(['chown', '-R', f'{uid}:{gid}', data['path']],
-                                       check=False, capture_output=True)
-
-            if chown.returncode != 0:
-                raise CallError(f"Failed to chown [{data['path']}]: "
-                                f"{chown.stderr.decode()}")
-
-        chmod = subprocess.run(['chmod', '-R', str(data.get('mode')), data['path']],
-                               check=False, capture_output=True)
-        if chmod.returncode != 0:
-            raise CallError(f"Failed to chmod [{data['path']}]: "
-                            f"{chmod.stderr.decode()}")
+        # If `mode` is specified, it is cloned to all the files, otherwise extended ACLs are stripped
+        walker = PermissionsWalker(uid, gid, mode, strip_acl=mode is None, traverse=options['traverse'])
+        self._walk(job, walker, data['path'], f'Recursively setting permissions on {data["path"]}.')
 
         job.set_progress(100, 'Finished setting permissions.')
 
@@ -252,43 +225,26 @@ class FilesystemService(Service, ACLBase):
         if not aclcheck['is_valid']:
             raise CallError(f"POSIX1e ACL is invalid: {' '.join(aclcheck['errors'])}")
 
-        stripacl = subprocess.run(['setfacl', '-bR' if recursive else '-b', path],
-                                  check=False, capture_output=True)
-        if stripacl.returncode != 0:
-            raise CallError(f"Failed to remove POSIX1e ACL from [{path}]: "
-                            f"{stripacl.stderr.decode()}")
+        if options['stripacl']:
+            access_acl, default_acl = [], []
+        else:
+            access_acl, default_acl = posix_acl_from_dacl(dacl)
+
+        uid = -1 if data['uid'] is None else data['uid']
+        gid = -1 if data['gid'] is None else data['gid']
+        walker = PermissionsWalker(uid, gid, strip_acl=True, access_acl=access_acl, default_acl=default_acl,
+                                   traverse=options['traverse'])
+        if recursive:
+            self._walk(job, walker, path, f'Recursively setting POSIX1e ACL on {path}.')
+        else:
+            walker.apply(path)
+            if walker.errors:
+                raise CallError(f'Failed to set ACL on path [{path}]: {", ".join(walker.errors)}')
 
         if options['stripacl']:
             job.set_progress(100, "Finished removing POSIX1e ACL")
             return
 
-        job.set_progress(50, 'Reticulating splines.')
-
-        for idx, ace in enumerate(dacl):
-            if idx == 0:
-                aclstring = ""
-            else:
-                aclstring += ","
-
-            if ace['id'] == -1:
-                ace['id'] = ''
-
-            ace['tag'] = ace['tag'].rstrip('_OBJ').lower()
-
-            if ace['default']:
-                aclstring += "default:"
-
-            aclstring += f"{ace['tag']}:{ace['id']}:"
-            aclstring += 'r' if ace['perms']['READ'] else '-'
-            aclstring += 'w' if ace['perms']['WRITE'] else '-'
-            aclstring += 'x' if ace['perms']['EXECUTE'] else '-'
-
-        setacl = subprocess.run(['setfacl', '-mR' if recursive else '-m', aclstring, path],
-                                check=False, capture_output=True)
-        if setacl.returncode != 0:
-            return CallError(f'Failed to set ACL on path [{path}]: ',
-                             f'{setacl.stderr.decode()}')
-
         job.set_progress(100, 'Finished setting POSIX1e ACL.')
 
     def setacl(self, job, data):
@@ -0,0 +1,93 @@
+import os
+import re
+import select
+import threading
+
+import psutil
+
+from middlewared.utils import osc
+
+MOUNTS = '/proc/self/mounts'
+RE_MOUNTS_ESCAPE = re.compile(r'\\([0-7]{3})')
+
+
+def unescape(value):
+    # Spaces, tabs, newlines and backslashes are escaped as octal in /proc/self/mounts
+    return RE_MOUNTS_ESCAPE.sub(lambda m: chr(int(m.group(1), 8)), value)
+
+
+def parse_mounts(text):
+    mounts = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 4:
+            continue
+
+        mounts.append({
+            'source': unescape(fields[0]),
+            'mountpoint': unescape(fields[1]),
+            'fstype': fields[2],
+            'options': fields[3].split(','),
+        })
+
+    return mounts
+
+
+class MountTable:
+    """
+    Mounts indexed by mountpoint so that the mount that contains a path can be found in O(path depth).
+    """
+
+    def __init__(self, mounts):
+        # Later mounts are mounted on top of the earlier ones with the same mountpoint
+        self.mounts = {mount['mountpoint']: mount for mount in mounts}
+
+    def lookup(self, path):
+        """
+        Returns the mount that contains (normalized absolute) `path` or `None`.
+        """
+        while True:
+            mount = self.mounts.get(path)
+            if mount is not None:
+                return mount
+
+            if path == '/':
+                return None
+
+            path = os.path.dirname(path)
+
+
+class MountTableCache:
+    """
+    Mount table that is only re-read when the kernel notifies us (with `POLLPRI`) that it has changed.
+    """
+
+    def __init__(self, path=MOUNTS):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.poll = None
+        self.table = None
+
+    def get(self):
+        with self.lock:
+            if osc.IS_FREEBSD:
+                return MountTable([
+                    {'source': p.device, 'mountpoint': p.mountpoint, 'fstype': p.fstype, 'options': p.opts.split(',')}
+                    for p in psutil.disk_partitions(all=True)
+                ])
+
+            if self.file is None:
+                self.file = open(self.path)
+                self.poll = select.poll()
+                self.poll.register(self.file, select.POLLPRI | select.POLLERR)
+            elif self.table is not None and not self.poll.poll(0):
+                return self.table
+
+            self.file.seek(0)
+            self.table = MountTable(parse_mounts(self.file.read()))
+            return self.table
+
+    def invalidate(self):
+        with self.lock:
+            self.table = None
@@ -0,0 +1,224 @@
+import codecs
+from collections import deque
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def tail_lines(fd, end, lines, bufsize=8192):
+    """
+    Returns last `lines` lines of file descriptor `fd` that end at offset `end`.
+    """
+    data = b''
+    offset = end
+    while offset > 0 and data.count(b'\n') <= lines:
+        size = min(bufsize, offset)
+        offset -= size
+        data = os.pread(fd, size, offset) + data
+
+    return b''.join(data.splitlines(keepends=True)[-lines:]) if lines > 0 else b''
+
+
+class TailSubscriber:
+    """
+    Buffer of data read by `TailBroker` that was not yet consumed by a subscriber.
+
+    At most `max_buffer` characters are kept: if the subscriber falls behind, the oldest data is dropped (and counted
+    in `dropped`) so a slow consumer can not make the broker consume unbounded memory.
+    """
+
+    def __init__(self, max_buffer):
+        self.max_buffer = max_buffer
+        self.cond = threading.Condition()
+        self.chunks = deque()
+        self.size = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, data):
+        with self.cond:
+            self.chunks.append(data)
+            self.size += len(data)
+            while self.size > self.max_buffer:
+                excess = self.size - self.max_buffer
+                if len(self.chunks[0]) <= excess:
+                    chunk = self.chunks.popleft()
+                    self.size -= len(chunk)
+                    self.dropped += len(chunk)
+                else:
+                    self.chunks[0] = self.chunks[0][excess:]
+                    self.size -= excess
+                    self.dropped += excess
+
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Returns all the buffered data (waiting up to `timeout` seconds for it to appear) or an empty string.
+        """
+        with self.cond:
+            if not self.chunks and not self.closed:
+                self.cond.wait(timeout)
+
+            data = ''.join(self.chunks)
+            self.chunks.clear()
+            self.size = 0
+            return data
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+
+class TailBroker:
+    """
+    Follows a single file and fans out everything that is appended to it to all the subscribers.
+
+    The file is read by a single thread every `interval` seconds, so rapid appends are batched into one chunk of data.
+    Rotation (the path now refers to another file) and truncation are detected: the remainder of the rotated file is
+    read before continuing from the beginning of the new one.
+    """
+
+    def __init__(self, path, interval=0.5, max_buffer=1024 * 1024, max_read=4 * 1024 * 1024):
+        self.path = path
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.max_read = max_read
+
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.file = None
+        self.position = 0
+        self.decoder = None
+        self.stop_event = None
+
+    def subscribe(self, lines):
+        """
+        Returns a new `TailSubscriber` with last `lines` lines of the file already buffered.
+        """
+        subscriber = TailSubscriber(self.max_buffer)
+        with self.lock:
+            if self.file is None:
+                self._open()
+                self.position = os.fstat(self.file.fileno()).st_size
+
+            # Read under the lock so that the subscriber gets exactly what precedes the next broadcast
+            subscriber.put(tail_lines(self.file.fileno(), self.position, lines).decode('utf-8', 'replace'))
+
+            self.subscribers.add(subscriber)
+
+            if self.stop_event is None:
+                self.stop_event = threading.Event()
+                threading.Thread(
+                    target=self._run, args=(self.stop_event,), name=f'tail:{self.path}', daemon=True,
+                ).start()
+
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """
+        Removes `subscriber`. Returns True if there are no subscribers left (and the broker was stopped).
+        """
+        subscriber.close()
+        with self.lock:
+            self.subscribers.discard(subscriber)
+            if self.subscribers:
+                return False
+
+            if self.stop_event is not None:
+                self.stop_event.set()
+                self.stop_event = None
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            return True
+
+    def poll(self):
+        """
+        Reads everything that was appended since the last call and sends it to the subscribers.
+        """
+        with self.lock:
+            if self.file is None:
+                return
+
+            try:
+                data = self._read_changes()
+            except OSError as e:
+                logger.debug('Failed to read %r: %r', self.path, e)
+                return
+
+            if data:
+                for subscriber in self.subscribers:
+                    subscriber.put(data)
+
+    def _run(self, stop_event):
+        while not stop_event.wait(self.interval):
+            self.poll()
+
+    def _open(self):
+        self.file = open(self.path, 'rb')
+        self.position = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+
+    def _read_changes(self):
+        if os.fstat(self.file.fileno()).st_size < self.position:
+            # Truncated (e.g. `copytruncate` log rotation)
+            self.position = 0
+
+        data = self._read()
+
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # Rotated but the new file was not created yet
+            return data
+
+        fst = os.fstat(self.file.fileno())
+        if (st.st_dev, st.st_ino) != (fst.st_dev, fst.st_ino) and len(data) < self.max_read:
+            self.file.close()
+            self._open()
+            data += self._read()
+
+        return data
+
+    def _read(self):
+        self.file.seek(self.position)
+        data = self.file.read(self.max_read)
+        self.position += len(data)
+        return self.decoder.decode(data)
+
+
+class TailBrokers:
+    """
+    `TailBroker` registry: all the subscribers that follow the same path share one broker.
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.lock = threading.Lock()
+        self.brokers = {}
+
+    def subscribe(self, path, lines):
+        """
+        Returns `(broker, subscriber)` for `path`.
+        """
+        path = os.path.realpath(path)
+        with self.lock:
+            broker = self.brokers.get(path)
+            if broker is None:
+                broker = self.brokers[path] = TailBroker(path, **self.kwargs)
+
+            try:
+                return broker, broker.subscribe(lines)
+            except Exception:
+                if not broker.subscribers:
+                    self.brokers.pop(path)
+                raise
+
+    def unsubscribe(self, broker, subscriber):
+        with self.lock:
+            if broker.unsubscribe(subscriber) and self.brokers.get(broker.path) is broker:
+                self.brokers.pop(broker.path)
@@ -0,0 +1,135 @@
+import errno
+import os
+import struct
+
+# POSIX1e ACLs as they are stored by Linux in `system.posix_acl_access` and `system.posix_acl_default` extended
+# attributes: a little-endian `u32 version` header followed by `u16 tag, u16 perm, u32 id` entries.
+POSIX_ACL_XATTR_ACCESS = 'system.posix_acl_access'
+POSIX_ACL_XATTR_DEFAULT = 'system.posix_acl_default'
+POSIX_ACL_XATTR_VERSION = 2
+POSIX_ACL_XATTR_HEADER = struct.Struct('<I')
+POSIX_ACL_XATTR_ENTRY = struct.Struct('<HHI')
+
+ACL_USER_OBJ = 0x01
+ACL_USER = 0x02
+ACL_GROUP_OBJ = 0x04
+ACL_GROUP = 0x08
+ACL_MASK = 0x10
+ACL_OTHER = 0x20
+ACL_UNDEFINED_ID = 0xffffffff
+POSIX_ACL_TAGS = {
+    'USER_OBJ': ACL_USER_OBJ,
+    'USER': ACL_USER,
+    'GROUP_OBJ': ACL_GROUP_OBJ,
+    'GROUP': ACL_GROUP,
+    'MASK': ACL_MASK,
+    'OTHER': ACL_OTHER,
+}
+
+# ACL is not supported by the filesystem or is not set on the file
+ACL_ABSENT_ERRNOS = (errno.ENODATA, errno.EOPNOTSUPP, errno.ENOTSUP)
+
+
+def posix_acl_decode(value):
+    """
+    Decodes POSIX1e ACL extended attribute `value` to a list of `(tag, perm, id)`.
+    """
+    if len(value) < POSIX_ACL_XATTR_HEADER.size:
+        raise ValueError('POSIX1e ACL extended attribute is too short')
+
+    version, = POSIX_ACL_XATTR_HEADER.unpack_from(value)
+    if version != POSIX_ACL_XATTR_VERSION:
+        raise ValueError(f'Unsupported POSIX1e ACL extended attribute version: {version}')
+
+    return list(POSIX_ACL_XATTR_ENTRY.iter_unpack(value[POSIX_ACL_XATTR_HEADER.size:]))
+
+
+def posix_acl_encode(entries):
+    """
+    Encodes a list of `(tag, perm, id)` to POSIX1e ACL extended attribute value.
+    """
+    return POSIX_ACL_XATTR_HEADER.pack(POSIX_ACL_XATTR_VERSION) + b''.join(
+        POSIX_ACL_XATTR_ENTRY.pack(*entry) for entry in entries
+    )
+
+
+def posix_acl_get(path, name):
+    """
+    Returns entries of POSIX1e ACL stored in extended attribute `name` of `path` or `None` if there is no such ACL.
+    """
+    try:
+        return posix_acl_decode(os.getxattr(path, name))
+    except OSError as e:
+        if e.errno in ACL_ABSENT_ERRNOS:
+            return None
+
+        raise
+
+
+def posix_acl_is_trivial(path):
+    """
+    Returns True if POSIX1e ACL of `path` can be fully expressed as a file mode (i.e. it only consists of owner,
+    group and other entries and there is no default ACL).
+
+    Equivalent to counting the entries `getfacl` outputs but does not spawn a process.
+    """
+    access = posix_acl_get(path, POSIX_ACL_XATTR_ACCESS)
+    if access is not None and len(access) > 3:
+        return False
+
+    if posix_acl_get(path, POSIX_ACL_XATTR_DEFAULT):
+        return False
+
+    return True
+
+
+def posix_acl_from_mode(mode):
+    """
+    Returns minimal POSIX1e ACL equivalent to file `mode`.
+    """
+    return [
+        (ACL_USER_OBJ, (mode >> 6) & 0o7, ACL_UNDEFINED_ID),
+        (ACL_GROUP_OBJ, (mode >> 3) & 0o7, ACL_UNDEFINED_ID),
+        (ACL_OTHER, mode & 0o7, ACL_UNDEFINED_ID),
+    ]
+
+
+def posix_acl_merge(acl, entries):
+    """
+    Adds `entries` to `acl` (replacing existing entries with the same tag and id) and recalculates the mask entry
+    unless it is one of the `entries`, the same way `setfacl -m` does.
+    """
+    result = {(tag, id): perm for tag, perm, id in acl}
+    for tag, perm, id in entries:
+        result[(tag, id)] = perm
+
+    if not any(tag == ACL_MASK for tag, perm, id in entries):
+        result.pop((ACL_MASK, ACL_UNDEFINED_ID), None)
+        if any(tag in (ACL_USER, ACL_GROUP) for tag, id in result):
+            mask = 0
+            for (tag, id), perm in result.items():
+                if tag in (ACL_USER, ACL_GROUP_OBJ, ACL_GROUP):
+                    mask |= perm
+            result[(ACL_MASK, ACL_UNDEFINED_ID)] = mask
+
+    # Entries must be sorted by tag and then by id
+    return [(tag, perm, id) for (tag, id), perm in sorted(result.items())]
+
+
+def posix_acl_from_dacl(dacl):
+    """
+    Converts `filesystem.setacl` POSIX1e `dacl` to `(access, default)` lists of `(tag, perm, id)`.
+    """
+    access = []
+    default = []
+    for ace in dacl:
+        tag = POSIX_ACL_TAGS[ace['tag']]
+        perm = (
+            (0o4 if ace['perms']['READ'] else 0) |
+            (0o2 if ace['perms']['WRITE'] else 0) |
+            (0o1 if ace['perms']['EXECUTE'] else 0)
+        )
+        id = ACL_UNDEFINED_ID if ace['id'] in (None, -1) or tag not in (ACL_USER, ACL_GROUP) else ace['id']
+        (default if ace['default'] else access).append((tag, perm, id))
+
+    return access, default
@@ -0,0 +1,183 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import errno
+import os
+import stat as pystat
+import threading
+import time
+
+from .utils import (
+    ACL_GROUP_OBJ, ACL_OTHER, ACL_USER_OBJ, POSIX_ACL_XATTR_ACCESS, POSIX_ACL_XATTR_DEFAULT, posix_acl_encode,
+    posix_acl_from_mode, posix_acl_merge,
+)
+
+
+class PermissionsWalkAborted(Exception):
+    pass
+
+
+class PermissionsWalker:
+    """
+    Applies ownership, mode and POSIX1e ACL changes to a directory tree in a single pass.
+
+    Directories are processed in parallel by a thread pool (the work is dominated by system calls that release the
+    GIL). Files that already have the requested owner or mode are not changed.
+
+    `uid` and `gid` of -1 and `mode` of `None` are not changed. If `strip_acl` is set, extended ACLs are removed.
+    `access_acl` and `default_acl` (lists of `(tag, perm, id)`) are merged into the ACL equivalent to the file mode
+    (like `setfacl -m` does after extended ACL was stripped). `default_acl` is only applied to directories.
+    """
+
+    MAX_ERRORS = 10
+
+    def __init__(self, uid=-1, gid=-1, mode=None, strip_acl=False, access_acl=None, default_acl=None,
+                 traverse=False, workers=8):
+        self.uid = uid
+        self.gid = gid
+        self.mode = mode
+        self.strip_acl = strip_acl
+        self.access_acl = access_acl or []
+        self.default_acl = default_acl or []
+        self.traverse = traverse
+        self.workers = workers
+
+        self.lock = threading.Lock()
+        self.done = 0
+        self.estimated_total = 0
+        self.devices = set()
+        self.errors = []
+
+    def apply(self, path, st=None):
+        """
+        Applies changes to a single `path`.
+        """
+        try:
+            if st is None:
+                st = os.lstat(path)
+
+            if pystat.S_ISLNK(st.st_mode):
+                if self._chown_needed(st):
+                    os.chown(path, self.uid, self.gid, follow_symlinks=False)
+                return
+
+            if self.strip_acl:
+                xattrs = os.listxattr(path, follow_symlinks=False)
+                for name in (POSIX_ACL_XATTR_ACCESS, POSIX_ACL_XATTR_DEFAULT):
+                    if name in xattrs:
+                        os.removexattr(path, name, follow_symlinks=False)
+
+            if self._chown_needed(st):
+                os.chown(path, self.uid, self.gid, follow_symlinks=False)
+
+            mode = pystat.S_IMODE(st.st_mode)
+            # chown(2) might have reset setuid and setgid bits
+            if self.mode is not None and (mode != self.mode or self._chown_needed(st)):
+                os.chmod(path, self.mode)
+                mode = self.mode
+
+            if self.access_acl or self.default_acl:
+                access = posix_acl_merge(posix_acl_from_mode(mode), self.access_acl)
+                if self.access_acl:
+                    os.setxattr(path, POSIX_ACL_XATTR_ACCESS, posix_acl_encode(access), follow_symlinks=False)
+
+                if self.default_acl and pystat.S_ISDIR(st.st_mode):
+                    # Required entries that are not specified are copied from the access ACL
+                    default = posix_acl_merge(
+                        [entry for entry in access if entry[0] in (ACL_USER_OBJ, ACL_GROUP_OBJ, ACL_OTHER)],
+                        self.default_acl,
+                    )
+                    os.setxattr(path, POSIX_ACL_XATTR_DEFAULT, posix_acl_encode(default), follow_symlinks=False)
+        except FileNotFoundError:
+            # Removed while we were walking the tree
+            pass
+        except OSError as e:
+            self._error(path, e)
+
+    def walk(self, path, progress=None, is_aborted=None, progress_interval=1):
+        """
+        Applies changes to `path` and everything under it.
+
+        `progress(done, estimated_total)` is called at most every `progress_interval` seconds. The total number of
+        files is estimated from the number of used inodes of the filesystems being walked. `PermissionsWalkAborted`
+        is raised as soon as possible once `is_aborted()` returns True.
+        """
+        st = os.lstat(path)
+        self._add_device(path, st)
+        self.apply(path, st)
+        self.done += 1
+        if not pystat.S_ISDIR(st.st_mode):
+            return
+
+        last_progress = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self._walk_directory, path, st.st_dev)}
+            try:
+                while pending:
+                    done, pending = wait(pending, timeout=progress_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for subdir, dev in future.result():
+                            pending.add(executor.submit(self._walk_directory, subdir, dev))
+
+                    if is_aborted is not None and is_aborted():
+                        raise PermissionsWalkAborted()
+
+                    if progress is not None and time.monotonic() - last_progress >= progress_interval:
+                        last_progress = time.monotonic()
+                        progress(self.done, max(self.done, self.estimated_total))
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _walk_directory(self, path, dev):
+        subdirs = []
+        done = 0
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+
+                    if pystat.S_ISDIR(st.st_mode) and st.st_dev != dev:
+                        if not self.traverse:
+                            # A mountpoint of a child dataset
+                            continue
+
+                        self._add_device(entry.path, st)
+
+                    self.apply(entry.path, st)
+                    done += 1
+
+                    if pystat.S_ISDIR(st.st_mode):
+                        subdirs.append((entry.path, st.st_dev))
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                self._error(path, e)
+
+        with self.lock:
+            self.done += done
+
+        return subdirs
+
+    def _add_device(self, path, st):
+        with self.lock:
+            if st.st_dev in self.devices:
+                return
+
+            self.devices.add(st.st_dev)
+
+        try:
+            statvfs = os.statvfs(path)
+        except OSError:
+            return
+
+        with self.lock:
+            self.estimated_total += statvfs.f_files - statvfs.f_ffree
+
+    def _error(self, path, e):
+        with self.lock:
+            if len(self.errors) < self.MAX_ERRORS:
+                self.errors.append(f'{path}: {e.strerror or e}')
+
+    def _chown_needed(self, st):
+        return (self.uid != -1 and st.st_uid != self.uid) or (self.gid != -1 and st.st_gid != self.gid)
@@ -2,7 +2,7 @@ from middlewared.async_validators import check_path_resides_within_volume
 from middlewared.common.attachment import LockableFSAttachmentDelegate
 from middlewared.common.listen import ListenDelegate
 from middlewared.schema import (accepts, Bool, Dict, IPAddr, Int, List, Patch,
-                                Str)
+                                Ref, Str)
 from middlewared.service import CallError, CRUDService, private, ServiceChangeMixin, SharingService, ValidationErrors
 import middlewared.sqlalchemy as sa
 from middlewared.utils import osc, run
@@ -664,6 +664,162 @@ class iSCSITargetExtentService(SharingService):
         finally:
             await self._service_change('iscsitarget', 'reload')
 
+    @accepts(List('extents', items=[Ref('iscsi_extent_create')]))
+    async def bulk_create(self, extents):
+        """
+        Create multiple iSCSI Extents at once.
+
+        All the extents are validated before any of them is created. They are written in a single transaction and
+        iSCSI service is reloaded only once.
+        """
+        verrors = ValidationErrors()
+        missing_serials = len([data for data in extents if data['serial'] is None])
+        serials = iter(await self.extent_serials(missing_serials) if missing_serials else [])
+        context = await self.clean_context()
+        for i, data in enumerate(extents):
+            if data['serial'] is None:
+                data['serial'] = next(serials)
+
+            await self.compress(data)
+            await self.validate(data)
+            await self.clean(data, f'iscsi_extent_bulk_create.{i}', verrors, context=context)
+
+        if verrors:
+            raise verrors
+
+        for i, data in enumerate(extents):
+            await self.save(data, f'iscsi_extent_bulk_create.{i}', verrors)
+
+        ids = await self.middleware.call(
+            'datastore.bulk', self._config.datastore,
+            [{'type': 'INSERT', 'data': {**data, 'vendor': 'TrueNAS'}} for data in extents],
+            {'prefix': self._config.datastore_prefix}
+        )
+
+        await self._service_change('iscsitarget', 'reload')
+
+        return await self.query([['id', 'in', ids]])
+
+    @accepts(
+        List('extents', items=[
+            Patch(
+                'iscsi_extent_create',
+                'iscsi_extent_bulk_update_item',
+                ('attr', {'update': True}),
+                ('add', Int('id', required=True)),
+            ),
+        ])
+    )
+    async def bulk_update(self, extents):
+        """
+        Update multiple iSCSI Extents at once. Each item must contain `id` of the extent being updated.
+
+        All the changes are validated before any of them is applied. They are written in a single transaction and
+        iSCSI service is reloaded only once.
+        """
+        verrors = ValidationErrors()
+        ids = []
+        for i, data in enumerate(extents):
+            if data.get('id') is None:
+                verrors.add(f'iscsi_extent_bulk_update.{i}.id', 'This field is required')
+            elif data['id'] in ids:
+                verrors.add(f'iscsi_extent_bulk_update.{i}.id', 'Only one update per extent is allowed')
+            ids.append(data.get('id'))
+
+        if verrors:
+            raise verrors
+
+        olds = {extent['id']: extent for extent in await self.query([['id', 'in', ids]])}
+        context = await self.clean_context(ids)
+        updates = []
+        for i, data in enumerate(extents):
+            schema_name = f'iscsi_extent_bulk_update.{i}'
+            old = olds.get(data['id'])
+            if old is None:
+                verrors.add(f'{schema_name}.id', f'{self._config.verbose_name} {data["id"]} does not exist',
+                            errno.ENOENT)
+                continue
+
+            new = old.copy()
+            new.update(data)
+
+            await self.compress(new)
+            await self.validate(new)
+            await self.clean(new, schema_name, verrors, old=old, context=context)
+
+            updates.append((schema_name, new))
+
+        if verrors:
+            raise verrors
+
+        for schema_name, new in updates:
+            await self.save(new, schema_name, verrors)
+            new.pop(self.locked_field)
+
+        await self.middleware.call(
+            'datastore.bulk', self._config.datastore,
+            [{'type': 'UPDATE', 'id': new['id'], 'data': new} for schema_name, new in updates],
+            {'prefix': self._config.datastore_prefix}
+        )
+
+        await self._service_change('iscsitarget', 'reload')
+
+        return await self.query([['id', 'in', ids]])
+
+    @accepts(
+        List('ids', items=[Int('id')]),
+        Bool('remove', default=False),
+        Bool('force', default=False),
+    )
+    async def bulk_delete(self, ids, remove, force):
+        """
+        Delete multiple iSCSI Extents at once (along with their associations with targets).
+
+        `remove` and `force` have the same meaning as in `iscsi.extent.delete`.
+        """
+        extents = {extent['id']: extent for extent in await self.query([['id', 'in', ids]])}
+        verrors = ValidationErrors()
+        for i, id in enumerate(ids):
+            if id not in extents:
+                verrors.add(f'iscsi_extent_bulk_delete.{i}', f'{self._config.verbose_name} {id} does not exist',
+                            errno.ENOENT)
+
+        if verrors:
+            raise verrors
+
+        target_to_extents = await self.middleware.call('iscsi.targetextent.query', [['extent', 'in', list(extents)]])
+        active_sessions = await self.middleware.call(
+            'iscsi.target.active_sessions_for_targets', list({t['target'] for t in target_to_extents})
+        )
+        if active_sessions:
+            sessions_str = f'Associated target(s) {",".join(active_sessions)} ' \
+                           f'{"is" if len(active_sessions) == 1 else "are"} in use.'
+            if force:
+                self.middleware.logger.warning('%s. Forcing deletion of extents.', sessions_str)
+            else:
+                raise CallError(sessions_str)
+
+        if remove:
+            for data in extents.values():
+                await self.compress(data)
+                delete = await self.remove_extent_file(data)
+
+                if delete is not True:
+                    raise CallError(f'Failed to remove extent file {data["path"]}')
+
+        try:
+            await self.middleware.call(
+                'datastore.bulk', 'services.iscsitargettoextent',
+                [{'type': 'DELETE', 'id': target_to_extent['id']} for target_to_extent in target_to_extents],
+                {'prefix': 'iscsi_'}
+            )
+            return await self.middleware.call(
+                'datastore.bulk', self._config.datastore, [{'type': 'DELETE', 'id': id} for id in extents],
+                {'prefix': self._config.datastore_prefix}
+            )
+        finally:
+            await self._service_change('iscsitarget', 'reload')
+
     @private
     async def validate(self, data):
         data['serial'] = await self.extent_serial(data['serial'])
@@ -698,7 +854,8 @@ class iSCSITargetExtentService(SharingService):
             'pools': {
                 p['name']: {'disks': await self.middleware.call('zfs.pool.get_disks', p['name']), 'all_flash': False}
                 for p in await self.middleware.call('pool.query', [['is_decrypted', '=', True],
-                                                                   ['status', '!=', 'OFFLINE']])
+                                                                   ['status', '!=', 'OFFLINE']],
+                                                    {'select': ['name', 'is_decrypted', 'status']})
             }
         }
         disks_names = {}
@@ -760,13 +917,34 @@ class iSCSITargetExtentService(SharingService):
         return data
 
     @private
-    async def clean(self, data, schema_name, verrors, old=None):
-        await self.clean_name(data, schema_name, verrors, old=old)
-        await self.clean_type_and_path(data, schema_name, verrors)
+    async def clean(self, data, schema_name, verrors, old=None, context=None):
+        await self.clean_name(data, schema_name, verrors, old=old, context=context)
+        await self.clean_type_and_path(data, schema_name, verrors, context=context)
         await self.clean_size(data, schema_name, verrors)
 
     @private
-    async def clean_name(self, data, schema_name, verrors, old=None):
+    async def clean_context(self, exclude_ids=None):
+        """
+        Data that `clean` would otherwise query for every extent. Used to validate many extents at once.
+
+        Extents with `exclude_ids` are being updated so their names are not considered taken.
+        """
+        exclude_ids = set(exclude_ids or [])
+        return {
+            'names': {
+                extent['name']
+                for extent in await self.middleware.call(
+                    'datastore.query', self._config.datastore, [], {'prefix': self._config.datastore_prefix},
+                )
+                if extent['id'] not in exclude_ids
+            },
+            # These are only retrieved if any of the extents needs them
+            'unused_disks': None,
+            'datasets': None,
+        }
+
+    @private
+    async def clean_name(self, data, schema_name, verrors, old=None, context=None):
         name = data['name']
         old = old['name'] if old is not None else None
         serial = data['serial']
@@ -780,7 +958,13 @@ class iSCSITargetExtentService(SharingService):
         if osc.IS_FREEBSD and len(serial) > 15:
             verrors.add(f'{schema_name}.serial', 'Maximum length of 15 characters is allowed for extent serial')
 
-        if name != old or old is None:
+        if context is not None:
+            name_result = name in context['names']
+            context['names'].add(name)
+            if name_result:
+                verrors.add(f'{schema_name}.name',
+                            'Extent name must be unique')
+        elif name != old or old is None:
             name_result = await self.middleware.call(
                 'datastore.query', self._config.datastore,
                 name_filters,
@@ -791,7 +975,7 @@ class iSCSITargetExtentService(SharingService):
                             'Extent name must be unique')
 
     @private
-    async def clean_type_and_path(self, data, schema_name, verrors):
+    async def clean_type_and_path(self, data, schema_name, verrors, context=None):
         extent_type = data['type']
         disk = data['disk']
         path = data['path']
@@ -802,6 +986,13 @@ class iSCSITargetExtentService(SharingService):
         if extent_type == 'Disk':
             if not disk:
                 verrors.add(f'{schema_name}.disk', 'This field is required')
+            elif context is not None:
+                if context['unused_disks'] is None:
+                    context['unused_disks'] = {i['name'] for i in await self.middleware.call('disk.get_unused')}
+                if disk not in context['unused_disks']:
+                    verrors.add(f'{schema_name}.disk', 'Disk in use or not found', errno.ENOENT)
+                # The same disk can't be used by more than one extent
+                context['unused_disks'].discard(disk)
             else:
                 available = [i['name'] for i in await self.middleware.call('disk.get_unused')]
                 if disk not in available:
@@ -809,7 +1000,16 @@ class iSCSITargetExtentService(SharingService):
         elif extent_type == 'ZVOL':
             if disk.startswith('zvol'):
                 zvol_name = disk.split('zvol/', 1)[-1]
-                zvol = await self.middleware.call('pool.dataset.query', [['id', '=', zvol_name]])
+                if context is not None:
+                    if context['datasets'] is None:
+                        context['datasets'] = {
+                            ds['id'] for ds in await self.middleware.call(
+                                'zfs.dataset.query', [], {'extra': {'retrieve_properties': False}},
+                            )
+                        }
+                    zvol = zvol_name in context['datasets']
+                else:
+                    zvol = await self.middleware.call('pool.dataset.query', [['id', '=', zvol_name]])
                 if not zvol:
                     verrors.add(f'{schema_name}.disk', f'Zvol {zvol_name} does not exist')
         elif extent_type == 'File':
@@ -865,33 +1065,45 @@ class iSCSITargetExtentService(SharingService):
 
     @private
     async def extent_serial(self, serial):
-        # TODO Just ported, let's do something different later? - Brandon
         if serial is None:
-            try:
-                nic = (await self.middleware.call('interface.query',
-                                                  [['name', 'rnin', 'vlan'],
-                                                   ['name', 'rnin', 'lagg'],
-                                                   ['name', 'rnin', 'epair'],
-                                                   ['name', 'rnin', 'vnet'],
-                                                   ['name', 'rnin', 'bridge']])
-                       )[0]
-                mac = nic['state']['link_address'].replace(':', '').strip()
-
-                ltg = await self.query([], {'order_by': ['id']})
-                if len(ltg) > 0:
-                    lid = ltg[-1]['id']
-                else:
-                    lid = 0
-                if osc.IS_LINUX:
-                    return f'{mac}{lid:03}'
-                else:
-                    return f'{mac[:15-max(3, len(str(lid)))]}{lid:03}'[:15]
-            except Exception:
-                self.logger.error('Failed to generate serial, generating a random default', exc_info=True)
-                return secrets.token_hex()[:15]
+            return (await self.extent_serials(1))[0]
         else:
             return serial
 
+    @private
+    async def extent_serials(self, count):
+        """
+        Generates default serials for `count` new extents.
+        """
+        # TODO Just ported, let's do something different later? - Brandon
+        try:
+            nic = (await self.middleware.call('interface.query',
+                                              [['name', 'rnin', 'vlan'],
+                                               ['name', 'rnin', 'lagg'],
+                                               ['name', 'rnin', 'epair'],
+                                               ['name', 'rnin', 'vnet'],
+                                               ['name', 'rnin', 'bridge']])
+                   )[0]
+            mac = nic['state']['link_address'].replace(':', '').strip()
+
+            ltg = await self.middleware.call('datastore.query', self._config.datastore, [],
+                                             {'order_by': ['-id'], 'limit': 1})
+            if len(ltg) > 0:
+                lid = ltg[0]['id']
+            else:
+                lid = 0
+
+            serials = []
+            for lid in range(lid, lid + count):
+                if osc.IS_LINUX:
+                    serials.append(f'{mac}{lid:03}')
+                else:
+                    serials.append(f'{mac[:15-max(3, len(str(lid)))]}{lid:03}'[:15])
+            return serials
+        except Exception:
+            self.logger.error('Failed to generate serial, generating a random default', exc_info=True)
+            return [secrets.token_hex()[:15] for i in range(count)]
+
     @private
     def extent_naa(self, naa):
         if naa is None:
@@ -16,6 +16,7 @@ import secrets
 import shutil
 import subprocess
 import tempfile
+import threading
 import uuid
 
 from collections import defaultdict
@@ -33,7 +34,8 @@ from middlewared.service_exception import ValidationError
 import middlewared.sqlalchemy as sa
 from middlewared.utils import osc, Popen, filter_list, run, start_daemon_thread
 from middlewared.utils.asyncio_ import asyncio_map
-from middlewared.utils.path import is_child
+from middlewared.utils.open_files import OpenFilesIndex
+from middlewared.utils.path import path_in_locked_datasets
 from middlewared.utils.shell import join_commandline
 from middlewared.validators import Exact, Match, Or, Range, Time
 
@@ -256,9 +258,13 @@ class PoolService(CRUDService):
     class Config:
         datastore = 'storage.volume'
         datastore_extend = 'pool.pool_extend'
+        datastore_extend_context = 'pool.pool_extend_context'
         datastore_prefix = 'vol_'
         event_send = False
 
+    # Fields that require retrieving and transforming full pool topology
+    TOPOLOGY_FIELDS = ('scan', 'topology')
+
     @item_method
     @accepts(
         Int('id', required=True),
@@ -455,32 +461,55 @@ class PoolService(CRUDService):
         return result
 
     @private
-    def pool_extend(self, pool):
+    async def get_options(self, options):
+        options = await super().get_options(options)
+        # Topology and scan status are expensive to retrieve, only do that if they are going to be returned
+        select = options.get('select') or []
+        options['extra'] = dict(
+            options.get('extra') or {},
+            pool_topology=not select or any(field in select for field in self.TOPOLOGY_FIELDS),
+        )
+        return options
+
+    @private
+    async def pool_extend_context(self, extra):
+        topology = extra.get('pool_topology', True)
+        try:
+            zpools = await self.middleware.call('zfs.pool.query_status', topology)
+        except Exception:
+            self.logger.warning('Failed to retrieve pools status', exc_info=True)
+            zpools = {}
+
+        return {
+            'zpools': zpools,
+            'topology': topology,
+        }
+
+    @private
+    def pool_extend(self, pool, context):
 
         """
         If pool is encrypted we need to check if the pool is imported
         or if all geli providers exist.
         """
         pool['path'] = f'/mnt/{pool["name"]}'
-        try:
-            zpool = self.middleware.call_sync('zfs.pool.query', [('id', '=', pool['name'])])[0]
-        except Exception:
-            zpool = None
+        zpool = context['zpools'].get(pool['name'])
 
         if zpool:
             pool.update({
                 'status': zpool['status'],
-                'scan': zpool['scan'],
-                'topology': self.transform_topology(zpool['groups']),
                 'healthy': zpool['healthy'],
                 'status_detail': zpool['status_detail'],
                 'autotrim': zpool['properties']['autotrim'],
             })
+            if context['topology']:
+                pool.update({
+                    'scan': zpool['scan'],
+                    'topology': self.transform_topology(zpool['groups']),
+                })
         else:
             pool.update({
                 'status': 'OFFLINE',
-                'scan': None,
-                'topology': None,
                 'healthy': False,
                 'status_detail': None,
                 'autotrim': {
@@ -490,6 +519,11 @@ class PoolService(CRUDService):
                     'value': 'off',
                 },
             })
+            if context['topology']:
+                pool.update({
+                    'scan': None,
+                    'topology': None,
+                })
 
         if osc.IS_FREEBSD and pool['encrypt'] > 0:
             if zpool:
@@ -1947,6 +1981,11 @@ class PoolDatasetService(CRUDService):
 
     attachment_delegates = []
     dataset_store = 'storage.encrypteddataset'
+    # How long (in seconds) the index of files opened by all processes is reused
+    OPEN_FILES_MAX_AGE = 5
+
+    open_files_index = None
+    open_files_lock = threading.Lock()
 
     class Config:
         namespace = 'pool.dataset'
@@ -2234,6 +2273,8 @@ class PoolDatasetService(CRUDService):
                 }
             )
         finally:
+            # Unloading a key does not generate a ZFS event
+            await self.middleware.call('zfs.mountpoints.invalidate')
             await self.middleware.call('cache.pop', 'about_to_lock_dataset')
 
         await self.middleware.call_hook('dataset.post_lock', id)
@@ -2407,6 +2448,10 @@ class PoolDatasetService(CRUDService):
                     'pool.dataset.insert_or_update_encrypted_record', dataset_data(unlocked_dataset)
                 )
 
+            # Loading a key and mounting do not generate a ZFS event and restarted services must not see the
+            # unlocked datasets as locked
+            self.middleware.call_sync('zfs.mountpoints.invalidate')
+
             self.middleware.call_sync('pool.dataset.restart_services_after_unlock', id, services_to_restart)
 
             self.middleware.call_hook_sync(
@@ -2733,10 +2778,10 @@ class PoolDatasetService(CRUDService):
         return '.glusterfs' in dataset
 
     @private
-    def path_in_locked_datasets(self, path, locked_datasets=None):
+    async def path_in_locked_datasets(self, path, locked_datasets=None):
         if locked_datasets is None:
-            locked_datasets = self.middleware.call_sync('zfs.dataset.locked_datasets')
-        return any(is_child(path, d['mountpoint']) for d in locked_datasets if d['mountpoint'])
+            return bool((await self.middleware.call('zfs.mountpoints.resolve', os.path.normpath(path)))['locked'])
+        return path_in_locked_datasets(path, locked_datasets)
 
     @filterable
     def query(self, filters=None, options=None):
@@ -3816,63 +3861,78 @@ class PoolDatasetService(CRUDService):
           }
         ]
         """
-        result = []
         dataset = await self.get_instance(oid)
-        path = self.__attachments_path(dataset)
-        zvol_path = f"/dev/zvol/{dataset['name']}"
-        if path:
-            data = None
-            if osc.IS_FREEBSD:
-                fstat = await run(
-                    'fstat',
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.DEVNULL,
-                    check=False,
-                    encoding='utf8',
-                )
-                data = parse_fstat(fstat.stdout, [path, zvol_path])
-            else:
-                lsof = await run(
-                    'lsof',
-                    '-F', 'pcn',  # Output format parseable by `parse_lsof`
-                    '-l', '-n', '-P',  # Inhibits login name, hostname and port number conversion
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.DEVNULL,
-                    check=False,
-                    encoding='utf8'
-                )
-                data = parse_lsof(lsof.stdout, [path, zvol_path])
+        return await self.processes_using_paths(self.__processes_paths(dataset))
 
-            for pid, name in data:
-                service = await self.middleware.call('service.identify_process', name)
-                if service:
+    def __processes_paths(self, dataset):
+        return [self.__attachments_path(dataset), f"/dev/zvol/{dataset['name']}"]
+
+    @private
+    async def processes_using_paths(self, paths, max_age=None):
+        """
+        Return a list of processes that have files open in any of `paths` (in `pool.dataset.processes` format).
+
+        On Linux files opened by all processes are indexed at once and the index is reused for `max_age` seconds
+        (`OPEN_FILES_MAX_AGE` by default), so checking multiple datasets in a row only scans `/proc` once.
+        """
+        result = []
+        if osc.IS_FREEBSD:
+            fstat = await run(
+                'fstat',
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=False,
+                encoding='utf8',
+            )
+            data = parse_fstat(fstat.stdout, paths)
+        else:
+            data = await self.middleware.run_in_thread(self.__open_files_processes, paths, max_age)
+
+        for pid, name in data:
+            service = await self.middleware.call('service.identify_process', name)
+            if service:
+                result.append({
+                    "pid": pid,
+                    "name": name,
+                    "service": service,
+                })
+            else:
+                try:
+                    cmdline = await self.middleware.run_in_thread(
+                        lambda: psutil.Process(pid).cmdline()
+                    )
+                except psutil.NoSuchProcess:
+                    pass
+                else:
                     result.append({
                         "pid": pid,
                         "name": name,
-                        "service": service,
+                        "cmdline": join_commandline(cmdline),
                     })
-                else:
-                    try:
-                        cmdline = await self.middleware.run_in_thread(
-                            lambda: psutil.Process(pid).cmdline()
-                        )
-                    except psutil.NoSuchProcess:
-                        pass
-                    else:
-                        result.append({
-                            "pid": pid,
-                            "name": name,
-                            "cmdline": join_commandline(cmdline),
-                        })
 
         return result
 
+    def __open_files_processes(self, paths, max_age):
+        if max_age is None:
+            max_age = self.OPEN_FILES_MAX_AGE
+
+        with self.open_files_lock:
+            if self.open_files_index is None or self.open_files_index.age() >= max_age:
+                self.open_files_index = OpenFilesIndex.scan()
+
+            index = self.open_files_index
+
+        return list(index.processes(paths).items())
+
     @private
     async def kill_processes(self, oid, control_services, max_tries=5):
         need_restart_services = []
         need_stop_services = []
         midpid = os.getpid()
-        for process in await self.middleware.call('pool.dataset.processes', oid):
+        paths = self.__processes_paths(await self.get_instance(oid))
+        # Cached index might miss files opened since it was built or contain PIDs that were reused since then
+        processes = await self.processes_using_paths(paths, 0)
+        for process in processes:
             service = process.get('service')
             if service is not None:
                 if any(attachment_delegate.service == service for attachment_delegate in self.attachment_delegates):
@@ -3888,7 +3948,6 @@ class PoolDatasetService(CRUDService):
             })
 
         for i in range(max_tries):
-            processes = await self.middleware.call('pool.dataset.processes', oid)
             if not processes:
                 return
 
@@ -3911,7 +3970,8 @@ class PoolDatasetService(CRUDService):
                                      process['cmdline'], oid)
                     await self.middleware.call('service.terminate_process', process['pid'])
 
-        processes = await self.middleware.call('pool.dataset.processes', oid)
+            processes = await self.processes_using_paths(paths, 0)
+
         if not processes:
             return
 
@@ -291,6 +291,9 @@ class PoolService(Service):
 
         await self.middleware.call('pool.sync_encrypted', oid)
 
+        # Restarted services must not see the unlocked pool as locked (`pool_import` event is handled asynchronously)
+        await self.middleware.call('zfs.mountpoints.invalidate')
+
         await self.middleware.call(
             'pool.dataset.restart_services_after_unlock', pool['name'],
             set(options['services_restart']) | {'system_datasets', 'disk'}
@@ -370,6 +373,7 @@ class PoolService(Service):
         ):
             await self.middleware.call('disk.geli_detach_single', ed['encrypted_provider'])
 
+        await self.middleware.call('zfs.mountpoints.invalidate')
         await self.middleware.call_hook('pool.post_lock', pool=pool['name'])
         await self.middleware.call('service.restart', 'system_datasets')
         return True
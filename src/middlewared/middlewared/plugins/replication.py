@@ -301,7 +301,7 @@ class ReplicationService(CRUDService):
 
         await self._set_periodic_snapshot_tasks(id, periodic_snapshot_tasks)
 
-        await self.middleware.call("zettarepl.update_tasks")
+        await self.middleware.call("zettarepl.update_tasks", {"replication_tasks": [id]})
 
         return await self._get_instance(id)
 
@@ -383,7 +383,7 @@ class ReplicationService(CRUDService):
 
         await self._set_periodic_snapshot_tasks(id, periodic_snapshot_tasks)
 
-        await self.middleware.call("zettarepl.update_tasks")
+        await self.middleware.call("zettarepl.update_tasks", {"replication_tasks": [id]})
 
         return await self._get_instance(id)
 
@@ -413,7 +413,7 @@ class ReplicationService(CRUDService):
             id
         )
 
-        await self.middleware.call("zettarepl.update_tasks")
+        await self.middleware.call("zettarepl.update_tasks", {"replication_tasks": [id]})
 
         return response
 
@@ -797,14 +797,18 @@ class ReplicationFSAttachmentDelegate(FSAttachmentDelegate):
         for attachment in attachments:
             await self.middleware.call('datastore.delete', 'storage.replication', attachment['id'])
 
-        await self.middleware.call('zettarepl.update_tasks')
+        await self.middleware.call('zettarepl.update_tasks', {
+            'replication_tasks': [attachment['id'] for attachment in attachments],
+        })
 
     async def toggle(self, attachments, enabled):
         for attachment in attachments:
             await self.middleware.call('datastore.update', 'storage.replication', attachment['id'],
                                        {'repl_enabled': enabled})
 
-        await self.middleware.call('zettarepl.update_tasks')
+        await self.middleware.call('zettarepl.update_tasks', {
+            'replication_tasks': [attachment['id'] for attachment in attachments],
+        })
 
 
 async def on_zettarepl_state_changed(middleware, id, fields):
@@ -2,12 +2,16 @@ from collections import defaultdict
 import glob
 import itertools
 import json
+import logging
+import os
 import psutil
 import re
 import subprocess
+import threading
 import time
 
 from middlewared.event import EventSource
+from middlewared.service import CallError
 from middlewared.utils import osc
 
 from .iostat import DiskStats
@@ -16,20 +20,147 @@ if osc.IS_FREEBSD:
     import sysctl
     import netif
 
+logger = logging.getLogger(__name__)
 
 MEGABIT = 131072
+RE_ARCSTATS = re.compile(rb'^(hits|misses|c_max|size)\s+\d+\s+(\d+)$', re.M)
 RE_BASE = re.compile(r'([0-9]+)base')
 RE_MBS = re.compile(r'([0-9]+)Mb/s')
 
 
-class RealtimeEventSource(EventSource):
+class ProcFile:
+    """
+    Statistics file that is kept open and re-read from the beginning with `pread(2)` for every sample.
+    """
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self, size=65536):
+        data = b''
+        while True:
+            chunk = os.pread(self.fd, size, len(data))
+            if not chunk:
+                return data
+
+            data += chunk
+
+    def close(self):
+        os.close(self.fd)
+
 
+class RealtimeSampler:
     """
-    Retrieve real time statistics for CPU, network,
-    virtual memory and zfs arc.
+    Collects real time statistics every `interval` seconds in a single thread and shares the samples between all the
+    `reporting.realtime` subscribers with that interval.
+
+    Statistics files are kept open. Slowly changing data (CPU temperatures, the list of network interfaces and their
+    link speeds) is refreshed less often.
     """
 
-    INTERFACE_SPEEDS_CACHE_INTERLVAL = 300
+    SENSORS_INTERVAL = 10
+    INTERFACES_INTERVAL = 30
+    INTERFACE_SPEEDS_INTERVAL = 300
+
+    def __init__(self, middleware, interval):
+        self.middleware = middleware
+        self.interval = interval
+
+        self.cond = threading.Condition()
+        self.subscribers = 0
+        self.stop_event = None
+        self.generation = 0
+        self.sample = None
+
+        # Only one thread collects samples at a time (a stopped thread might still be finishing the last one)
+        self.lock = threading.Lock()
+        self._reset()
+
+    def subscribe(self):
+        with self.cond:
+            self.subscribers += 1
+            if self.stop_event is None:
+                self.stop_event = threading.Event()
+                threading.Thread(
+                    target=self._run, args=(self.stop_event,), daemon=True, name=f'reporting.realtime:{self.interval}',
+                ).start()
+
+    def unsubscribe(self):
+        """
+        Returns True if there are no subscribers left (and the sampler was stopped).
+        """
+        with self.cond:
+            self.subscribers -= 1
+            if self.subscribers:
+                return False
+
+            self.stop_event.set()
+            self.stop_event = None
+            self.generation = 0
+            self.sample = None
+            return True
+
+    def wait(self, generation, timeout=None):
+        """
+        Waits up to `timeout` seconds for a sample newer than `generation`. Returns `(generation, sample)` of the last
+        sample.
+        """
+        with self.cond:
+            if self.generation == generation:
+                self.cond.wait(timeout)
+
+            return self.generation, self.sample
+
+    def _run(self, stop_event):
+        while not stop_event.is_set():
+            with self.lock:
+                try:
+                    sample = self.collect()
+                except Exception:
+                    logger.warning('Failed to collect realtime statistics', exc_info=True)
+                    sample = None
+
+            if sample is not None:
+                with self.cond:
+                    if stop_event.is_set():
+                        break
+
+                    self.generation += 1
+                    self.sample = sample
+                    self.cond.notify_all()
+
+            stop_event.wait(self.interval)
+
+        with self.lock:
+            self._close()
+            self._reset()
+
+    def _reset(self):
+        self.files = {}
+        self.cp_time_last = None
+        self.cp_times_last = None
+        self.last_interface_stats = {}
+        self.interface_speeds = {}
+        self.interface_speeds_time = None
+        self.interfaces = {}
+        self.interfaces_time = None
+        self.temperatures = {}
+        self.temperatures_time = None
+        self.disk_stats = None
+
+    def _close(self):
+        for f in self.files.values():
+            f.close()
+        for files in self.interfaces.values():
+            for f in files.values():
+                f.close()
+
+    def _read(self, path):
+        f = self.files.get(path)
+        if f is None:
+            f = self.files[path] = ProcFile(path)
+
+        return f.read()
 
     @staticmethod
     def get_cpu_usages(cp_diff):
@@ -93,180 +224,256 @@ class RealtimeEventSource(EventSource):
 
         return speeds
 
-    def run(self):
+    def collect(self):
+        data = {}
 
-        cp_time_last = None
-        cp_times_last = None
-        last_interface_stats = {}
-        last_interface_speeds = {
-            'time': time.monotonic(),
-            'speeds': self.get_interface_speeds(),
-        }
-        if osc.IS_LINUX:
-            disk_stats = DiskStats()
-
-        while not self._cancel.is_set():
-            data = {}
-
-            # Virtual memory use
-            data['virtual_memory'] = psutil.virtual_memory()._asdict()
-
-            # ZFS ARC Size (raw value is in Bytes)
-            hits = 0
-            misses = 0
-            data['zfs'] = {}
-            if osc.IS_FREEBSD:
-                hits = sysctl.filter('kstat.zfs.misc.arcstats.hits')[0].value
-                misses = sysctl.filter('kstat.zfs.misc.arcstats.misses')[0].value
-                data['zfs']['arc_max_size'] = sysctl.filter('kstat.zfs.misc.arcstats.c_max')[0].value
-                data['zfs']['arc_size'] = sysctl.filter('kstat.zfs.misc.arcstats.size')[0].value
-            elif osc.IS_LINUX:
-                with open('/proc/spl/kstat/zfs/arcstats') as f:
-                    for line in f.readlines()[2:]:
-                        if line.strip():
-                            name, type, value = line.strip().split()
-                            if name == 'hits':
-                                hits = int(value)
-                            if name == 'misses':
-                                misses = int(value)
-                            if name == 'c_max':
-                                data['zfs']['arc_max_size'] = int(value)
-                            if name == 'size':
-                                data['zfs']['arc_size'] = int(value)
-            total = hits + misses
-            if total > 0:
-                data['zfs']['cache_hit_ratio'] = hits / total
-            else:
-                data['zfs']['cache_hit_ratio'] = 0
-
-            data['cpu'] = {}
-            # Get CPU usage %
-            if osc.IS_FREEBSD:
-                num_times = 5
-                # cp_times has values for all cores
-                cp_times = sysctl.filter('kern.cp_times')[0].value
-                # cp_time is the sum of all cores
-                cp_time = sysctl.filter('kern.cp_time')[0].value
-            elif osc.IS_LINUX:
-                num_times = 10
-                with open('/proc/stat') as f:
-                    stat = f.read()
-                cp_times = []
-                cp_time = []
-                for line in stat.split('\n'):
-                    if line.startswith('cpu'):
-                        line_ints = [int(i) for i in line[5:].strip().split()]
-                        # cpu has a sum of all cpus
-                        if line[3] == ' ':
-                            cp_time = line_ints
-                        # cpuX is for each core
-                        else:
-                            cp_times += line_ints
-                    else:
-                        break
-            else:
-                cp_time = cp_times = None
+        # Virtual memory use
+        data['virtual_memory'] = psutil.virtual_memory()._asdict()
+
+        # ZFS ARC Size (raw value is in Bytes)
+        hits = 0
+        misses = 0
+        data['zfs'] = {}
+        if osc.IS_FREEBSD:
+            hits = sysctl.filter('kstat.zfs.misc.arcstats.hits')[0].value
+            misses = sysctl.filter('kstat.zfs.misc.arcstats.misses')[0].value
+            data['zfs']['arc_max_size'] = sysctl.filter('kstat.zfs.misc.arcstats.c_max')[0].value
+            data['zfs']['arc_size'] = sysctl.filter('kstat.zfs.misc.arcstats.size')[0].value
+        elif osc.IS_LINUX:
+            arcstats = {
+                name: int(value) for name, value in RE_ARCSTATS.findall(self._read('/proc/spl/kstat/zfs/arcstats'))
+            }
+            hits = arcstats.get(b'hits', 0)
+            misses = arcstats.get(b'misses', 0)
+            if b'c_max' in arcstats:
+                data['zfs']['arc_max_size'] = arcstats[b'c_max']
+            if b'size' in arcstats:
+                data['zfs']['arc_size'] = arcstats[b'size']
+        total = hits + misses
+        if total > 0:
+            data['zfs']['cache_hit_ratio'] = hits / total
+        else:
+            data['zfs']['cache_hit_ratio'] = 0
+
+        data['cpu'] = {}
+        # Get CPU usage %
+        if osc.IS_FREEBSD:
+            num_times = 5
+            # cp_times has values for all cores
+            cp_times = sysctl.filter('kern.cp_times')[0].value
+            # cp_time is the sum of all cores
+            cp_time = sysctl.filter('kern.cp_time')[0].value
+        elif osc.IS_LINUX:
+            num_times = 10
+            cp_times = []
+            cp_time = []
+            for line in self._read('/proc/stat').split(b'\n'):
+                if not line.startswith(b'cpu'):
+                    break
+
+                line_ints = list(map(int, line.split()[1:num_times + 1]))
+                # cpu has a sum of all cpus
+                if line[3:4] == b' ':
+                    cp_time = line_ints
+                # cpuX is for each core
+                else:
+                    cp_times += line_ints
+        else:
+            cp_time = cp_times = None
 
-            if cp_time and cp_times and cp_times_last:
-                # Get the difference of times between the last check and the current one
-                # cp_time has a list with user, nice, system, interrupt and idle
-                cp_diff = list(map(lambda x: x[0] - x[1], zip(cp_times, cp_times_last)))
-                cp_nums = int(len(cp_times) / num_times)
-                for i in range(cp_nums):
-                    data['cpu'][i] = self.get_cpu_usages(cp_diff[i * num_times:i * num_times + num_times])
+        if cp_time and cp_times and self.cp_times_last:
+            # Get the difference of times between the last check and the current one for all the cores at once
+            # cp_time has a list with user, nice, system, interrupt and idle
+            cp_diff = [current - last for current, last in zip(cp_times, self.cp_times_last)]
+            for i in range(len(cp_times) // num_times):
+                data['cpu'][i] = self.get_cpu_usages(cp_diff[i * num_times:i * num_times + num_times])
 
-                cp_diff = list(map(lambda x: x[0] - x[1], zip(cp_time, cp_time_last)))
-                data['cpu']['average'] = self.get_cpu_usages(cp_diff)
+            data['cpu']['average'] = self.get_cpu_usages(
+                [current - last for current, last in zip(cp_time, self.cp_time_last)]
+            )
 
-            cp_time_last = cp_time
-            cp_times_last = cp_times
+        self.cp_time_last = cp_time
+        self.cp_times_last = cp_times
 
-            # CPU temperature
+        # CPU temperature
+        if osc.IS_FREEBSD:
             data['cpu']['temperature'] = {}
-            if osc.IS_FREEBSD:
-                for i in itertools.count():
-                    v = sysctl.filter(f'dev.cpu.{i}.temperature')
-                    if not v:
-                        break
-                    data['cpu']['temperature'][i] = v[0].value
-            elif osc.IS_LINUX:
-                cp = subprocess.run(['sensors', '-j'], capture_output=True, text=True)
-                try:
-                    sensors = json.loads(cp.stdout)
-                except json.decoder.JSONDecodeError:
-                    pass
-                except Exception:
-                    self.middleware.logger.error('Failed to read sensors output', exc_info=True)
-                else:
-                    core = 0
-                    for chip, value in sensors.items():
-                        for name, temps in value.items():
-                            if not name.startswith('Core '):
-                                continue
-                            for temp, value in temps.items():
-                                if 'input' in temp:
-                                    data['cpu']['temperature'][core] = 2732 + int(value * 10)
-                                    core += 1
-                                    break
-
-            # Interface related statistics
-            if last_interface_speeds['time'] < time.monotonic() - self.INTERFACE_SPEEDS_CACHE_INTERLVAL:
-                last_interface_speeds.update({
-                    'time': time.monotonic(),
-                    'speeds': self.get_interface_speeds(),
-                })
-            data['interfaces'] = defaultdict(dict)
-            retrieve_stat = {'rx_bytes': 'received_bytes', 'tx_bytes': 'sent_bytes'}
-            if osc.IS_FREEBSD:
-                for iface in netif.list_interfaces().values():
-                    data['interfaces'][iface.name]['speed'] = last_interface_speeds['speeds'].get(iface.name)
-                    for addr in filter(lambda addr: addr.af.name.lower() == 'link', iface.addresses):
-                        addr_data = addr.__getstate__(stats=True)
-                        stats_time = time.time()
-                        for k in retrieve_stat.values():
-                            traffic_stats = 0
-                            if last_interface_stats.get(iface.name):
-                                traffic_stats = addr_data['stats'][k] - last_interface_stats[iface.name][k]
-                                traffic_stats = int(
-                                    traffic_stats / (time.time() - last_interface_stats[iface.name]['stats_time'])
-                                )
-                            details_dict = {
-                                k: addr_data['stats'][k],
-                                f'{k}_rate': traffic_stats,
-                            }
-                            data['interfaces'][iface.name].update(details_dict)
-                        last_interface_stats[iface.name] = {**data['interfaces'][iface.name], 'stats_time': stats_time}
-            else:
-                stats_time = time.time()
-                for i in glob.glob('/sys/class/net/*/statistics'):
-                    iface_name = i.replace('/sys/class/net/', '').split('/')[0]
-                    data['interfaces'][iface_name]['speed'] = last_interface_speeds['speeds'].get(iface_name)
-                    for stat, name in retrieve_stat.items():
-                        with open(f'{i}/{stat}', 'r') as f:
-                            value = int(f.read())
-                        data['interfaces'][iface_name][name] = value
-                        traffic_stats = None
-                        if (
-                            last_interface_stats.get(iface_name) and
-                            name in last_interface_stats[iface_name]
-                        ):
-                            traffic_stats = value - last_interface_stats[iface_name][name]
+            for i in itertools.count():
+                v = sysctl.filter(f'dev.cpu.{i}.temperature')
+                if not v:
+                    break
+                data['cpu']['temperature'][i] = v[0].value
+        elif osc.IS_LINUX:
+            if self.temperatures_time is None or time.monotonic() - self.temperatures_time >= self.SENSORS_INTERVAL:
+                self.temperatures_time = time.monotonic()
+                self.temperatures = self.get_temperatures()
+            data['cpu']['temperature'] = dict(self.temperatures)
+
+        # Interface related statistics
+        if (
+            self.interface_speeds_time is None or
+            time.monotonic() - self.interface_speeds_time >= self.INTERFACE_SPEEDS_INTERVAL
+        ):
+            self.interface_speeds_time = time.monotonic()
+            self.interface_speeds = self.get_interface_speeds()
+        data['interfaces'] = defaultdict(dict)
+        retrieve_stat = {'rx_bytes': 'received_bytes', 'tx_bytes': 'sent_bytes'}
+        if osc.IS_FREEBSD:
+            for iface in netif.list_interfaces().values():
+                data['interfaces'][iface.name]['speed'] = self.interface_speeds.get(iface.name)
+                for addr in filter(lambda addr: addr.af.name.lower() == 'link', iface.addresses):
+                    addr_data = addr.__getstate__(stats=True)
+                    stats_time = time.time()
+                    for k in retrieve_stat.values():
+                        traffic_stats = 0
+                        if self.last_interface_stats.get(iface.name):
+                            traffic_stats = addr_data['stats'][k] - self.last_interface_stats[iface.name][k]
                             traffic_stats = int(
-                                traffic_stats / (
-                                    stats_time - last_interface_stats[iface_name]['stats_time']
-                                )
+                                traffic_stats / (time.time() - self.last_interface_stats[iface.name]['stats_time'])
                             )
-                        data['interfaces'][iface_name][f'{retrieve_stat[stat]}_rate'] = traffic_stats
-                    last_interface_stats[iface_name] = {
-                        **data['interfaces'][iface_name],
+                        details_dict = {
+                            k: addr_data['stats'][k],
+                            f'{k}_rate': traffic_stats,
+                        }
+                        data['interfaces'][iface.name].update(details_dict)
+                    self.last_interface_stats[iface.name] = {
+                        **data['interfaces'][iface.name],
                         'stats_time': stats_time,
                     }
+        else:
+            if self.interfaces_time is None or time.monotonic() - self.interfaces_time >= self.INTERFACES_INTERVAL:
+                self.interfaces_time = time.monotonic()
+                self._open_interfaces(retrieve_stat)
+
+            stats_time = time.time()
+            for iface_name, files in list(self.interfaces.items()):
+                try:
+                    values = {stat: int(f.read()) for stat, f in files.items()}
+                except (OSError, ValueError):
+                    # Interface was removed
+                    for f in self.interfaces.pop(iface_name).values():
+                        f.close()
+                    continue
+
+                data['interfaces'][iface_name]['speed'] = self.interface_speeds.get(iface_name)
+                for stat, name in retrieve_stat.items():
+                    value = values[stat]
+                    data['interfaces'][iface_name][name] = value
+                    traffic_stats = None
+                    if (
+                        self.last_interface_stats.get(iface_name) and
+                        name in self.last_interface_stats[iface_name]
+                    ):
+                        traffic_stats = value - self.last_interface_stats[iface_name][name]
+                        traffic_stats = int(
+                            traffic_stats / (
+                                stats_time - self.last_interface_stats[iface_name]['stats_time']
+                            )
+                        )
+                    data['interfaces'][iface_name][f'{retrieve_stat[stat]}_rate'] = traffic_stats
+                self.last_interface_stats[iface_name] = {
+                    **data['interfaces'][iface_name],
+                    'stats_time': stats_time,
+                }
+
+        if osc.IS_LINUX:
+            if self.disk_stats is None:
+                self.disk_stats = DiskStats()
+            data['disks'] = self.disk_stats.get()
+
+        return data
 
-            if osc.IS_LINUX:
-                data['disks'] = disk_stats.get()
+    def get_temperatures(self):
+        temperatures = {}
+        cp = subprocess.run(['sensors', '-j'], capture_output=True, text=True)
+        try:
+            sensors = json.loads(cp.stdout)
+        except json.decoder.JSONDecodeError:
+            pass
+        except Exception:
+            self.middleware.logger.error('Failed to read sensors output', exc_info=True)
+        else:
+            core = 0
+            for chip, value in sensors.items():
+                for name, temps in value.items():
+                    if not name.startswith('Core '):
+                        continue
+                    for temp, value in temps.items():
+                        if 'input' in temp:
+                            temperatures[core] = 2732 + int(value * 10)
+                            core += 1
+                            break
+
+        return temperatures
+
+    def _open_interfaces(self, retrieve_stat):
+        for files in self.interfaces.values():
+            for f in files.values():
+                f.close()
+        self.interfaces = {}
+
+        for i in glob.glob('/sys/class/net/*/statistics'):
+            iface_name = i.replace('/sys/class/net/', '').split('/')[0]
+            try:
+                self.interfaces[iface_name] = {stat: ProcFile(f'{i}/{stat}') for stat in retrieve_stat}
+            except OSError:
+                pass
+
+
+class RealtimeSamplers:
+    """
+    `RealtimeSampler` registry: all the subscribers with the same interval share one sampler.
+    """
 
-            self.send_event('ADDED', fields=data)
-            time.sleep(2)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samplers = {}
+
+    def subscribe(self, middleware, interval):
+        with self.lock:
+            sampler = self.samplers.get(interval)
+            if sampler is None:
+                sampler = self.samplers[interval] = RealtimeSampler(middleware, interval)
+
+            sampler.subscribe()
+            return sampler
+
+    def unsubscribe(self, sampler):
+        with self.lock:
+            if sampler.unsubscribe():
+                self.samplers.pop(sampler.interval)
+
+
+class RealtimeEventSource(EventSource):
+
+    """
+    Retrieve real time statistics for CPU, network,
+    virtual memory and zfs arc.
+
+    Usage: reporting.realtime:{"interval": 2}
+    """
+
+    samplers = RealtimeSamplers()
+
+    def run(self):
+        options = {}
+        if self.arg:
+            options = json.loads(self.arg)
+        options.setdefault('interval', 2)
+
+        if options['interval'] < 2:
+            raise CallError('Interval should be >= 2')
+
+        sampler = self.samplers.subscribe(self.middleware, options['interval'])
+        try:
+            generation = 0
+            while not self._cancel.is_set():
+                last_generation = generation
+                generation, sample = sampler.wait(generation, timeout=1)
+                if generation != last_generation and sample is not None:
+                    self.send_event('ADDED', fields=sample)
+        finally:
+            self.samplers.unsubscribe(sampler)
 
 
 def setup(middleware):
@@ -1,56 +1,170 @@
 import asyncio
-from queue import Full, Queue
+from collections import deque
 import re
 import select
 import socketserver
+import threading
+import time
 
 from middlewared.event import EventSource
-from middlewared.service import private, Service
+from middlewared.service import periodic, private, Service
 from middlewared.utils import start_daemon_thread
 
 
+# Characters that make a pattern more than a literal name prefix
+RE_SPECIAL_CHARS = set("\\.^$*+?{}[]|()")
+
+
+def parse_graphite_lines(data):
+    """
+    Parses complete collectd Graphite plaintext protocol lines (`prefix.name value timestamp`) into a list of
+    `(name, value, timestamp)`. Malformed lines are skipped.
+    """
+    batch = []
+    for line in data.split(b"\n"):
+        fields = line.split()
+        if len(fields) != 3:
+            continue
+
+        path, value, timestamp = fields
+        name = path.split(b".", 1)[-1]
+        if name.endswith(b".value"):
+            name = name[:-len(b".value")]
+
+        try:
+            batch.append((name.decode(), value.decode(), int(timestamp)))
+        except ValueError:
+            continue
+
+    return batch
+
+
+class GraphiteQueue:
+    """
+    Bounded queue of batches for a single `reporting.graphite` subscriber. If the subscriber falls behind, the oldest
+    batches are dropped (and counted in `dropped`) instead of blocking the producer.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.cond = threading.Condition()
+        self.batches = deque(maxlen=maxsize)
+        self.dropped = 0
+
+    def put(self, batch):
+        with self.cond:
+            if len(self.batches) == self.batches.maxlen:
+                self.dropped += 1
+            self.batches.append(batch)
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Returns all the queued batches (waiting up to `timeout` seconds for one to appear).
+        """
+        with self.cond:
+            if not self.batches:
+                self.cond.wait(timeout)
+
+            batches = list(self.batches)
+            self.batches.clear()
+            return batches
+
+
+class GraphiteNameFilter:
+    """
+    Matches metric names against `include` or `exclude` regular expressions (matched from the beginning of the name).
+
+    Patterns that are just a literal prefix (e.g. `cpu-.*`) are checked with a single `str.startswith` call and the rest
+    are combined into one regular expression. Results are cached as collectd keeps sending the same metrics.
+    """
+
+    MAX_CACHE_SIZE = 100000
+
+    def __init__(self, mode, patterns):
+        if mode not in ["include", "exclude"]:
+            raise ValueError(f"Invalid mode: {mode!r}")
+
+        self.include = mode == "include"
+        prefixes = []
+        regexes = []
+        for pattern in patterns:
+            prefix = pattern[:-2] if pattern.endswith(".*") else pattern
+            if RE_SPECIAL_CHARS.isdisjoint(prefix):
+                prefixes.append(prefix)
+            else:
+                regexes.append(f"(?:{pattern})")
+        self.prefixes = tuple(prefixes)
+        self.regex = re.compile("|".join(regexes)) if regexes else None
+        self.cache = {}
+
+    def __call__(self, name):
+        result = self.cache.get(name)
+        if result is None:
+            matches = name.startswith(self.prefixes) or (self.regex is not None and self.regex.match(name) is not None)
+            result = matches if self.include else not matches
+
+            if len(self.cache) >= self.MAX_CACHE_SIZE:
+                self.cache.clear()
+            self.cache[name] = result
+
+        return result
+
+
+def push_graphite_queues(queues, batch):
+    for queue in list(queues):
+        queue.put(batch)
+
+
 class GraphiteServer(socketserver.TCPServer):
     allow_reuse_address = True
 
 
 class GraphiteHandler(socketserver.BaseRequestHandler):
     middleware = None
+    queues = None
+    stats = None
+
+    # collectd flushes its send buffer (1428 bytes by default) at a time, wait this long for the rest of the burst
+    batch_window = 0.1
+    max_batch_size = 1024 * 1024
+    recv_size = 65536
 
     def handle(self):
-        last = b""
-        while True:
-            data = b""
-            # Try to read a batch of updates at once, instead of breaking per message size
-            while True:
-                if not select.select([self.request.fileno()], [], [], 0.1)[0] and data != b"":
-                    break
-                msg = self.request.recv(1428)
-                if msg == b"":
-                    break
-                data += msg
-            if data == b"":
+        fd = self.request.fileno()
+        buffer = bytearray()
+        chunk = memoryview(bytearray(self.recv_size))
+        eof = False
+        while not eof:
+            n = self.request.recv_into(chunk)
+            if not n:
                 break
-            if last:
-                data = last + data
-                last = b""
-            lines = (last + data).split(b"\r\n")
-            if lines[-1] != b"":
-                last = lines[-1]
+            buffer += chunk[:n]
 
-            batch = []
-            for line in lines[:-1]:
-                line, value, timestamp = line.decode().split()
+            # Try to read a batch of updates at once, instead of breaking per message size
+            deadline = time.monotonic() + self.batch_window
+            while len(buffer) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or not select.select([fd], [], [], timeout)[0]:
+                    break
 
-                name = line.split(".", 1)[1]
-                if name.endswith(".value"):
-                    name = name[:-len(".value")]
+                n = self.request.recv_into(chunk)
+                if not n:
+                    eof = True
+                    break
+                buffer += chunk[:n]
 
-                value = value
-                timestamp = int(timestamp)
+            end = buffer.rfind(b"\n")
+            if end == -1:
+                continue
 
-                batch.append((name, value, timestamp))
+            batch = parse_graphite_lines(buffer[:end])
+            self.stats["received_bytes"] += end + 1
+            del buffer[:end + 1]
 
-            self.middleware.call_sync("reporting.push_graphite_queues", batch)
+            if batch:
+                self.stats["received_metrics"] += len(batch)
+                self.stats["batches"] += 1
+                push_graphite_queues(self.queues, batch)
 
 
 class GraphiteEventSource(EventSource):
@@ -61,50 +175,39 @@ class GraphiteEventSource(EventSource):
     * `reporting.graphite:exclude,cpu-.*,disk-.*` - all data except disk and CPU
     """
     def run(self):
-        mode = None
-        names = []
+        accept = None
         if self.arg:
             mode, names = self.arg.split(",", 1)
+            accept = GraphiteNameFilter(mode, names.split(","))
 
-            if mode not in ["include", "exclude"]:
-                raise ValueError(f"Invalid mode: {mode!r}")
-
-            names = [re.compile(r) for r in names.split(",")]
-
-        queue = Queue(1024)
+        queue = GraphiteQueue(1024)
         self.middleware.call_sync("reporting.register_graphite_queue", queue)
         try:
-            self._run(mode, names, queue)
+            self._run(accept, queue)
         finally:
             self.middleware.call_sync("reporting.unregister_graphite_queue", queue)
 
-    def _run(self, mode, names, queue):
+    def _run(self, accept, queue):
         while not self._cancel.is_set():
             items = []
-            for name, value, timestamp in queue.get():
-                if self._accept(mode, names, name):
-                    items.append([name, value, timestamp])
+            for batch in queue.get(timeout=1):
+                for name, value, timestamp in batch:
+                    if accept is None or accept(name):
+                        items.append([name, value, timestamp])
 
             if items:
                 self.send_event("ADDED", fields={"items": items})
 
-    def _accept(self, mode, names, name):
-        if mode is None:
-            return True
-
-        if mode == "include":
-            return any(r.match(name) for r in names)
-
-        if mode == "exclude":
-            return all(not r.match(name) for r in names)
-
 
 class ReportingService(Service):
     has_server = False
     lock = asyncio.Lock()
+    method_stats_push = False
     queues = []
     server = None
     server_shutdown_timer = None
+    stats = {"received_bytes": 0, "received_metrics": 0, "batches": 0}
+    stats_since = None
 
     @private
     async def has_internal_graphite_server(self):
@@ -123,6 +226,10 @@ class ReportingService(Service):
             if self.server is None:
                 self.middleware.logger.debug("Starting internal Graphite server")
                 GraphiteHandler.middleware = self.middleware
+                GraphiteHandler.queues = self.queues
+                GraphiteHandler.stats = self.stats
+                if ReportingService.stats_since is None:
+                    ReportingService.stats_since = time.monotonic()
                 self.server = GraphiteServer(("127.0.0.1", 2003), GraphiteHandler)
                 start_daemon_thread(target=self.server.serve_forever)
                 self.has_server = True
@@ -154,13 +261,48 @@ class ReportingService(Service):
 
             self.middleware.logger.debug("Internal Graphite server shut down successfully")
 
+    @private
+    async def set_method_stats_push(self, enable):
+        """
+        Enable or disable pushing middleware methods statistics (see `core.method_stats`) to `reporting.graphite`
+        subscribers.
+        """
+        ReportingService.method_stats_push = enable
+
+    @periodic(10, run_on_start=False)
+    @private
+    async def push_method_stats(self):
+        if not self.method_stats_push or not self.queues:
+            return
+
+        timestamp = int(time.time())
+        batch = []
+        for stat in self.middleware.method_stats.dump():
+            prefix = f"middlewared_method-{stat['method'].replace('.', '_')}.{stat['executor']}"
+            for key in ("calls", "errors", "average_time", "max_time"):
+                batch.append((f"{prefix}-{key}", str(stat[key]), timestamp))
+
+        await self.push_graphite_queues(batch)
+
     @private
     async def push_graphite_queues(self, batch):
-        for queue in list(self.queues):
-            try:
-                queue.put(batch)
-            except Full:
-                pass
+        push_graphite_queues(self.queues, batch)
+
+    @private
+    async def graphite_stats(self):
+        """
+        Internal Graphite server ingestion statistics: totals since the server was first started, average rates and
+        the number of batches dropped for every subscriber that could not keep up.
+        """
+        elapsed = time.monotonic() - self.stats_since if self.stats_since is not None else 0
+        return {
+            **self.stats,
+            **{
+                f"{k}_per_second": (v / elapsed if elapsed else 0)
+                for k, v in self.stats.items()
+            },
+            "queues": [{"size": len(queue.batches), "dropped": queue.dropped} for queue in self.queues],
+        }
 
 
 async def setup(middleware):
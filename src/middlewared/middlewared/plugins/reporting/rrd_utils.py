@@ -1,9 +1,13 @@
+from collections import OrderedDict
+import math
 import os
 import json
 import re
 import statistics
 import subprocess
 import textwrap
+import threading
+import time
 
 
 RRD_BASE_PATH = '/var/db/collectd/rrd/localhost'
@@ -14,6 +18,66 @@ RE_RRDPLUGIN = re.compile(r'^(?P<name>.+)Plugin$')
 RRD_PLUGINS = {}
 
 
+def downsample(rows, factor):
+    """
+    Consolidates every `factor` consecutive `rows` (lists of values of every data source) into one.
+
+    Returns `(average, minimum, maximum)` lists of consolidated rows. Null values are ignored.
+    """
+    average = []
+    minimum = []
+    maximum = []
+    for i in range(0, len(rows), factor):
+        columns = [[v for v in column if v is not None] for column in zip(*rows[i:i + factor])]
+        average.append([sum(column) / len(column) if column else None for column in columns])
+        minimum.append([min(column) if column else None for column in columns])
+        maximum.append([max(column) if column else None for column in columns])
+
+    return average, minimum, maximum
+
+
+class RRDExportCache:
+    """
+    Small LRU cache of recently exported graphs so that reloading a dashboard does not export them again.
+
+    Entries expire after the step of the exported data (bounded by `min_ttl` and `max_ttl`) as there is no new
+    data before that.
+    """
+
+    def __init__(self, maxsize=64, min_ttl=10, max_ttl=300):
+        self.maxsize = maxsize
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires, data = entry
+            if expires < time.monotonic():
+                self.entries.pop(key)
+                return None
+
+            self.entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        ttl = min(max(data.get('step') or 0, self.min_ttl), self.max_ttl)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
 class RRDMeta(type):
 
     def __new__(cls, name, bases, dct):
@@ -168,7 +232,7 @@ class RRDBase(object, metaclass=RRDMeta):
 
         return args
 
-    def export(self, identifier, starttime, endtime, aggregate=True):
+    def export(self, identifier, starttime, endtime, aggregate=True, step=None, max_points=None):
         args = [
             'rrdtool',
             'xport',
@@ -177,6 +241,9 @@ class RRDBase(object, metaclass=RRDMeta):
             '--end', endtime,
             '--start', starttime,
         ]
+        if step:
+            # Let rrdtool pick the archive with the closest resolution
+            args.extend(['--step', str(step)])
         args.extend(self.get_defs(identifier))
         cp = subprocess.run(args, capture_output=True)
         if cp.returncode != 0:
@@ -203,4 +270,14 @@ class RRDBase(object, metaclass=RRDMeta):
                 else:
                     raise RuntimeError(f'Aggregation {agg!r} is invalid.')
 
+        factor = 1
+        if step and data.get('step') and step > data['step']:
+            factor = math.ceil(step / data['step'])
+        if max_points and len(data['data']) > max_points:
+            factor = max(factor, math.ceil(len(data['data']) / max_points))
+        if factor > 1:
+            # Aggregations above are calculated from the data at its full resolution
+            data['data'], data['data_min'], data['data_max'] = downsample(data['data'], factor)
+            data['step'] *= factor
+
         return data
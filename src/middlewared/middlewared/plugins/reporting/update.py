@@ -8,7 +8,7 @@ from middlewared.service import CallError, ConfigService, filterable, private, V
 from middlewared.utils import filter_list, osc, run
 from middlewared.validators import Range
 
-from .rrd_utils import RRD_PLUGINS
+from .rrd_utils import RRD_PLUGINS, RRDExportCache
 
 
 class ReportingModel(sa.Model):
@@ -32,6 +32,7 @@ class ReportingService(ConfigService):
         self.__rrds = {}
         for name, klass in RRD_PLUGINS.items():
             self.__rrds[name] = klass(self.middleware)
+        self.__export_cache = RRDExportCache()
 
     @accepts(
         Dict(
@@ -128,6 +129,7 @@ class ReportingService(ConfigService):
                 'sh', '-c', f'rm {"--one-file-system -rf" if osc.IS_LINUX else "-rfx"} /var/db/collectd/rrd/*',
                 check=False
             )
+            self.__export_cache.clear()
             await self.middleware.call('reporting.setup')
             await self.middleware.call('service.start', 'rrdcached')
 
@@ -184,6 +186,8 @@ class ReportingService(ConfigService):
             Str('start', empty=False),
             Str('end', empty=False),
             Bool('aggregate', default=True),
+            Int('step', validators=[Range(min=1)]),
+            Int('max_points', validators=[Range(min=2)]),
             register=True,
         )
     )
@@ -198,6 +202,10 @@ class ReportingService(ConfigService):
 
         `aggregate` will return aggregate available data for each graph (e.g. min, max, mean).
 
+        `step` (in seconds) and `max_points` limit the resolution of the returned data. Points are consolidated
+        into buckets of equal size: `data` contains the average of each bucket and `data_min` and `data_max` contain
+        its minimum and maximum values. Recently exported data is cached for up to the resulting `step`.
+
         .. examples(websocket)::
 
           Get graph data of "nfsstat" from the last hour.
@@ -221,9 +229,19 @@ class ReportingService(ConfigService):
                 rrd = self.__rrds[i['name']]
             except KeyError:
                 raise CallError(f'Graph {i["name"]!r} not found.', errno.ENOENT)
-            rv.append(
-                rrd.export(i['identifier'], starttime, endtime, aggregate=query['aggregate'])
+
+            key = (
+                i['name'], i['identifier'], starttime, endtime, query['aggregate'], query.get('step'),
+                query.get('max_points'),
             )
+            data = self.__export_cache.get(key)
+            if data is None:
+                data = rrd.export(
+                    i['identifier'], starttime, endtime, aggregate=query['aggregate'], step=query.get('step'),
+                    max_points=query.get('max_points'),
+                )
+                self.__export_cache.put(key, data)
+            rv.append(data)
         return rv
 
     @private
@@ -236,5 +254,8 @@ class ReportingService(ConfigService):
             if idents is None:
                 idents = [None]
             for ident in idents:
-                rv.append(rrd.export(ident, starttime, endtime, aggregate=query['aggregate']))
+                rv.append(rrd.export(
+                    ident, starttime, endtime, aggregate=query['aggregate'], step=query.get('step'),
+                    max_points=query.get('max_points'),
+                ))
         return rv
@@ -10,7 +10,7 @@ from middlewared.schema import accepts, Bool, Dict, Int, Ref, Str
 from middlewared.service import filterable, CallError, CRUDService, private
 from middlewared.service_exception import MatchNotFound
 import middlewared.sqlalchemy as sa
-from middlewared.utils import filter_list
+from middlewared.utils import filter_list, osc
 
 
 class ServiceModel(sa.Model):
@@ -38,6 +38,9 @@ class ServiceService(CRUDService):
         if not isinstance(services, list):
             services = [services]
 
+        if osc.IS_LINUX:
+            await self.middleware.call('service.systemd_load_states', [service['service'] for service in services])
+
         jobs = {
             asyncio.ensure_future(
                 (await self.middleware.call('service.object', service['service'])).get_state()
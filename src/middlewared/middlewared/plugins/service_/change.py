@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+from middlewared.service import CallError, private, Service
+
+# Changes scheduled within `CHANGE_DELAY` seconds of each other are applied together, but no later than
+# `CHANGE_MAX_DELAY` seconds after the first one was scheduled
+CHANGE_DELAY = 0.5
+CHANGE_MAX_DELAY = 5
+# Ordered by precedence: restarting a service also applies everything reloading it would
+CHANGE_VERBS = ('reload', 'restart')
+
+
+class ServiceChangeBatch:
+    def __init__(self):
+        self.created = time.monotonic()
+        self.changes = {}
+        self.handle = None
+        self.task = None
+        self.done = asyncio.Event()
+        self.failed = []
+        self.error = None
+
+
+class ServiceService(Service):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Batches that were not applied yet, the last one might still be accepting changes
+        self.change_batches = []
+        self.change_lock = asyncio.Lock()
+        self.change_counters = {'scheduled': 0, 'coalesced': 0, 'applied': 0, 'etc_generate': 0}
+
+    @private
+    async def schedule_change(self, service, verb):
+        """
+        Schedules `service` to be reloaded or restarted (depending on `verb`) if it is running.
+
+        Changes scheduled in a row are coalesced: every service is reloaded/restarted only once and rc configuration
+        is only generated once for all of them. Use `service.flush_changes` to wait for the change to be applied.
+        """
+        if verb not in CHANGE_VERBS:
+            raise CallError(f'Invalid service change verb: {verb!r}')
+
+        if self.change_batches and self.change_batches[-1].task is None:
+            batch = self.change_batches[-1]
+        else:
+            batch = ServiceChangeBatch()
+            self.change_batches.append(batch)
+
+        self.change_counters['scheduled'] += 1
+        if service in batch.changes:
+            self.change_counters['coalesced'] += 1
+            verb = max(batch.changes[service], verb, key=CHANGE_VERBS.index)
+        batch.changes[service] = verb
+
+        if batch.handle is not None:
+            batch.handle.cancel()
+        delay = max(0, min(CHANGE_DELAY, batch.created + CHANGE_MAX_DELAY - time.monotonic()))
+        batch.handle = asyncio.get_event_loop().call_later(delay, self._start_change_batch, batch)
+
+    @private
+    async def flush_changes(self, services=None):
+        """
+        Applies scheduled changes of `services` (or of all the services) immediately and waits for them to finish.
+
+        Raises `CallError` if any of these services failed to start.
+        """
+        batches = [
+            batch for batch in self.change_batches
+            if services is None or any(service in batch.changes for service in services)
+        ]
+        for batch in batches:
+            self._start_change_batch(batch)
+
+        for batch in batches:
+            await batch.done.wait()
+
+        for batch in batches:
+            if batch.error is not None:
+                raise batch.error
+
+            for service in batch.failed:
+                if services is None or service in services:
+                    raise CallError(
+                        f'The {service} service failed to start',
+                        CallError.ESERVICESTARTFAILURE,
+                        [service],
+                    )
+
+    @private
+    async def change_stats(self):
+        """
+        Returns how many service changes were scheduled, how many of them were coalesced with another change of the
+        same service and how many reloads/restarts and rc generations were actually performed.
+        """
+        return dict(self.change_counters)
+
+    def _start_change_batch(self, batch):
+        if batch.handle is not None:
+            batch.handle.cancel()
+            batch.handle = None
+
+        if batch.task is None:
+            batch.task = asyncio.ensure_future(self._apply_change_batch(batch))
+
+    async def _apply_change_batch(self, batch):
+        # Batches are applied in the order they were scheduled
+        async with self.change_lock:
+            try:
+                # For now its hard to keep track of which services change rc.conf.
+                # To be safe run this every time any service is updated (but only once per batch).
+                await self.middleware.call('etc.generate', 'rc')
+                self.change_counters['etc_generate'] += 1
+
+                running = {
+                    svc['service']
+                    for svc in await self.middleware.call('service.query', [('service', 'in', list(batch.changes))])
+                    if svc['state'] == 'RUNNING'
+                }
+                for service, verb in batch.changes.items():
+                    if service not in running:
+                        continue
+
+                    self.change_counters['applied'] += 1
+                    try:
+                        started = await self.middleware.call(f'service.{verb}', service)
+                    except Exception:
+                        self.logger.error('Failed to %s %r service', verb, service, exc_info=True)
+                        started = False
+
+                    if not started:
+                        batch.failed.append(service)
+            except Exception as e:
+                self.logger.error('Failed to apply service changes %r', batch.changes, exc_info=True)
+                batch.error = e
+            finally:
+                self.change_batches.remove(batch)
+                batch.done.set()
+
+        if batch.failed:
+            self.logger.warning('Services %r failed to start', batch.failed)
@@ -1,45 +1,38 @@
 import logging
-import select
 import subprocess
 
 from middlewared.utils import run
-from middlewared.utils.osc import IS_LINUX
 
 from .base_state import ServiceState
+from .systemd_client import systemd
 
 logger = logging.getLogger(__name__)
 
-if IS_LINUX:
-    from pystemd.base import SDObject
-    from pystemd.dbusexc import DBusUnknownObjectError
-    from pystemd.dbuslib import DBus
-    from pystemd.systemd1 import Unit
-
-    class Job(SDObject):
-        def __init__(self, job, bus=None, _autoload=False):
-            super().__init__(
-                destination=b"org.freedesktop.systemd1",
-                path=job,
-                bus=bus,
-                _autoload=_autoload,
-            )
-
 
 class SimpleServiceLinux:
     systemd_unit = NotImplemented
     systemd_extra_units = []
     systemd_async_start = False
 
+    @property
+    def systemd_unit_name(self):
+        return f"{self.systemd_unit}.service".encode()
+
     async def _get_state_linux(self):
-        return await self.middleware.run_in_thread(self._get_state_linux_sync)
+        state = systemd.cached_state(self.systemd_unit_name)
+        if state is None:
+            state = (await self.middleware.run_in_thread(systemd.get_states, [self.systemd_unit_name])).get(
+                self.systemd_unit_name
+            )
 
-    def _get_state_linux_sync(self):
-        unit = self._get_systemd_unit()
+        return self._systemd_service_state(state)
 
-        state = unit.Unit.ActiveState
-        if state == b"active" or (self.systemd_async_start and state == b"activating"):
-            return ServiceState(True, list(filter(None, [unit.MainPID])))
+    def _systemd_service_state(self, state):
+        if state is None:
+            return ServiceState(False, [])
 
+        if state["active_state"] == b"active" or (self.systemd_async_start and state["active_state"] == b"activating"):
+            return ServiceState(True, list(filter(None, [state["main_pid"]])))
         else:
             return ServiceState(False, [])
 
@@ -58,56 +51,11 @@ class SimpleServiceLinux:
     async def _identify_linux(self, procname):
         pass
 
-    def _get_systemd_unit(self):
-        unit = Unit(f"{self.systemd_unit}.service".encode())
-        unit.load()
-        return unit
-
     async def _unit_action(self, action, wait=True, timeout=5):
         return await self.middleware.run_in_thread(self._unit_action_sync, action, wait, timeout)
 
     def _unit_action_sync(self, action, wait, timeout):
-        unit = self._get_systemd_unit()
-        job = getattr(unit.Unit, action)(b"replace")
-
-        if wait:
-            with DBus() as bus:
-                done = False
-
-                def callback(msg, error=None, userdata=None):
-                    nonlocal done
-
-                    msg.process_reply(True)
-
-                    if msg.body[1] == job:
-                        done = True
-
-                bus.match_signal(
-                    b"org.freedesktop.systemd1",
-                    b"/org/freedesktop/systemd1",
-                    b"org.freedesktop.systemd1.Manager",
-                    b"JobRemoved",
-                    callback,
-                    None,
-                )
-
-                job_object = Job(job, bus)
-                try:
-                    job_object.load()
-                except DBusUnknownObjectError:
-                    # Job has already completed
-                    return
-
-                fd = bus.get_fd()
-                while True:
-                    fds = select.select([fd], [], [], timeout)
-                    if not any(fds):
-                        break
-
-                    bus.process()
-
-                    if done:
-                        break
+        systemd.unit_action(self.systemd_unit_name, action, wait, timeout)
 
     async def _systemd_unit(self, unit, verb):
         await systemd_unit(unit, verb)
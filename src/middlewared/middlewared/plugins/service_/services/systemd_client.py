@@ -0,0 +1,217 @@
+import contextlib
+import logging
+import select
+import threading
+
+from middlewared.utils.osc import IS_LINUX
+
+if IS_LINUX:
+    from pystemd.dbuslib import DBus
+    from pystemd.systemd1 import Manager, Unit
+
+logger = logging.getLogger(__name__)
+
+SYSTEMD = b"org.freedesktop.systemd1"
+SYSTEMD_PATH = b"/org/freedesktop/systemd1"
+# States in which the unit might have a main process
+ACTIVE_STATES = (b"active", b"activating", b"deactivating", b"reloading")
+# States that are not transitions between other states
+STABLE_STATES = (b"active", b"inactive", b"failed")
+
+
+class SystemdClient:
+    """
+    systemd D-Bus client shared by all the services.
+
+    Unit states are fetched in a single `ListUnitsByNames` call and are then kept up to date by `PropertiesChanged`
+    signals (processed by a background thread), so querying the state of a unit that was already queried does not
+    require a D-Bus round trip. The cache is dropped if the connection fails.
+    """
+
+    def __init__(self):
+        # sd-bus connection can't be used from multiple threads at once
+        self.lock = threading.RLock()
+        self.bus = None
+        self.manager = None
+        self.units = {}
+        # unit name -> `{"active_state", "main_pid"}`
+        self.states = {}
+        # unit object path -> unit name
+        self.paths = {}
+        # units whose state was requested (their state is loaded again after reconnecting)
+        self.followed = set()
+        # job object path -> `threading.Event` set when the job is finished
+        self.jobs = {}
+        self.listeners = []
+
+    def add_listener(self, listener):
+        """
+        `listener(name, active_state)` will be called (from the D-Bus thread, so it must not block) when a unit whose
+        state is cached reaches a stable (`active`, `inactive` or `failed`) state.
+        """
+        self.listeners.append(listener)
+
+    def cached_state(self, name):
+        """
+        Returns cached state of unit `name` or `None`. Does not block.
+        """
+        return self.states.get(name)
+
+    def get_states(self, names):
+        """
+        Returns `{name: {"active_state", "main_pid"}}` for units `names`, fetching the ones that are not cached.
+        """
+        with self.lock:
+            missing = [name for name in names if name not in self.states]
+            if missing:
+                self.followed.update(missing)
+                with self._connection():
+                    self._load_states([name for name in self.followed if name not in self.states])
+
+            return {name: self.states[name] for name in names if name in self.states}
+
+    def unit_action(self, name, action, wait=True, timeout=5):
+        """
+        Runs `action` (`Start`, `Stop`, `Restart` or `Reload`) for unit `name` and waits up to `timeout` seconds for
+        the job to finish if `wait` is set.
+        """
+        event = threading.Event()
+        with self.lock:
+            with self._connection():
+                job = getattr(self._unit(name).Unit, action)(b"replace")
+
+            # The job can't be reported as finished before we release the lock
+            if wait:
+                self.jobs[job] = event
+
+        if wait:
+            try:
+                event.wait(timeout)
+            finally:
+                with self.lock:
+                    self.jobs.pop(job, None)
+
+    @contextlib.contextmanager
+    def _connection(self):
+        self._connect()
+        try:
+            yield
+        except Exception:
+            # Cached state can't be trusted anymore, start over
+            self._disconnect()
+            raise
+
+    def _connect(self):
+        if self.bus is not None:
+            return
+
+        bus = DBus()
+        bus.open()
+        try:
+            manager = Manager(bus=bus, _autoload=True)
+            bus.match_signal(
+                SYSTEMD, SYSTEMD_PATH, b"org.freedesktop.systemd1.Manager", b"JobRemoved", self._on_job_removed, None,
+            )
+            # Otherwise systemd does not send us any signals
+            manager.Manager.Subscribe()
+        except Exception:
+            bus.close()
+            raise
+
+        self.bus = bus
+        self.manager = manager
+        threading.Thread(target=self._process, args=(bus,), daemon=True, name="systemd").start()
+
+    def _disconnect(self):
+        if self.bus is None:
+            return
+
+        self.bus.close()
+        self.bus = None
+        self.manager = None
+        self.units.clear()
+        self.states.clear()
+        self.paths.clear()
+        for event in self.jobs.values():
+            event.set()
+
+    def _process(self, bus):
+        fd = bus.get_fd()
+        while self.bus is bus:
+            # Incoming messages might have been queued while another thread was calling a method so process them
+            # periodically even if there is nothing to read
+            select.select([fd], [], [], 1)
+
+            with self.lock:
+                if self.bus is not bus:
+                    break
+
+                try:
+                    while bus.process():
+                        pass
+                except Exception:
+                    logger.warning("Failed to process systemd D-Bus messages", exc_info=True)
+                    self._disconnect()
+
+    def _load_states(self, names):
+        units = self.manager.Manager.ListUnitsByNames(names)
+
+        new_paths = False
+        for unit in units:
+            name, path = unit[0], unit[6]
+            if path not in self.paths:
+                self.bus.match_signal(
+                    SYSTEMD, path, b"org.freedesktop.DBus.Properties", b"PropertiesChanged",
+                    self._on_properties_changed, path,
+                )
+                self.paths[path] = name
+                new_paths = True
+
+        if new_paths:
+            # State could have changed before we started listening for changes
+            units = self.manager.Manager.ListUnitsByNames(names)
+
+        for unit in units:
+            name, active_state = unit[0], unit[3]
+            self.states[name] = {
+                "active_state": active_state,
+                "main_pid": self._unit(name).Service.MainPID if active_state in ACTIVE_STATES else 0,
+            }
+
+    def _unit(self, name):
+        if name not in self.units:
+            self.units[name] = Unit(name, bus=self.bus, _autoload=True)
+
+        return self.units[name]
+
+    def _on_properties_changed(self, msg, error=None, userdata=None):
+        msg.process_reply(True)
+
+        name = self.paths.get(userdata)
+        state = self.states.get(name)
+        if state is None:
+            return
+
+        interface, changed, invalidated = msg.body
+        if b"MainPID" in changed:
+            state["main_pid"] = changed[b"MainPID"]
+        if b"ActiveState" in changed and changed[b"ActiveState"] != state["active_state"]:
+            state["active_state"] = changed[b"ActiveState"]
+            if state["active_state"] in STABLE_STATES:
+                for listener in self.listeners:
+                    try:
+                        listener(name, state["active_state"])
+                    except Exception:
+                        logger.warning("Unhandled exception in systemd state listener", exc_info=True)
+        if b"ActiveState" in invalidated or b"MainPID" in invalidated:
+            self.states.pop(name, None)
+
+    def _on_job_removed(self, msg, error=None, userdata=None):
+        msg.process_reply(True)
+
+        event = self.jobs.get(msg.body[1])
+        if event is not None:
+            event.set()
+
+
+systemd = SystemdClient()
@@ -1,3 +1,9 @@
+import asyncio
+from collections import defaultdict
+
+from middlewared.plugins.service_.services.all import all_services
+from middlewared.plugins.service_.services.base_linux import SimpleServiceLinux
+from middlewared.plugins.service_.services.systemd_client import systemd
 from middlewared.service import private, Service
 
 
@@ -10,3 +16,43 @@ class ServiceService(Service):
             return []
         else:
             return [service.systemd_unit] + service.systemd_extra_units
+
+    @private
+    async def systemd_load_states(self, services):
+        """
+        Fetches states of systemd units of `services` in a single batch so that they are then served from cache.
+        """
+        units = []
+        for name in services:
+            service = await self.middleware.call('service.object', name)
+            if isinstance(service, SimpleServiceLinux) and service.systemd_unit != NotImplemented:
+                units.append(service.systemd_unit_name)
+
+        if units:
+            try:
+                await self.middleware.run_in_thread(systemd.get_states, units)
+            except Exception:
+                self.logger.warning('Failed to load systemd units states', exc_info=True)
+
+
+async def setup(middleware):
+    services = defaultdict(list)
+    for klass in all_services:
+        if issubclass(klass, SimpleServiceLinux) and klass.systemd_unit != NotImplemented:
+            services[f'{klass.systemd_unit}.service'.encode()].append(klass.name)
+
+    def on_state_changed(unit, active_state):
+        # Clients can subscribe to `service.query` instead of polling it
+        for service in services.get(unit, []):
+            asyncio.run_coroutine_threadsafe(middleware.call('service.notify_running', service), loop=middleware.loop)
+
+    systemd.add_listener(on_state_changed)
+
+    async def follow():
+        # Start receiving state changes of all the units, not only of the ones that were queried
+        try:
+            await middleware.run_in_thread(systemd.get_states, list(services))
+        except Exception:
+            middleware.logger.warning('Failed to load systemd units states', exc_info=True)
+
+    asyncio.ensure_future(follow())
@@ -6,13 +6,13 @@ from itertools import chain
 
 import asyncio
 
-from middlewared.common.smart.smartctl import SMARTCTL_POWERMODES, get_smartctl_args, smartctl
+from middlewared.common.smart.smartctl import SMARTCTL_POWERMODES
 from middlewared.schema import accepts, Bool, Cron, Dict, Int, List, Patch, Str
 from middlewared.validators import Range
 from middlewared.service import (
     CRUDService, filterable, filter_list, job, private, SystemServiceService, ValidationErrors
 )
-from middlewared.service_exception import CallError, MatchNotFound
+from middlewared.service_exception import CallError
 import middlewared.sqlalchemy as sa
 from middlewared.utils.asyncio_ import asyncio_map
 
@@ -20,16 +20,13 @@ from middlewared.utils.asyncio_ import asyncio_map
 RE_TIME = re.compile(r'test will complete after ([a-z]{3} [a-z]{3} [0-9 ]+ \d\d:\d\d:\d\d \d{4})', re.IGNORECASE)
 
 
-async def annotate_disk_smart_tests(middleware, devices, disk):
+async def annotate_disk_smart_tests(middleware, powermode, disk):
     if disk["disk"] is None:
         return
 
-    args = await get_smartctl_args(middleware, devices, disk["disk"])
-    if args:
-        p = await smartctl(args + ["-l", "selftest"], check=False, encoding="utf8")
-        tests = parse_smart_selftest_results(p.stdout)
-        if tests is not None:
-            return dict(tests=tests, **disk)
+    data = await middleware.call("disk.smart_data", disk["disk"], powermode)
+    if data and data["tests"] is not None:
+        return dict(tests=data["tests"], **disk)
 
 
 def parse_smart_selftest_results(stdout):
@@ -405,16 +402,11 @@ class SMARTTestService(CRUDService):
     async def __manual_test(self, disk):
         output = {}
 
+        # The disk is going to be woken up by the test anyway so we can request fresh data regardless of power mode
+        data = await self.middleware.call('disk.smart_data', disk['disk'], 'NEVER', 0)
         try:
-            new_test_num = max(
-                test['num']
-                for test in (await self.middleware.call(
-                    'smart.test.results',
-                    [['disk', '=', disk['disk']]],
-                    {'get': True}
-                ))['tests']
-            ) + 1
-        except (MatchNotFound, ValueError):
+            new_test_num = max(test['num'] for test in (data and data['tests']) or []) + 1
+        except ValueError:
             new_test_num = 1
 
         args = ['-t', disk['type'].lower()]
@@ -544,11 +536,12 @@ class SMARTTestService(CRUDService):
             options,
         )
 
-        devices = await self.middleware.call('device.get_storage_devices_topology')
+        # Self-test log is read from S.M.A.R.T. data cache, disks in low power state are not woken up
+        powermode = (await self.middleware.call('smart.config'))['powermode']
         return filter_list(
             list(filter(
                 None,
-                await asyncio_map(functools.partial(annotate_disk_smart_tests, self.middleware, devices), disks, 16)
+                await asyncio_map(functools.partial(annotate_disk_smart_tests, self.middleware, powermode), disks, 16)
             )),
             [],
             {"get": get},
@@ -574,16 +567,9 @@ class SMARTTestService(CRUDService):
                 ) * 100,
             )
 
-            try:
-                tests = (await self.middleware.call(
-                    'smart.test.results',
-                    [['disk', '=', disk['disk']]],
-                    {'get': True}
-                ))['tests']
-            except MatchNotFound:
-                tests = []
+            data = await self.middleware.call('disk.smart_data', disk['disk'], 'NEVER', 0)
 
-            for test in tests:
+            for test in (data and data['tests']) or []:
                 if test['num'] == new_test_num:
                     return test
 
@@ -1,6 +1,6 @@
 from middlewared.common.attachment import LockableFSAttachmentDelegate
 from middlewared.common.listen import SystemServiceListenMultipleDelegate
-from middlewared.schema import Bool, Dict, IPAddr, List, Str, Int, Patch
+from middlewared.schema import Bool, Dict, IPAddr, List, Str, Int, Patch, Ref
 from middlewared.service import accepts, job, private, SharingService, SystemServiceService, ValidationErrors, filterable
 from middlewared.service_exception import CallError
 import middlewared.sqlalchemy as sa
@@ -884,9 +884,6 @@ class SharingSMBService(SharingService):
         new = old.copy()
         new.update(data)
 
-        oldname = 'homes' if old['home'] else old['name']
-        newname = 'homes' if new['home'] else new['name']
-
         new['vuid'] = await self.generate_vuid(new['timemachine'], new['vuid'])
         await self.clean(new, 'sharingsmb_update', verrors, id=id)
         await self.validate(new, 'sharingsmb_update', verrors, old=old)
@@ -942,7 +939,267 @@ class SharingSMBService(SharingService):
         else:
             enable_aapl = False
 
+        if not await self.apply_share_changes(old, new, old_is_locked, new_is_locked):
+            """
+            Configuration change only impacts a locked SMB share. From standpoint of
+            running config, this is a no-op. No need to restart or reload service.
+            """
+            return await self.get_instance(id)
+
+        if enable_aapl:
+            await self._service_change('cifs', 'restart')
+        else:
+            await self._service_change('cifs', 'reload')
+
+        return await self.get_instance(id)
+
+    @accepts(Int('id'))
+    async def do_delete(self, id):
+        """
+        Delete SMB Share of `id`. This will forcibly disconnect SMB clients
+        that are accessing the share.
+        """
+        ha_mode = SMBHAMODE[(await self.middleware.call('smb.get_smb_ha_mode'))]
+        if ha_mode == SMBHAMODE.CLUSTERED and CLUSTER_IS_HEALTHY is False:
+            raise CallError("SMB share changes not permitted while cluster is unhealthy")
+
+        if ha_mode != SMBHAMODE.CLUSTERED:
+            share = await self._get_instance(id)
+            result = await self.middleware.call('datastore.delete', self._config.datastore, id)
+        else:
+            share = await self.query([('id', '=', id)], {'get': True})
+            result = id
+
+        await self.close_share(share['name'])
+        try:
+            await self.middleware.call('smb.sharesec._delete', share['name'] if not share['home'] else 'homes')
+        except Exception:
+            self.logger.debug('Failed to delete share ACL for [%s].', share['name'], exc_info=True)
+
+        try:
+            await self.middleware.call('sharing.smb.reg_delshare',
+                                       share['name'] if not share['home'] else 'homes')
+        except Exception:
+            self.logger.warn('Failed to remove registry entry for [%s].', share['name'], exc_info=True)
+
+        if share['timemachine']:
+            await self.middleware.call('service.restart', 'mdns')
+
+        return result
+
+    @accepts(List('shares', items=[Ref('sharingsmb_create')]))
+    async def bulk_create(self, shares):
+        """
+        Create multiple SMB Shares at once.
+
+        All the shares are validated before any of them is created. They are written in a single transaction and
+        SMB service is reloaded (or restarted) only once.
+        """
+        await self.bulk_check_ha_mode()
+
+        verrors = ValidationErrors()
+        existing = await self.bulk_existing_names()
+        for i, data in enumerate(shares):
+            await self.clean(data, f'sharingsmb_bulk_create.{i}', verrors, existing=existing)
+            await self.validate(data, f'sharingsmb_bulk_create.{i}', verrors)
+
+        verrors.check()
+
+        for data in shares:
+            path = data['path']
+            if not data['cluster_volname']:
+                if path and not os.path.exists(path):
+                    try:
+                        os.makedirs(path)
+                    except OSError as e:
+                        raise CallError(f'Failed to create {path}: {e}')
+
+            await self.apply_presets(data)
+            await self.compress(data)
+            data['vuid'] = await self.generate_vuid(data['timemachine'])
+
+        ids = await self.middleware.call(
+            'datastore.bulk', self._config.datastore, [{'type': 'INSERT', 'data': data} for data in shares],
+            {'prefix': self._config.datastore_prefix},
+        )
+
+        for id, data in zip(ids, shares):
+            data['id'] = id
+            await self.strip_comments(data)
+            await self.middleware.call('sharing.smb.reg_addshare', data)
+
+        await self.bulk_service_change(shares)
+
+        return await self.query([('id', 'in', ids)])
+
+    @accepts(
+        List('shares', items=[
+            Patch(
+                'sharingsmb_create',
+                'sharingsmb_bulk_update_item',
+                ('attr', {'update': True}),
+                ('add', Int('id', required=True)),
+            ),
+        ]),
+    )
+    async def bulk_update(self, shares):
+        """
+        Update multiple SMB Shares at once. Each item must contain `id` of the share being updated.
+
+        All the changes are validated before any of them is applied. They are written in a single transaction and
+        SMB service is reloaded (or restarted) only once.
+        """
+        await self.bulk_check_ha_mode()
+
+        verrors = ValidationErrors()
+        ids = []
+        for i, data in enumerate(shares):
+            if data.get('id') is None:
+                verrors.add(f'sharingsmb_bulk_update.{i}.id', 'This field is required.')
+            elif data['id'] in ids:
+                verrors.add(f'sharingsmb_bulk_update.{i}.id', 'Only one update per share is allowed.')
+            ids.append(data.get('id'))
+
+        verrors.check()
+
+        olds = {share['id']: share for share in await self.query([('id', 'in', ids)])}
+        existing = await self.bulk_existing_names(ids)
+        updates = []
+        for i, data in enumerate(shares):
+            schema_name = f'sharingsmb_bulk_update.{i}'
+            old = olds.get(data['id'])
+            if old is None:
+                verrors.add(f'{schema_name}.id', f'{self._config.verbose_name} {data["id"]} does not exist',
+                            errno.ENOENT)
+                continue
+
+            new = old.copy()
+            new.update(data)
+
+            new['vuid'] = await self.generate_vuid(new['timemachine'], new['vuid'])
+            await self.clean(new, schema_name, verrors, id=old['id'], existing=existing)
+            await self.validate(new, schema_name, verrors, old=old)
+
+            updates.append((data, old, new))
+
+        verrors.check()
+
+        locked = []
+        for data, old, new in updates:
+            path = data.get('path')
+            if not new['cluster_volname']:
+                if path and not os.path.exists(path):
+                    try:
+                        os.makedirs(path)
+                    except OSError as e:
+                        raise CallError(f'Failed to create {path}: {e}')
+
+            if old['purpose'] != new['purpose']:
+                await self.apply_presets(new)
+
+            if old['path'] != new['path']:
+                new_is_locked = await self.middleware.call('pool.dataset.path_in_locked_datasets', new['path'])
+            else:
+                new_is_locked = old[self.locked_field]
+            locked.append(new_is_locked)
+
+            await self.compress(new)
+
+        await self.middleware.call(
+            'datastore.bulk', self._config.datastore,
+            [{'type': 'UPDATE', 'id': new['id'], 'data': new} for data, old, new in updates],
+            {'prefix': self._config.datastore_prefix},
+        )
+
+        changed = []
+        for (data, old, new), new_is_locked in zip(updates, locked):
+            await self.strip_comments(new)
+            if await self.apply_share_changes(old, new, old[self.locked_field], new_is_locked):
+                changed.append((new, new_is_locked))
+
+        if changed:
+            await self.bulk_service_change([new for new, new_is_locked in changed if not new_is_locked])
+
+        return await self.query([('id', 'in', ids)])
+
+    @accepts(List('ids', items=[Int('id')]))
+    async def bulk_delete(self, ids):
+        """
+        Delete multiple SMB Shares at once. This will forcibly disconnect SMB clients that are accessing the shares.
+
+        Either all the shares are deleted or none of them is.
+        """
+        await self.bulk_check_ha_mode()
+
+        shares = {share['id']: share for share in await self.query([('id', 'in', ids)])}
+        verrors = ValidationErrors()
+        for i, id in enumerate(ids):
+            if id not in shares:
+                verrors.add(f'sharingsmb_bulk_delete.{i}', f'{self._config.verbose_name} {id} does not exist',
+                            errno.ENOENT)
+
+        verrors.check()
+
+        await self.middleware.call(
+            'datastore.bulk', self._config.datastore, [{'type': 'DELETE', 'id': id} for id in shares],
+            {'prefix': self._config.datastore_prefix},
+        )
+
+        for share in shares.values():
+            await self.close_share(share['name'])
+            try:
+                await self.middleware.call('smb.sharesec._delete', share['name'] if not share['home'] else 'homes')
+            except Exception:
+                self.logger.debug('Failed to delete share ACL for [%s].', share['name'], exc_info=True)
+
+            try:
+                await self.middleware.call('sharing.smb.reg_delshare',
+                                           share['name'] if not share['home'] else 'homes')
+            except Exception:
+                self.logger.warn('Failed to remove registry entry for [%s].', share['name'], exc_info=True)
+
+        if any(share['timemachine'] for share in shares.values()):
+            await self.middleware.call('service.restart', 'mdns')
+
+        return list(shares)
+
+    @private
+    async def bulk_check_ha_mode(self):
+        ha_mode = SMBHAMODE[(await self.middleware.call('smb.get_smb_ha_mode'))]
+        if ha_mode == SMBHAMODE.CLUSTERED:
+            raise CallError('Bulk SMB share changes are not supported in clustered environments')
+
+    @private
+    async def bulk_existing_names(self, exclude_ids=None):
+        """
+        Names of all the shares (except for ones with `exclude_ids`) for `name_exists` to check against.
+        """
+        exclude_ids = set(exclude_ids or [])
+        return {
+            share['name']
+            for share in await self.middleware.call(
+                'datastore.query', self._config.datastore, [], {'prefix': self._config.datastore_prefix},
+            )
+            if share['id'] not in exclude_ids
+        }
+
+    @private
+    async def bulk_service_change(self, shares):
         """
+        Reloads SMB service once after a bulk change of `shares` (restarts it if AAPL extensions had to be enabled).
+        """
+        timemachine = [data for data in shares if data['timemachine']]
+        if timemachine and await self.check_aapl(timemachine[0]):
+            await self._service_change('cifs', 'restart')
+        else:
+            await self._service_change('cifs', 'reload')
+
+    @private
+    async def apply_share_changes(self, old, new, old_is_locked, new_is_locked):
+        """
+        Applies changes of share `old` to the running configuration. Returns `False` if the running
+        configuration is not affected by them.
+
         OLD    NEW   = dataset path is encrypted
          ----------
          -      -    = pre-12 behavior. Remove and replace if name changed, else update.
@@ -950,12 +1207,11 @@ class SharingSMBService(SharingService):
          X      -    = Add share to running configuration
          X      X    = no-op
         """
+        oldname = 'homes' if old['home'] else old['name']
+        newname = 'homes' if new['home'] else new['name']
+
         if old_is_locked and new_is_locked:
-            """
-            Configuration change only impacts a locked SMB share. From standpoint of
-            running config, this is a no-op. No need to restart or reload service.
-            """
-            return await self.get_instance(id)
+            return False
 
         elif not old_is_locked and not new_is_locked:
             """
@@ -996,46 +1252,7 @@ class SharingSMBService(SharingService):
                 self.logger.warning('Failed to remove locked share [%s]',
                                     old['name'], exc_info=True)
 
-        if enable_aapl:
-            await self._service_change('cifs', 'restart')
-        else:
-            await self._service_change('cifs', 'reload')
-
-        return await self.get_instance(id)
-
-    @accepts(Int('id'))
-    async def do_delete(self, id):
-        """
-        Delete SMB Share of `id`. This will forcibly disconnect SMB clients
-        that are accessing the share.
-        """
-        ha_mode = SMBHAMODE[(await self.middleware.call('smb.get_smb_ha_mode'))]
-        if ha_mode == SMBHAMODE.CLUSTERED and CLUSTER_IS_HEALTHY is False:
-            raise CallError("SMB share changes not permitted while cluster is unhealthy")
-
-        if ha_mode != SMBHAMODE.CLUSTERED:
-            share = await self._get_instance(id)
-            result = await self.middleware.call('datastore.delete', self._config.datastore, id)
-        else:
-            share = await self.query([('id', '=', id)], {'get': True})
-            result = id
-
-        await self.close_share(share['name'])
-        try:
-            await self.middleware.call('smb.sharesec._delete', share['name'] if not share['home'] else 'homes')
-        except Exception:
-            self.logger.debug('Failed to delete share ACL for [%s].', share['name'], exc_info=True)
-
-        try:
-            await self.middleware.call('sharing.smb.reg_delshare',
-                                       share['name'] if not share['home'] else 'homes')
-        except Exception:
-            self.logger.warn('Failed to remove registry entry for [%s].', share['name'], exc_info=True)
-
-        if share['timemachine']:
-            await self.middleware.call('service.restart', 'mdns')
-
-        return result
+        return True
 
     @filterable
     async def query(self, filters=None, options=None):
@@ -1084,8 +1301,8 @@ class SharingSMBService(SharingService):
                              share_name, c.stderr.decode().strip())
 
     @private
-    async def clean(self, data, schema_name, verrors, id=None):
-        data['name'] = await self.name_exists(data, schema_name, verrors, id)
+    async def clean(self, data, schema_name, verrors, id=None, existing=None):
+        data['name'] = await self.name_exists(data, schema_name, verrors, id, existing)
 
     @private
     async def validate_aux_params(self, data, schema_name):
@@ -1226,22 +1443,30 @@ class SharingSMBService(SharingService):
             return '\n'.join([f'{k}={v}' if v is not None else k for k, v in aux.items()])
 
     @private
-    async def name_exists(self, data, schema_name, verrors, id=None):
+    async def name_exists(self, data, schema_name, verrors, id=None, existing=None):
+        """
+        `existing` is a set of names of other shares. When provided, it is used instead of querying the datastore
+        and `name` is added to it.
+        """
         name = data['name']
         path = data['path']
 
         if path and not name:
             name = path.rsplit('/', 1)[-1]
 
-        name_filters = [('name', '=', name)]
+        if existing is not None:
+            name_result = name in existing
+            existing.add(name)
+        else:
+            name_filters = [('name', '=', name)]
 
-        if id is not None:
-            name_filters.append(('id', '!=', id))
+            if id is not None:
+                name_filters.append(('id', '!=', id))
 
-        name_result = await self.middleware.call(
-            'datastore.query', self._config.datastore,
-            name_filters,
-            {'prefix': self._config.datastore_prefix})
+            name_result = await self.middleware.call(
+                'datastore.query', self._config.datastore,
+                name_filters,
+                {'prefix': self._config.datastore_prefix})
 
         if name_result:
             verrors.add(f'{schema_name}.name',
@@ -151,7 +151,7 @@ class PeriodicSnapshotTaskService(CRUDService):
             {'prefix': self._config.datastore_prefix}
         )
 
-        await self.middleware.call('zettarepl.update_tasks')
+        await self.middleware.call('zettarepl.update_tasks', {'periodic_snapshot_tasks': [data['id']]})
 
         return await self._get_instance(data['id'])
 
@@ -230,7 +230,7 @@ class PeriodicSnapshotTaskService(CRUDService):
             {'prefix': self._config.datastore_prefix}
         )
 
-        await self.middleware.call('zettarepl.update_tasks')
+        await self.middleware.call('zettarepl.update_tasks', {'periodic_snapshot_tasks': [id]})
 
         return await self._get_instance(id)
 
@@ -273,7 +273,7 @@ class PeriodicSnapshotTaskService(CRUDService):
             id
         )
 
-        await self.middleware.call('zettarepl.update_tasks')
+        await self.middleware.call('zettarepl.update_tasks', {'periodic_snapshot_tasks': [id]})
 
         return response
 
@@ -332,13 +332,17 @@ class PeriodicSnapshotTaskFSAttachmentDelegate(FSAttachmentDelegate):
         for attachment in attachments:
             await self.middleware.call('datastore.delete', 'storage.task', attachment['id'])
 
-        await self.middleware.call('zettarepl.update_tasks')
+        await self.middleware.call('zettarepl.update_tasks', {
+            'periodic_snapshot_tasks': [attachment['id'] for attachment in attachments],
+        })
 
     async def toggle(self, attachments, enabled):
         for attachment in attachments:
             await self.middleware.call('datastore.update', 'storage.task', attachment['id'], {'task_enabled': enabled})
 
-        await self.middleware.call('zettarepl.update_tasks')
+        await self.middleware.call('zettarepl.update_tasks', {
+            'periodic_snapshot_tasks': [attachment['id'] for attachment in attachments],
+        })
 
 
 async def on_zettarepl_state_changed(middleware, id, fields):
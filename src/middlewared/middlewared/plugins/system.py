@@ -1601,7 +1601,7 @@ class SystemHealthEventSource(EventSource):
     def pools_statuses(self):
         return {
             p['name']: {'status': p['status']}
-            for p in self.middleware.call_sync('pool.query')
+            for p in self.middleware.call_sync('pool.query', [], {'select': ['name', 'status']})
         }
 
     def run(self):
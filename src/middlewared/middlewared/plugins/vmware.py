@@ -239,9 +239,8 @@ class VMWareService(CRUDService):
                 zvol = extent["path"][len("zvol/"):]
                 iscsi_extents[zvol].append(f"naa.{extent['naa'][2:]}")
         filesystems = []
-        for fs in self.middleware.call_sync("pool.dataset.query", [
-            ("pool", "in", [vol["name"] for vol in self.middleware.call_sync("pool.query")]),
-        ]):
+        pools = [vol["name"] for vol in self.middleware.call_sync("pool.query", [], {"select": ["name"]})]
+        for fs in self.middleware.call_sync("pool.dataset.query", [("pool", "in", pools)]):
             if fs["type"] == "FILESYSTEM":
                 filesystems.append({
                     "type": "FILESYSTEM",
@@ -1,5 +1,5 @@
 from collections import defaultdict
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timedelta
 import errno
 import logging
@@ -56,6 +56,8 @@ INVALID_DATASETS = (
 )
 SSH_EXCEPTIONS = (socket.timeout, paramiko.ssh_exception.NoValidConnectionsError, paramiko.ssh_exception.SSHException,
                   IOError, OSError)
+# Maximum amount of observer messages processed at once
+OBSERVER_QUEUE_BATCH_SIZE = 1000
 
 
 def lifetime_timedelta(value, unit):
@@ -96,6 +98,64 @@ def replication_task_exclude(replication_task):
     return exclude
 
 
+@contextmanager
+def timing(timings, name):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0) + time.monotonic() - start
+
+
+def apply_definition_diff(definition, diff):
+    definition = dict(definition)
+    for key in ["periodic-snapshot-tasks", "replication-tasks"]:
+        tasks = definition[key] = dict(definition[key])
+        for task_id, task_definition in diff.get(key, {}).items():
+            if task_definition is None:
+                tasks.pop(task_id, None)
+            else:
+                tasks[task_id] = task_definition
+
+    return definition
+
+
+def replication_tasks_using(definition, periodic_snapshot_task_ids):
+    """
+    Returns ids of replication tasks in `definition` that use any of the periodic snapshot tasks
+    `periodic_snapshot_task_ids`.
+    """
+    periodic_snapshot_tasks = {f"task_{id}" for id in periodic_snapshot_task_ids}
+    return {
+        int(task_id[len("task_"):])
+        for task_id, replication_task in definition["replication-tasks"].items()
+        if periodic_snapshot_tasks & set(replication_task.get("periodic-snapshot-tasks", []))
+    }
+
+
+def coalesce_observer_messages(messages):
+    """
+    Drops replication progress messages that are superseded by a later progress message of the same kind for the
+    same task. Messages that change task state in any other way (except logs) are never reordered or skipped over.
+    """
+    result = []
+    superseded = set()
+    for message in reversed(messages):
+        if isinstance(message, (ReplicationTaskSnapshotProgress, ReplicationTaskDataProgress)):
+            key = (type(message), message.task_id)
+            if key in superseded:
+                continue
+
+            superseded.add(key)
+        elif not isinstance(message, ReplicationTaskLog) and getattr(message, "task_id", None) is not None:
+            superseded = {key for key in superseded if key[1] != message.task_id}
+
+        result.append(message)
+
+    result.reverse()
+    return result
+
+
 def zettarepl_schedule(schedule):
     schedule = {k.replace("_", "-"): v for k, v in schedule.items()}
     schedule["day-of-month"] = schedule.pop("dom")
@@ -219,8 +279,13 @@ class ZettareplProcess:
             command, args = self.command_queue.get()
             if command == "timezone":
                 self.zettarepl.scheduler.tz_clock.timezone = pytz.timezone(args)
-            if command == "tasks":
-                definition = Definition.from_data(args, raise_on_error=False)
+            if command in ["tasks", "tasks_diff"]:
+                if command == "tasks":
+                    self.definition = args
+                else:
+                    self.definition = apply_definition_diff(self.definition, args)
+
+                definition = Definition.from_data(self.definition, raise_on_error=False)
                 self.observer_queue.put(DefinitionErrors(definition.errors))
                 self.zettarepl.set_tasks(definition.tasks)
             if command == "run_task":
@@ -247,30 +312,41 @@ class ZettareplService(Service):
         self.command_queue = None
         self.observer_queue = multiprocessing.Queue()
         self.observer_queue_reader = None
+        self.observer_queue_stats = {"messages": 0, "batches": 0, "coalesced": 0}
         self.replication_jobs_channels = defaultdict(list)
         self.queue = None
         self.process = None
         self.zettarepl = None
+        # Last definition (and tasks on hold) sent to zettarepl process
+        self.definition = None
+        self.definition_hold_tasks = None
+        self.definition_timings = {}
 
     def is_running(self):
         return self.process is not None and self.process.is_alive()
 
-    def start(self):
-        try:
-            definition, hold_tasks = self.middleware.call_sync("zettarepl.get_definition")
-        except Exception as e:
-            self.logger.error("Error generating zettarepl definition", exc_info=True)
-            self.middleware.call_sync("zettarepl.set_error", {
-                "state": "ERROR",
-                "datetime": datetime.utcnow(),
-                "error": make_sentence(str(e)),
-            })
-            raise CallError(f"Internal error: {e!r}")
-        else:
-            self.middleware.call_sync("zettarepl.set_error", None)
+    def start(self, definition=None, hold_tasks=None):
+        if self.is_running():
+            return
+
+        if definition is None:
+            try:
+                definition, hold_tasks = self.middleware.call_sync("zettarepl.get_definition")
+            except Exception as e:
+                self.logger.error("Error generating zettarepl definition", exc_info=True)
+                self.middleware.call_sync("zettarepl.set_error", {
+                    "state": "ERROR",
+                    "datetime": datetime.utcnow(),
+                    "error": make_sentence(str(e)),
+                })
+                raise CallError(f"Internal error: {e!r}")
+            else:
+                self.middleware.call_sync("zettarepl.set_error", None)
 
         with self.lock:
             if not self.is_running():
+                self.definition = definition
+                self.definition_hold_tasks = hold_tasks
                 self.queue = multiprocessing.Queue()
                 self.process = multiprocessing.Process(
                     name="zettarepl",
@@ -295,12 +371,24 @@ class ZettareplService(Service):
                     os.kill(self.process.pid, signal.SIGKILL)
 
                 self.process = None
+                self.definition = None
+                self.definition_hold_tasks = None
 
     def update_timezone(self, timezone):
         if self.queue:
             self.queue.put(("timezone", timezone))
 
-    def update_tasks(self):
+    def update_tasks(self, tasks=None):
+        """
+        Regenerates zettarepl definition and sends it to zettarepl process.
+
+        `tasks` (e.g. `{"periodic_snapshot_tasks": [1], "replication_tasks": [2, 3]}`) can be specified when only
+        these tasks were changed. Then only their definitions are regenerated and sent to the running process as a
+        diff.
+        """
+        if tasks is not None and self._update_tasks_diff(tasks):
+            return
+
         try:
             definition, hold_tasks = self.middleware.call_sync("zettarepl.get_definition")
         except Exception as e:
@@ -317,11 +405,58 @@ class ZettareplService(Service):
         if self._is_empty_definition(definition):
             self.middleware.call_sync("zettarepl.stop")
         else:
-            self.middleware.call_sync("zettarepl.start")
-            self.queue.put(("tasks", definition))
+            with self.lock:
+                running = self.is_running()
+                if running:
+                    self.definition = definition
+                    self.definition_hold_tasks = hold_tasks
+                    self.queue.put(("tasks", definition))
+
+            if not running:
+                self.middleware.call_sync("zettarepl.start", definition, hold_tasks)
 
         self.middleware.call_sync("zettarepl.notify_definition", definition, hold_tasks)
 
+    def _update_tasks_diff(self, tasks):
+        with self.lock:
+            base_definition = self.definition if self.is_running() else None
+
+        if base_definition is None:
+            return False
+
+        tasks = dict(tasks, replication_tasks=list(
+            set(tasks.get("replication_tasks", [])) |
+            replication_tasks_using(base_definition, tasks.get("periodic_snapshot_tasks", []))
+        ))
+        try:
+            diff, hold_tasks_diff = self.middleware.call_sync("zettarepl.get_definition", tasks)
+        except Exception:
+            self.logger.error("Error generating zettarepl definition diff", exc_info=True)
+            return False
+
+        with self.lock:
+            # Diff was generated without holding the lock, it can only be applied to the definition it is based on
+            if self.definition is not base_definition or not self.is_running():
+                return False
+
+            definition = apply_definition_diff(base_definition, diff)
+            hold_tasks = dict(self.definition_hold_tasks)
+            for task_id, hold_task in hold_tasks_diff.items():
+                if hold_task is None:
+                    hold_tasks.pop(task_id, None)
+                else:
+                    hold_tasks[task_id] = hold_task
+
+            if self._is_empty_definition(definition):
+                return False
+
+            self.definition = definition
+            self.definition_hold_tasks = hold_tasks
+            self.queue.put(("tasks_diff", diff))
+
+        self.middleware.call_sync("zettarepl.notify_definition", definition, hold_tasks)
+        return True
+
     async def run_periodic_snapshot_task(self, id):
         try:
             self.queue.put(("run_task", ("PeriodicSnapshotTask", f"task_{id}")))
@@ -480,134 +615,124 @@ class ZettareplService(Service):
 
         return errors
 
-    async def get_definition(self):
-        timezone = (await self.middleware.call("system.general.config"))["timezone"]
+    async def get_definition(self, tasks=None):
+        """
+        Returns zettarepl definition and tasks that are on hold.
 
-        pools = {pool["name"]: pool for pool in await self.middleware.call("pool.query")}
+        If `tasks` (e.g. `{"periodic_snapshot_tasks": [1], "replication_tasks": [2, 3]}`) is specified, only the
+        definition for these tasks is returned. Tasks that were deleted, disabled or put on hold have `None`
+        definition (and tasks that are no longer on hold have `None` hold state) so the result can be applied as a
+        diff to the previous definition.
+        """
+        timings = {}
 
-        hold_tasks = {}
-
-        periodic_snapshot_tasks = {}
-        for periodic_snapshot_task in await self.middleware.call("pool.snapshottask.query", [["enabled", "=", True]]):
-            hold_task_reason = self._hold_task_reason(pools, periodic_snapshot_task["dataset"])
-            if hold_task_reason:
-                hold_tasks[f"periodic_snapshot_task_{periodic_snapshot_task['id']}"] = hold_task_reason
-                continue
+        with timing(timings, "timezone"):
+            timezone = (await self.middleware.call("system.general.config"))["timezone"]
 
-            periodic_snapshot_tasks[f"task_{periodic_snapshot_task['id']}"] = {
-                "dataset": periodic_snapshot_task["dataset"],
+        with timing(timings, "pools"):
+            pools = await self._get_pools()
 
-                "recursive": periodic_snapshot_task["recursive"],
-                "exclude": periodic_snapshot_task["exclude"],
-
-                "lifetime": lifetime_iso8601(periodic_snapshot_task["lifetime_value"],
-                                             periodic_snapshot_task["lifetime_unit"]),
-
-                "naming-schema": periodic_snapshot_task["naming_schema"],
+        hold_tasks = {}
 
-                "schedule": zettarepl_schedule(periodic_snapshot_task["schedule"]),
+        periodic_snapshot_tasks = {}
+        with timing(timings, "periodic_snapshot_tasks"):
+            filters = [["enabled", "=", True]]
+            if tasks is not None:
+                ids = tasks.get("periodic_snapshot_tasks", [])
+                periodic_snapshot_tasks.update({f"task_{id}": None for id in ids})
+                hold_tasks.update({f"periodic_snapshot_task_{id}": None for id in ids})
+                filters.append(["id", "in", ids])
+
+            for periodic_snapshot_task in (
+                await self.middleware.call("pool.snapshottask.query", filters) if tasks is None or ids else []
+            ):
+                hold_task_reason = self._hold_task_reason(pools, periodic_snapshot_task["dataset"])
+                if hold_task_reason:
+                    hold_tasks[f"periodic_snapshot_task_{periodic_snapshot_task['id']}"] = hold_task_reason
+                    continue
 
-                "allow-empty": periodic_snapshot_task["allow_empty"],
-            }
+                periodic_snapshot_tasks[f"task_{periodic_snapshot_task['id']}"] = (
+                    self._periodic_snapshot_task_definition(periodic_snapshot_task)
+                )
 
         replication_tasks = {}
-        for replication_task in await self.middleware.call("replication.query", [["enabled", "=", True]]):
-            if replication_task["direction"] == "PUSH":
-                hold = False
-                for source_dataset in replication_task["source_datasets"]:
-                    hold_task_reason = self._hold_task_reason(pools, source_dataset)
+        with timing(timings, "replication_tasks"):
+            filters = [["enabled", "=", True]]
+            if tasks is None:
+                replication_tasks_list = await self.middleware.call("replication.query", filters)
+            else:
+                ids = set(tasks.get("replication_tasks", []))
+                periodic_snapshot_task_ids = set(tasks.get("periodic_snapshot_tasks", []))
+                if periodic_snapshot_task_ids:
+                    # Replication tasks that use changed periodic snapshot tasks must be regenerated too
+                    replication_tasks_list = [
+                        replication_task
+                        for replication_task in await self.middleware.call("replication.query", filters)
+                        if replication_task["id"] in ids or any(
+                            periodic_snapshot_task["id"] in periodic_snapshot_task_ids
+                            for periodic_snapshot_task in replication_task["periodic_snapshot_tasks"]
+                        )
+                    ]
+                elif ids:
+                    replication_tasks_list = await self.middleware.call(
+                        "replication.query", filters + [["id", "in", list(ids)]]
+                    )
+                else:
+                    replication_tasks_list = []
+
+                ids |= {replication_task["id"] for replication_task in replication_tasks_list}
+                replication_tasks.update({f"task_{id}": None for id in ids})
+                hold_tasks.update({f"replication_task_{id}": None for id in ids})
+
+            can_perform_activity = None
+            for replication_task in replication_tasks_list:
+                if replication_task["direction"] == "PUSH":
+                    hold = False
+                    for source_dataset in replication_task["source_datasets"]:
+                        hold_task_reason = self._hold_task_reason(pools, source_dataset)
+                        if hold_task_reason:
+                            hold_tasks[f"replication_task_{replication_task['id']}"] = hold_task_reason
+                            hold = True
+                            break
+                    if hold:
+                        continue
+
+                if replication_task["direction"] == "PULL":
+                    hold_task_reason = self._hold_task_reason(pools, replication_task["target_dataset"])
                     if hold_task_reason:
                         hold_tasks[f"replication_task_{replication_task['id']}"] = hold_task_reason
-                        hold = True
-                        break
-                if hold:
-                    continue
-
-            if replication_task["direction"] == "PULL":
-                hold_task_reason = self._hold_task_reason(pools, replication_task["target_dataset"])
-                if hold_task_reason:
-                    hold_tasks[f"replication_task_{replication_task['id']}"] = hold_task_reason
-                    continue
-
-            if replication_task["transport"] != "LOCAL":
-                if not await self.middleware.call("network.general.can_perform_activity", "replication"):
-                    hold_tasks[f"replication_task_{replication_task['id']}"] = (
-                        "Replication network activity is disabled"
-                    )
+                        continue
+
+                if replication_task["transport"] != "LOCAL":
+                    if can_perform_activity is None:
+                        can_perform_activity = await self.middleware.call(
+                            "network.general.can_perform_activity", "replication"
+                        )
+
+                    if not can_perform_activity:
+                        hold_tasks[f"replication_task_{replication_task['id']}"] = (
+                            "Replication network activity is disabled"
+                        )
+                        continue
+
+                try:
+                    with timing(timings, "transports"):
+                        transport = await self._define_transport(
+                            replication_task["transport"],
+                            (replication_task["ssh_credentials"] or {}).get("id"),
+                            replication_task["netcat_active_side"],
+                            replication_task["netcat_active_side_listen_address"],
+                            replication_task["netcat_active_side_port_min"],
+                            replication_task["netcat_active_side_port_max"],
+                            replication_task["netcat_passive_side_connect_address"],
+                        )
+                except CallError as e:
+                    hold_tasks[f"replication_task_{replication_task['id']}"] = e.errmsg
                     continue
 
-            try:
-                transport = await self._define_transport(
-                    replication_task["transport"],
-                    (replication_task["ssh_credentials"] or {}).get("id"),
-                    replication_task["netcat_active_side"],
-                    replication_task["netcat_active_side_listen_address"],
-                    replication_task["netcat_active_side_port_min"],
-                    replication_task["netcat_active_side_port_max"],
-                    replication_task["netcat_passive_side_connect_address"],
+                replication_tasks[f"task_{replication_task['id']}"] = self._replication_task_definition(
+                    replication_task, transport
                 )
-            except CallError as e:
-                hold_tasks[f"replication_task_{replication_task['id']}"] = e.errmsg
-                continue
-
-            properties_exclude = replication_task["properties_exclude"].copy()
-            properties_override = replication_task["properties_override"].copy()
-            for property in ["mountpoint", "sharenfs", "sharesmb"]:
-                if property not in properties_override:
-                    if property not in properties_exclude:
-                        properties_exclude.append(property)
-
-            definition = {
-                "direction": replication_task["direction"].lower(),
-                "transport": transport,
-                "source-dataset": replication_task["source_datasets"],
-                "target-dataset": replication_task["target_dataset"],
-                "recursive": replication_task["recursive"],
-                "exclude": replication_task_exclude(replication_task),
-                "properties": replication_task["properties"],
-                "properties-exclude": properties_exclude,
-                "properties-override": properties_override,
-                "replicate": replication_task["replicate"],
-                "periodic-snapshot-tasks": [
-                    f"task_{periodic_snapshot_task['id']}"
-                    for periodic_snapshot_task in replication_task["periodic_snapshot_tasks"]
-                ],
-                "auto": replication_task["auto"],
-                "only-matching-schedule": replication_task["only_matching_schedule"],
-                "allow-from-scratch": replication_task["allow_from_scratch"],
-                "readonly": replication_task["readonly"].lower(),
-                "hold-pending-snapshots": replication_task["hold_pending_snapshots"],
-                "retention-policy": replication_task["retention_policy"].lower(),
-                "large-block": replication_task["large_block"],
-                "embed": replication_task["embed"],
-                "compressed": replication_task["compressed"],
-                "retries": replication_task["retries"],
-                "logging-level": (replication_task["logging_level"] or "NOTSET").lower(),
-            }
-
-            if replication_task["encryption"]:
-                definition["encryption"] = {
-                    "key": replication_task["encryption_key"],
-                    "key-format": replication_task["encryption_key_format"].lower(),
-                    "key-location": replication_task["encryption_key_location"],
-                }
-            if replication_task["naming_schema"]:
-                definition["naming-schema"] = replication_task["naming_schema"]
-            if replication_task["also_include_naming_schema"]:
-                definition["also-include-naming-schema"] = replication_task["also_include_naming_schema"]
-            if replication_task["schedule"] is not None:
-                definition["schedule"] = zettarepl_schedule(replication_task["schedule"])
-            if replication_task["restrict_schedule"] is not None:
-                definition["restrict-schedule"] = zettarepl_schedule(replication_task["restrict_schedule"])
-            if replication_task["lifetime_value"] is not None and replication_task["lifetime_unit"] is not None:
-                definition["lifetime"] = lifetime_iso8601(replication_task["lifetime_value"],
-                                                          replication_task["lifetime_unit"])
-            if replication_task["compression"] is not None:
-                definition["compression"] = replication_task["compression"].lower()
-            if replication_task["speed_limit"] is not None:
-                definition["speed-limit"] = replication_task["speed_limit"]
-
-            replication_tasks[f"task_{replication_task['id']}"] = definition
 
         definition = {
             "timezone": timezone,
@@ -615,20 +740,116 @@ class ZettareplService(Service):
             "replication-tasks": replication_tasks,
         }
 
-        # Test if does not cause exceptions
-        Definition.from_data(definition, raise_on_error=False)
+        if tasks is None:
+            # Test if does not cause exceptions. Partial definitions are validated by zettarepl process once applied.
+            with timing(timings, "validation"):
+                Definition.from_data(definition, raise_on_error=False)
 
         hold_tasks = {
             task_id: {
                 "state": "HOLD",
                 "datetime": datetime.utcnow(),
                 "reason": make_sentence(reason),
-            }
+            } if reason is not None else None
             for task_id, reason in hold_tasks.items()
         }
 
+        self.definition_timings = timings
+        self.logger.debug("Generated zettarepl definition for %r in %.3f seconds: %r", tasks or "all tasks",
+                          sum(v for k, v in timings.items() if k != "transports"), timings)
+
         return definition, hold_tasks
 
+    def get_definition_timings(self):
+        """
+        Returns timing breakdown (in seconds) of the last `zettarepl.get_definition` call.
+        """
+        return self.definition_timings
+
+    async def _get_pools(self):
+        # Pools topology and scan status are not needed here and are expensive to retrieve
+        return {
+            pool["name"]: pool
+            for pool in await self.middleware.call("pool.query", [], {"select": ["name", "status", "is_decrypted"]})
+        }
+
+    def _periodic_snapshot_task_definition(self, periodic_snapshot_task):
+        return {
+            "dataset": periodic_snapshot_task["dataset"],
+
+            "recursive": periodic_snapshot_task["recursive"],
+            "exclude": periodic_snapshot_task["exclude"],
+
+            "lifetime": lifetime_iso8601(periodic_snapshot_task["lifetime_value"],
+                                         periodic_snapshot_task["lifetime_unit"]),
+
+            "naming-schema": periodic_snapshot_task["naming_schema"],
+
+            "schedule": zettarepl_schedule(periodic_snapshot_task["schedule"]),
+
+            "allow-empty": periodic_snapshot_task["allow_empty"],
+        }
+
+    def _replication_task_definition(self, replication_task, transport):
+        properties_exclude = replication_task["properties_exclude"].copy()
+        properties_override = replication_task["properties_override"].copy()
+        for property in ["mountpoint", "sharenfs", "sharesmb"]:
+            if property not in properties_override:
+                if property not in properties_exclude:
+                    properties_exclude.append(property)
+
+        definition = {
+            "direction": replication_task["direction"].lower(),
+            "transport": transport,
+            "source-dataset": replication_task["source_datasets"],
+            "target-dataset": replication_task["target_dataset"],
+            "recursive": replication_task["recursive"],
+            "exclude": replication_task_exclude(replication_task),
+            "properties": replication_task["properties"],
+            "properties-exclude": properties_exclude,
+            "properties-override": properties_override,
+            "replicate": replication_task["replicate"],
+            "periodic-snapshot-tasks": [
+                f"task_{periodic_snapshot_task['id']}"
+                for periodic_snapshot_task in replication_task["periodic_snapshot_tasks"]
+            ],
+            "auto": replication_task["auto"],
+            "only-matching-schedule": replication_task["only_matching_schedule"],
+            "allow-from-scratch": replication_task["allow_from_scratch"],
+            "readonly": replication_task["readonly"].lower(),
+            "hold-pending-snapshots": replication_task["hold_pending_snapshots"],
+            "retention-policy": replication_task["retention_policy"].lower(),
+            "large-block": replication_task["large_block"],
+            "embed": replication_task["embed"],
+            "compressed": replication_task["compressed"],
+            "retries": replication_task["retries"],
+            "logging-level": (replication_task["logging_level"] or "NOTSET").lower(),
+        }
+
+        if replication_task["encryption"]:
+            definition["encryption"] = {
+                "key": replication_task["encryption_key"],
+                "key-format": replication_task["encryption_key_format"].lower(),
+                "key-location": replication_task["encryption_key_location"],
+            }
+        if replication_task["naming_schema"]:
+            definition["naming-schema"] = replication_task["naming_schema"]
+        if replication_task["also_include_naming_schema"]:
+            definition["also-include-naming-schema"] = replication_task["also_include_naming_schema"]
+        if replication_task["schedule"] is not None:
+            definition["schedule"] = zettarepl_schedule(replication_task["schedule"])
+        if replication_task["restrict_schedule"] is not None:
+            definition["restrict-schedule"] = zettarepl_schedule(replication_task["restrict_schedule"])
+        if replication_task["lifetime_value"] is not None and replication_task["lifetime_unit"] is not None:
+            definition["lifetime"] = lifetime_iso8601(replication_task["lifetime_value"],
+                                                      replication_task["lifetime_unit"])
+        if replication_task["compression"] is not None:
+            definition["compression"] = replication_task["compression"].lower()
+        if replication_task["speed_limit"] is not None:
+            definition["speed-limit"] = replication_task["speed_limit"]
+
+        return definition
+
     def _hold_task_reason(self, pools, dataset):
         pool = dataset.split("/")[0]
 
@@ -704,165 +925,197 @@ class ZettareplService(Service):
 
     def _observer_queue_reader(self):
         while True:
-            message = self.observer_queue.get()
-
+            messages = [self.observer_queue.get()]
             try:
-                self.logger.trace("Observer queue got %r", message)
-
-                # Global events
-
-                if isinstance(message, DefinitionErrors):
-                    definition_errors = {}
-                    for error in message.errors:
-                        if isinstance(error, PeriodicSnapshotTaskDefinitionError):
-                            definition_errors[f"periodic_snapshot_{error.task_id}"] = {
-                                "state": "ERROR",
-                                "datetime": datetime.utcnow(),
-                                "error": make_sentence(str(error)),
-                            }
-                        if isinstance(error, ReplicationTaskDefinitionError):
-                            definition_errors[f"replication_{error.task_id}"] = {
-                                "state": "ERROR",
-                                "datetime": datetime.utcnow(),
-                                "error": make_sentence(str(error)),
-                            }
-
-                    self.middleware.call_sync("zettarepl.set_definition_errors", definition_errors)
-
-                # Periodic snapshot task
-
-                if isinstance(message, PeriodicSnapshotTaskStart):
-                    self.middleware.call_sync("zettarepl.set_state", f"periodic_snapshot_{message.task_id}", {
-                        "state": "RUNNING",
-                        "datetime": datetime.utcnow(),
-                    })
-
-                if isinstance(message, PeriodicSnapshotTaskSuccess):
-                    self.middleware.call_sync("zettarepl.set_state", f"periodic_snapshot_{message.task_id}", {
-                        "state": "FINISHED",
-                        "datetime": datetime.utcnow(),
-                    })
-
-                if isinstance(message, PeriodicSnapshotTaskError):
-                    self.middleware.call_sync("zettarepl.set_state", f"periodic_snapshot_{message.task_id}", {
+                while len(messages) < OBSERVER_QUEUE_BATCH_SIZE:
+                    messages.append(self.observer_queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            batch = coalesce_observer_messages(messages)
+
+            self.observer_queue_stats["messages"] += len(messages)
+            self.observer_queue_stats["batches"] += 1
+            self.observer_queue_stats["coalesced"] += len(messages) - len(batch)
+
+            # Task states are accumulated and applied once per batch
+            states = {}
+            last_snapshots = {}
+            for message in batch:
+                try:
+                    self._process_observer_message(message, states, last_snapshots)
+                except Exception:
+                    self.logger.warning("Unhandled exception in observer_queue_reader", exc_info=True)
+
+            if states or last_snapshots:
+                try:
+                    self.middleware.call_sync("zettarepl.set_states", states, last_snapshots)
+                except Exception:
+                    self.logger.warning("Unhandled exception in observer_queue_reader", exc_info=True)
+
+    def _process_observer_message(self, message, states, last_snapshots):
+        self.logger.trace("Observer queue got %r", message)
+
+        # Global events
+
+        if isinstance(message, DefinitionErrors):
+            definition_errors = {}
+            for error in message.errors:
+                if isinstance(error, PeriodicSnapshotTaskDefinitionError):
+                    definition_errors[f"periodic_snapshot_{error.task_id}"] = {
                         "state": "ERROR",
                         "datetime": datetime.utcnow(),
-                        "error": make_sentence(message.error),
-                    })
-
-                # Replication task events
-
-                if isinstance(message, ReplicationTaskScheduled):
-                    if (
-                            (self.middleware.call_sync(
-                                "zettarepl.get_state_internal", f"replication_{message.task_id}"
-                            ) or {}).get("state") != "RUNNING"
-                    ):
-                        self.middleware.call_sync("zettarepl.set_state", f"replication_{message.task_id}", {
-                            "state": "WAITING",
-                            "datetime": datetime.utcnow(),
-                        })
-
-                if isinstance(message, ReplicationTaskStart):
-                    self.middleware.call_sync("zettarepl.set_state", f"replication_{message.task_id}", {
-                        "state": "RUNNING",
+                        "error": make_sentence(str(error)),
+                    }
+                if isinstance(error, ReplicationTaskDefinitionError):
+                    definition_errors[f"replication_{error.task_id}"] = {
+                        "state": "ERROR",
                         "datetime": datetime.utcnow(),
-                    })
+                        "error": make_sentence(str(error)),
+                    }
 
-                    # Start fake job if none are already running
-                    if not self.replication_jobs_channels[message.task_id]:
-                        self.middleware.call_sync("replication.run", int(message.task_id[5:]), False)
+            self.middleware.call_sync("zettarepl.set_definition_errors", definition_errors)
 
-                if isinstance(message, ReplicationTaskLog):
-                    for channel in self.replication_jobs_channels[message.task_id]:
-                        channel.put(message)
+        # Periodic snapshot task
 
-                if isinstance(message, ReplicationTaskSnapshotStart):
-                    self.middleware.call_sync("zettarepl.set_state", f"replication_{message.task_id}", {
-                        "state": "RUNNING",
-                        "datetime": datetime.utcnow(),
-                        "progress": {
-                            "dataset": message.dataset,
-                            "snapshot": message.snapshot,
-                            "snapshots_sent": message.snapshots_sent,
-                            "snapshots_total": message.snapshots_total,
-                            "bytes_sent": 0,
-                            "bytes_total": 0,
-                            # legacy
-                            "current": 0,
-                            "total": 0,
-                        }
-                    })
-
-                    for channel in self.replication_jobs_channels[message.task_id]:
-                        channel.put(message)
+        if isinstance(message, PeriodicSnapshotTaskStart):
+            states[f"periodic_snapshot_{message.task_id}"] = {
+                "state": "RUNNING",
+                "datetime": datetime.utcnow(),
+            }
 
-                if isinstance(message, ReplicationTaskSnapshotProgress):
-                    self.middleware.call_sync("zettarepl.set_state", f"replication_{message.task_id}", {
-                        "state": "RUNNING",
-                        "datetime": datetime.utcnow(),
-                        "progress": {
-                            "dataset": message.dataset,
-                            "snapshot": message.snapshot,
-                            "snapshots_sent": message.snapshots_sent,
-                            "snapshots_total": message.snapshots_total,
-                            "bytes_sent": message.bytes_sent,
-                            "bytes_total": message.bytes_total,
-                            # legacy
-                            "current": message.bytes_sent,
-                            "total": message.bytes_total,
-                        }
-                    })
-
-                    for channel in self.replication_jobs_channels[message.task_id]:
-                        channel.put(message)
-
-                if isinstance(message, ReplicationTaskSnapshotSuccess):
-                    self.middleware.call_sync("zettarepl.set_last_snapshot", f"replication_{message.task_id}",
-                                              f"{message.dataset}@{message.snapshot}")
-
-                    for channel in self.replication_jobs_channels[message.task_id]:
-                        channel.put(message)
+        if isinstance(message, PeriodicSnapshotTaskSuccess):
+            states[f"periodic_snapshot_{message.task_id}"] = {
+                "state": "FINISHED",
+                "datetime": datetime.utcnow(),
+            }
 
-                if isinstance(message, ReplicationTaskDataProgress):
-                    task_id = f"replication_{message.task_id}"
-                    try:
-                        state = self.middleware.call_sync("zettarepl.get_internal_task_state", task_id)
-                    except KeyError:
-                        pass
-                    else:
-                        if state["state"] == "RUNNING" and "progress" in state:
-                            state["progress"].update({
-                                "root_dataset": message.dataset,
-                                "src_size": message.src_size,
-                                "dst_size": message.dst_size,
-                            })
-                            self.middleware.call_sync("zettarepl.set_state", task_id, state)
-
-                    for channel in self.replication_jobs_channels[message.task_id]:
-                        channel.put(message)
+        if isinstance(message, PeriodicSnapshotTaskError):
+            states[f"periodic_snapshot_{message.task_id}"] = {
+                "state": "ERROR",
+                "datetime": datetime.utcnow(),
+                "error": make_sentence(message.error),
+            }
 
-                if isinstance(message, ReplicationTaskSuccess):
-                    self.middleware.call_sync("zettarepl.set_state", f"replication_{message.task_id}", {
-                        "state": "FINISHED",
-                        "datetime": datetime.utcnow(),
-                    })
+        # Replication task events
+
+        if isinstance(message, ReplicationTaskScheduled):
+            task_id = f"replication_{message.task_id}"
+            if task_id in states:
+                state = states[task_id]
+            else:
+                state = self.middleware.call_sync("zettarepl.get_state_internal", task_id)
+            if (state or {}).get("state") != "RUNNING":
+                states[task_id] = {
+                    "state": "WAITING",
+                    "datetime": datetime.utcnow(),
+                }
 
-                    for channel in self.replication_jobs_channels[message.task_id]:
-                        channel.put(message)
+        if isinstance(message, ReplicationTaskStart):
+            states[f"replication_{message.task_id}"] = {
+                "state": "RUNNING",
+                "datetime": datetime.utcnow(),
+            }
 
-                if isinstance(message, ReplicationTaskError):
-                    self.middleware.call_sync("zettarepl.set_state", f"replication_{message.task_id}", {
-                        "state": "ERROR",
-                        "datetime": datetime.utcnow(),
-                        "error": make_sentence(message.error),
-                    })
+            # Start fake job if none are already running
+            if not self.replication_jobs_channels[message.task_id]:
+                self.middleware.call_sync("replication.run", int(message.task_id[5:]), False)
 
-                    for channel in self.replication_jobs_channels[message.task_id]:
-                        channel.put(message)
+        if isinstance(message, ReplicationTaskLog):
+            for channel in self.replication_jobs_channels[message.task_id]:
+                channel.put(message)
 
-            except Exception:
-                self.logger.warning("Unhandled exception in observer_queue_reader", exc_info=True)
+        if isinstance(message, ReplicationTaskSnapshotStart):
+            states[f"replication_{message.task_id}"] = {
+                "state": "RUNNING",
+                "datetime": datetime.utcnow(),
+                "progress": {
+                    "dataset": message.dataset,
+                    "snapshot": message.snapshot,
+                    "snapshots_sent": message.snapshots_sent,
+                    "snapshots_total": message.snapshots_total,
+                    "bytes_sent": 0,
+                    "bytes_total": 0,
+                    # legacy
+                    "current": 0,
+                    "total": 0,
+                }
+            }
+
+            for channel in self.replication_jobs_channels[message.task_id]:
+                channel.put(message)
+
+        if isinstance(message, ReplicationTaskSnapshotProgress):
+            states[f"replication_{message.task_id}"] = {
+                "state": "RUNNING",
+                "datetime": datetime.utcnow(),
+                "progress": {
+                    "dataset": message.dataset,
+                    "snapshot": message.snapshot,
+                    "snapshots_sent": message.snapshots_sent,
+                    "snapshots_total": message.snapshots_total,
+                    "bytes_sent": message.bytes_sent,
+                    "bytes_total": message.bytes_total,
+                    # legacy
+                    "current": message.bytes_sent,
+                    "total": message.bytes_total,
+                }
+            }
+
+            for channel in self.replication_jobs_channels[message.task_id]:
+                channel.put(message)
+
+        if isinstance(message, ReplicationTaskSnapshotSuccess):
+            last_snapshots[f"replication_{message.task_id}"] = f"{message.dataset}@{message.snapshot}"
+
+            for channel in self.replication_jobs_channels[message.task_id]:
+                channel.put(message)
+
+        if isinstance(message, ReplicationTaskDataProgress):
+            task_id = f"replication_{message.task_id}"
+            if task_id in states:
+                state = states[task_id]
+            else:
+                try:
+                    state = self.middleware.call_sync("zettarepl.get_internal_task_state", task_id)
+                except KeyError:
+                    state = None
+
+            if state is not None and state["state"] == "RUNNING" and "progress" in state:
+                states[task_id] = dict(state, progress=dict(
+                    state["progress"],
+                    root_dataset=message.dataset,
+                    src_size=message.src_size,
+                    dst_size=message.dst_size,
+                ))
+
+            for channel in self.replication_jobs_channels[message.task_id]:
+                channel.put(message)
+
+        if isinstance(message, ReplicationTaskSuccess):
+            states[f"replication_{message.task_id}"] = {
+                "state": "FINISHED",
+                "datetime": datetime.utcnow(),
+            }
+
+            for channel in self.replication_jobs_channels[message.task_id]:
+                channel.put(message)
+
+        if isinstance(message, ReplicationTaskError):
+            states[f"replication_{message.task_id}"] = {
+                "state": "ERROR",
+                "datetime": datetime.utcnow(),
+                "error": make_sentence(message.error),
+            }
+
+            for channel in self.replication_jobs_channels[message.task_id]:
+                channel.put(message)
+
+    def get_observer_queue_stats(self):
+        """
+        Returns count of observer messages received, batches processed and progress messages coalesced.
+        """
+        return dict(self.observer_queue_stats)
 
     async def terminate(self):
         await self.middleware.call("zettarepl.flush_state")
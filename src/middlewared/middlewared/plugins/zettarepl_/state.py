@@ -108,22 +108,39 @@ class ZettareplService(Service):
         return self.state[task_id]
 
     def set_state(self, task_id, state):
+        self._set_state(task_id, state)
+        self._notify_state_change(task_id)
+
+    def set_last_snapshot(self, task_id, last_snapshot):
+        self._set_last_snapshot(task_id, last_snapshot)
+        self._notify_state_change(task_id)
+
+    def set_states(self, states, last_snapshots):
+        """
+        Batch version of `set_state` and `set_last_snapshot`: each changed task is notified only once.
+        """
+        for task_id, state in states.items():
+            self._set_state(task_id, state)
+
+        for task_id, last_snapshot in last_snapshots.items():
+            self._set_last_snapshot(task_id, last_snapshot)
+
+        for task_id in set(states.keys()) | set(last_snapshots.keys()):
+            self._notify_state_change(task_id)
+
+    def _set_state(self, task_id, state):
         self.state[task_id] = state
 
         if task_id.startswith("replication_task_"):
             if state["state"] in ("ERROR", "FINISHED"):
                 self.serializable_state[int(task_id.split("_")[-1])]["state"] = state
 
-        self._notify_state_change(task_id)
-
-    def set_last_snapshot(self, task_id, last_snapshot):
+    def _set_last_snapshot(self, task_id, last_snapshot):
         self.last_snapshot[task_id] = last_snapshot
 
         if task_id.startswith("replication_task_"):
             self.serializable_state[int(task_id.split("_")[-1])]["last_snapshot"] = last_snapshot
 
-        self._notify_state_change(task_id)
-
     def _notify_state_change(self, task_id):
         state = self._get_task_state(task_id, self._get_state_context())
         self.middleware.call_hook_sync("zettarepl.state_change", id=task_id, fields=state)
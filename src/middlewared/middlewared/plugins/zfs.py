@@ -89,6 +89,29 @@ class ZFSPoolService(CRUDService):
                 pools = [i.__getstate__(**state_kwargs) for i in zfs.pools]
         return filter_list(pools, filters, options)
 
+    @accepts(Bool('topology', default=True))
+    def query_status(self, topology):
+        """
+        Returns status of all imported pools keyed by pool name.
+
+        If `topology` is false, vdev groups and scan status are not retrieved.
+        """
+        with libzfs.ZFS() as zfs:
+            if topology:
+                return {pool.name: pool.__getstate__(datasets_recursive=False) for pool in zfs.pools}
+
+            return {
+                pool.name: {
+                    'name': pool.name,
+                    'guid': str(pool.guid),
+                    'status': pool.status,
+                    'healthy': pool.healthy,
+                    'status_detail': pool.status_detail,
+                    'properties': {'autotrim': pool.properties['autotrim'].__getstate__()},
+                }
+                for pool in zfs.pools
+            }
+
     @accepts(
         Dict(
             'zfspool_create',
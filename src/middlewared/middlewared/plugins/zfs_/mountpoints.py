@@ -0,0 +1,231 @@
+import asyncio
+import os
+
+from middlewared.schema import accepts, Str
+from middlewared.service import Service
+
+# ZFS events after which datasets mountpoints (or encryption key statuses) might have changed
+INVALIDATING_EVENTS = (
+    'sysevent.fs.zfs.pool_create',
+    'sysevent.fs.zfs.pool_destroy',
+    'sysevent.fs.zfs.pool_export',
+    'sysevent.fs.zfs.pool_import',
+)
+INVALIDATING_HOOKS = (
+    'dataset.post_create',
+    'dataset.post_delete',
+    'dataset.post_lock',
+    'dataset.post_unlock',
+    'pool.post_create_or_update',
+    'pool.post_export',
+    'pool.post_import',
+    'pool.post_lock',
+    'pool.post_unlock',
+)
+
+
+def split_path(path):
+    return [component for component in os.path.normpath(path).split('/') if component]
+
+
+def flatten_datasets(datasets):
+    for dataset in datasets:
+        yield dataset
+        yield from flatten_datasets(dataset.get('children') or [])
+
+
+def is_locked(dataset, about_to_lock_dataset):
+    return dataset['encrypted'] and (
+        not dataset['key_loaded'] or (
+            about_to_lock_dataset is not None and
+            (dataset['id'] == about_to_lock_dataset or dataset['id'].startswith(f'{about_to_lock_dataset}/'))
+        )
+    )
+
+
+class MountpointTrieNode:
+    __slots__ = ('children', 'datasets')
+
+    def __init__(self):
+        self.children = {}
+        self.datasets = []
+
+
+class MountpointTrie:
+    """
+    Datasets indexed by their mountpoint path components so that datasets containing a path can be found in
+    O(path depth).
+    """
+
+    def __init__(self):
+        self.root = MountpointTrieNode()
+
+    def add(self, dataset):
+        node = self.root
+        for component in split_path(dataset['mountpoint']):
+            node = node.children.setdefault(component, MountpointTrieNode())
+
+        node.datasets.append(dataset)
+
+    def walk(self, path):
+        """
+        Yields `(mountpoint, node)` for all the nodes from the root to the deepest node that contains `path`.
+        """
+        node = self.root
+        mountpoint = '/'
+        yield mountpoint, node
+        for component in split_path(path):
+            node = node.children.get(component)
+            if node is None:
+                return
+
+            mountpoint = os.path.join(mountpoint, component)
+            yield mountpoint, node
+
+    def resolve(self, path):
+        """
+        Returns a dict with:
+        * `dataset`: the mounted dataset that contains `path` (or `None`)
+        * `mountpoint`: its mountpoint
+        * `datasets`: all datasets (including not mounted ones) whose mountpoint contains `path`
+        * `children`: whether there are any datasets under `path`
+        """
+        result = {
+            'dataset': None,
+            'mountpoint': None,
+            'datasets': [],
+            'children': False,
+        }
+        depth = len(split_path(path))
+        for i, (mountpoint, node) in enumerate(self.walk(path)):
+            for dataset in node.datasets:
+                if dataset['mounted']:
+                    result['dataset'] = dataset['id']
+                    result['mountpoint'] = mountpoint
+
+            result['datasets'].extend(node.datasets)
+
+            if i == depth:
+                result['children'] = bool(node.children)
+
+        return result
+
+
+class ZFSMountpointsService(Service):
+
+    class Config:
+        namespace = 'zfs.mountpoints'
+        private = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.trie = None
+        self.encrypted = None
+        self.generation = 0
+        self.lock = asyncio.Lock()
+
+    async def invalidate(self):
+        """
+        Discards mountpoints trie, it will be rebuilt on next lookup.
+        """
+        self.trie = None
+        self.encrypted = None
+        self.generation += 1
+
+    async def _get_trie(self):
+        if self.trie is not None:
+            return self.trie, self.encrypted
+
+        async with self.lock:
+            if self.trie is not None:
+                return self.trie, self.encrypted
+
+            generation = self.generation
+
+            trie = MountpointTrie()
+            encrypted = []
+            for dataset in flatten_datasets(await self.middleware.call('zfs.dataset.query', [], {
+                'extra': {
+                    'flat': False,
+                    'properties': ['mountpoint', 'mounted', 'encryption', 'keystatus'],
+                    'user_properties': False,
+                },
+            })):
+                entry = {
+                    'id': dataset['id'],
+                    'mountpoint': dataset['mountpoint'],
+                    'mounted': dataset['properties'].get('mounted', {}).get('value') == 'yes',
+                    'encrypted': dataset['encrypted'],
+                    'key_loaded': dataset['key_loaded'],
+                }
+                # Skip `legacy` and `none` mountpoints
+                if (entry['mountpoint'] or '').startswith('/'):
+                    trie.add(entry)
+                if entry['encrypted']:
+                    encrypted.append(entry)
+
+            # Something has changed while we were querying datasets, our result might be stale
+            if generation == self.generation:
+                self.trie = trie
+                self.encrypted = encrypted
+
+            return trie, encrypted
+
+    async def _about_to_lock_dataset(self):
+        try:
+            return await self.middleware.call('cache.get', 'about_to_lock_dataset')
+        except KeyError:
+            return None
+
+    @accepts(Str('path'))
+    async def resolve(self, path):
+        """
+        Returns the mounted dataset that owns `path` (`dataset` and its `mountpoint`), locked datasets that contain
+        `path` (`locked`) and whether there are any datasets under `path` (`children`).
+
+        `path` is not resolved on the filesystem, it should already be normalized.
+        """
+        trie, encrypted = await self._get_trie()
+        about_to_lock_dataset = await self._about_to_lock_dataset()
+
+        result = trie.resolve(path)
+        return {
+            'dataset': result['dataset'],
+            'mountpoint': result['mountpoint'],
+            'locked': [
+                dataset['id'] for dataset in result['datasets'] if is_locked(dataset, about_to_lock_dataset)
+            ],
+            'children': result['children'],
+        }
+
+    async def locked_datasets(self):
+        """
+        Same as `zfs.dataset.locked_datasets` but without querying ZFS.
+        """
+        trie, encrypted = await self._get_trie()
+        about_to_lock_dataset = await self._about_to_lock_dataset()
+
+        return [
+            {'id': dataset['id'], 'mountpoint': dataset['mountpoint']}
+            for dataset in encrypted
+            if is_locked(dataset, about_to_lock_dataset)
+        ]
+
+
+async def zfs_events(middleware, data):
+    if data['class'] in INVALIDATING_EVENTS or (
+        data['class'] == 'sysevent.fs.zfs.history_event' and
+        data.get('history_dsname') and '@' not in data['history_dsname']
+    ):
+        await middleware.call('zfs.mountpoints.invalidate')
+
+
+async def invalidate_hook(middleware, *args, **kwargs):
+    await middleware.call('zfs.mountpoints.invalidate')
+
+
+async def setup(middleware):
+    middleware.register_hook('zfs.pool.events', zfs_events, sync=False)
+    for hook in INVALIDATING_HOOKS:
+        middleware.register_hook(hook, invalidate_hook, sync=False)
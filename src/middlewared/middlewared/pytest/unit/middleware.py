@@ -24,7 +24,7 @@ class Middleware(dict):
         resolve_methods(self.__schemas, to_resolve)
         return await method(*args)
 
-    async def call(self, name, *args):
+    async def call(self, name, *args, trusted=False):
         result = self[name](*args)
         if asyncio.iscoroutine(result):
             result = await result
@@ -0,0 +1,20 @@
+from unittest.mock import Mock
+
+import pytest
+
+from middlewared.plugins.cache import CacheService
+
+
+def test__cache__unknown_namespace_lookups_do_not_create_it():
+    service = CacheService(Mock())
+
+    assert service.has_key.wraps(service, "key", "unknown") is False
+    with pytest.raises(KeyError):
+        service.get.wraps(service, "key", "unknown")
+    assert service.pop.wraps(service, "key", "unknown") is None
+    assert "unknown" not in service.stats.wraps(service)
+
+    service.put.wraps(service, "key", "value", 0, "unknown")
+
+    assert service.get.wraps(service, "key", "unknown") == "value"
+    assert "unknown" in service.stats.wraps(service)
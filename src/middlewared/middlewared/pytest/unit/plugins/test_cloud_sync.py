@@ -6,156 +6,10 @@ from unittest.mock import Mock
 import pytest
 
 from middlewared.plugins.cloud_sync import (
-    get_dataset_recursive, FsLockManager, lsjson_error_excerpt, RcloneVerboseLogCutter
+    FsLockManager, lsjson_error_excerpt, RcloneVerboseLogCutter, rclone_rcd_check_progress, rclone_rcd_compatible,
+    rclone_rcd_decrypt_names, rclone_rcd_format_stats,
 )
-
-
-def test__get_dataset_recursive_1():
-    dataset, recursive = get_dataset_recursive(
-        [
-            {
-                "mountpoint": "/mnt/data",
-                "children": [
-                    {
-                        "mountpoint": "/mnt/data/test",
-                        "children": []
-                    }
-                ]
-            },
-            {
-                "mountpoint": "/mnt/data/test",
-                "children": []
-            }
-        ],
-        "/mnt/data",
-    )
-
-    assert dataset["mountpoint"] == "/mnt/data"
-    assert recursive is True
-
-
-def test__get_dataset_recursive_2():
-    dataset, recursive = get_dataset_recursive(
-        [
-            {
-                "mountpoint": "/mnt/data",
-                "children": [
-                    {
-                        "mountpoint": "/mnt/data/test",
-                        "children": []
-                    }
-                ]
-            },
-            {
-                "mountpoint": "/mnt/data/test",
-                "children": []
-            }
-        ],
-        "/mnt/data/test",
-    )
-
-    assert dataset["mountpoint"] == "/mnt/data/test"
-    assert recursive is False
-
-
-def test__get_dataset_recursive_3():
-    dataset, recursive = get_dataset_recursive(
-        [
-            {
-                "mountpoint": "/mnt/data",
-                "children": [
-                    {
-                        "mountpoint": "/mnt/data/test",
-                        "children": []
-                    }
-                ]
-            },
-            {
-                "mountpoint": "/mnt/data/test",
-                "children": []
-            }
-        ],
-        "/mnt/data/test2",
-    )
-
-    assert dataset["mountpoint"] == "/mnt/data"
-    assert recursive is False
-
-
-def test__get_dataset_recursive_4():
-    dataset, recursive = get_dataset_recursive(
-        [
-            {
-                "mountpoint": "/mnt/data",
-                "children": [
-                    {
-                        "mountpoint": "/mnt/data/backup",
-                        "children": [
-                            {
-                                "mountpoint": "/mnt/data/backup/test0/test1/test2",
-                                "children": [],
-                            }
-                        ]
-                    }
-                ]
-            },
-            {
-                "mountpoint": "/mnt/data/backup",
-                "children": [
-                    {
-                        "mountpoint": "/mnt/data/backup/test0/test1/test2",
-                        "children": [],
-                    }
-                ]
-            },
-            {
-                "mountpoint": "/mnt/data/backup/test0/test1/test2",
-                "children": [],
-            }
-        ],
-        "/mnt/data/backup/test0",
-    )
-
-    assert dataset["mountpoint"] == "/mnt/data/backup"
-    assert recursive is True
-
-
-def test__get_dataset_recursive_5():
-    dataset, recursive = get_dataset_recursive(
-        [
-            {
-                "mountpoint": "/mnt/data",
-                "children": [
-                    {
-                        "mountpoint": "/mnt/data/backup",
-                        "children": [
-                            {
-                                "mountpoint": "/mnt/data/backup/test0/test1/test2",
-                                "children": [],
-                            }
-                        ]
-                    }
-                ]
-            },
-            {
-                "mountpoint": "/mnt/data/backup",
-                "children": [
-                    {
-                        "mountpoint": "/mnt/data/backup/test0/test1/test2",
-                        "children": [],
-                    }
-                ]
-            },
-            {
-                "mountpoint": "/mnt/data/backup/test0/test1/test2",
-                "children": [],
-            }
-        ],
-        "/mnt/data/backup/test0/test3",
-    )
-
-    assert dataset["mountpoint"] == "/mnt/data/backup"
-    assert recursive is False
+from middlewared.service_exception import CallError
 
 
 def test__fs_lock_manager_1():
@@ -255,3 +109,68 @@ def test__RcloneVerboseLogCutter(input, output):
         out += result
 
     assert out == output
+
+
+@pytest.mark.parametrize("stats,progress,description", [
+    ({}, 0, "0 bytes / 0 bytes, 0 bytes/s"),
+    ({"bytes": 500000, "totalBytes": 2000000, "speed": 100000, "eta": 15},
+     25, "500 KB / 2 MB, 100 KB/s, ETA 15 seconds"),
+    ({"bytes": 1000, "totalBytes": 1000, "speed": 0, "eta": None, "errors": 2},
+     100, "1 KB / 1 KB, 0 bytes/s, 2 errors"),
+])
+def test__rclone_rcd_format_stats(stats, progress, description):
+    assert rclone_rcd_format_stats(stats) == (progress, description)
+
+
+@pytest.mark.parametrize("args,bwlimit,result", [
+    ("", [], True),
+    ("--checksum", [], False),
+    ("", [{"time": "08:00", "bandwidth": 1024}], False),
+])
+def test__rclone_rcd_compatible(args, bwlimit, result):
+    assert rclone_rcd_compatible({"args": args, "bwlimit": bwlimit}) is result
+
+
+@pytest.mark.asyncio
+async def test__rclone_rcd_check_progress():
+    statuses = [
+        {"finished": False},
+        {"finished": True, "success": True, "error": ""},
+    ]
+    stats = [
+        {"bytes": 0, "totalBytes": 200, "transferring": [{"name": "a", "percentage": 0, "speed": 0}]},
+        {"bytes": 200, "totalBytes": 200},
+    ]
+
+    async def call(command, **params):
+        if command == "job/status":
+            assert params == {"jobid": 7}
+            return statuses.pop(0)
+        if command == "core/stats":
+            assert params == {"group": "job/7"}
+            return stats.pop(0)
+
+    rcd = Mock(call=call)
+    job = Mock(logs_fd=io.BytesIO())
+
+    status = await rclone_rcd_check_progress(job, rcd, 7, interval=0)
+
+    assert status["success"]
+    assert [c[0][0] for c in job.set_progress.call_args_list] == [0, 100]
+    assert b" * a: 0% (0 bytes/s)" in job.logs_fd.getvalue()
+
+
+@pytest.mark.asyncio
+async def test__rclone_rcd_decrypt_names():
+    async def call(endpoint, **params):
+        assert endpoint == "backend/command"
+        assert params["fs"] == "encrypted:"
+        if any(name.startswith("plain") for name in params["arg"]):
+            raise CallError("illegal base32 data")
+        return {"result": [name.upper() for name in params["arg"]]}
+
+    rcd = Mock(call=call)
+
+    assert await rclone_rcd_decrypt_names(rcd, "encrypted", ["a", "b"]) == {"a": "A", "b": "B"}
+    # One name that can't be decrypted does not prevent decrypting the others
+    assert await rclone_rcd_decrypt_names(rcd, "encrypted", ["a", "plain", "b"]) == {"a": "A", "b": "B"}
@@ -41,6 +41,7 @@ async def datastore_test():
 
                 m["datastore.execute"] = ds.execute
                 m["datastore.execute_write"] = ds.execute_write
+                m["datastore.execute_write_many"] = ds.execute_write_many
                 m["datastore.fetchall"] = ds.fetchall
 
                 m["datastore.query"] = ds.query
@@ -218,6 +219,40 @@ async def test__update_fk():
         )
 
 
+@pytest.mark.asyncio
+async def test__bulk():
+    async with datastore_test() as ds:
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (20, 2020)")
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (30, 3030)")
+
+        assert await ds.bulk("account.bsdgroups", [
+            {"type": "DELETE", "id": 20},
+            {"type": "UPDATE", "id": 30, "data": {"bsdgrp_gid": 3031}},
+            {"type": "INSERT", "data": {"bsdgrp_gid": 4040}},
+        ]) == [20, 30, 31]
+
+        assert await ds.query("account.bsdgroups") == [
+            {"id": 30, "bsdgrp_gid": 3031},
+            {"id": 31, "bsdgrp_gid": 4040},
+        ]
+        assert ds.middleware.call_hook_inline.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test__bulk_rollback():
+    async with datastore_test() as ds:
+        await ds.execute("INSERT INTO `account_bsdgroups` VALUES (20, 2020)")
+
+        with pytest.raises(RuntimeError):
+            await ds.bulk("account.bsdgroups", [
+                {"type": "UPDATE", "id": 20, "data": {"bsdgrp_gid": 2021}},
+                {"type": "UPDATE", "id": 30, "data": {"bsdgrp_gid": 3031}},
+            ])
+
+        assert await ds.query("account.bsdgroups") == [{"id": 20, "bsdgrp_gid": 2020}]
+        ds.middleware.call_hook_inline.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test__bad_fk_update():
     async with datastore_test() as ds:
@@ -0,0 +1,123 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from middlewared.utils import osc
+
+if not osc.IS_LINUX:
+    pytest.skip("Linux only", allow_module_level=True)
+
+from middlewared.plugins.device_.device_info_linux import DeviceService  # noqa
+from middlewared.pytest.unit.middleware import Middleware  # noqa
+
+
+class FakeDeviceNotFoundByNameError(Exception):
+    pass
+
+
+class FakeUdev:
+    """
+    Fake udev block devices tree
+    """
+
+    DeviceNotFoundByNameError = FakeDeviceNotFoundByNameError
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.list_devices_calls = 0
+        self.Devices = Mock(from_name=self.from_name)
+
+    def Context(self):
+        return Mock(list_devices=self.list_devices)
+
+    def list_devices(self, **kwargs):
+        self.list_devices_calls += 1
+        return [Mock(sys_name=name) for name in self.names]
+
+    def from_name(self, context, subsystem, name):
+        if name not in self.names:
+            raise FakeDeviceNotFoundByNameError(name)
+        return Mock(sys_name=name)
+
+
+@pytest.fixture
+def device_service():
+    udev = FakeUdev([f"sdfake{i}" for i in range(102)])
+    service = DeviceService(Middleware())
+    service.retrieve_disks_data = Mock(return_value={})
+    service.get_disk_details = Mock(side_effect=lambda block_device, disk, disks_data: dict(
+        disk, name=block_device.sys_name,
+    ))
+    with patch("middlewared.plugins.device_.device_info_linux.pyudev", udev):
+        yield udev, service
+
+
+def test__get_disks__inventory_is_built_once(device_service):
+    udev, service = device_service
+
+    disks = service.get_disks()
+    for i in range(100):
+        assert service.get_disks() == disks
+
+    assert len(disks) == 102
+    assert udev.list_devices_calls == 1
+    assert service.get_disk_details.call_count == 102
+    assert service.retrieve_disks_data.call_count == 1
+
+
+def test__get_disks__incremental_update(device_service):
+    udev, service = device_service
+
+    service.get_disks()
+    generation = service.get_disks_generation()
+
+    udev.names.append("sdfake200")
+    service.disk_changed("sdfake200", "add")
+    udev.names.remove("sdfake7")
+    service.disk_changed("sdfake7", "remove")
+    service.disk_changed("sdfake5", "change")
+
+    disks = service.get_disks()
+
+    assert "sdfake200" in disks
+    assert "sdfake7" not in disks
+    assert len(disks) == 102
+    assert udev.list_devices_calls == 1
+    # Only added and changed disks were re-read
+    assert service.get_disk_details.call_count == 104
+    assert service.get_disks_generation() > generation
+
+
+def test__get_disk__served_from_inventory(device_service):
+    udev, service = device_service
+
+    service.get_disks()
+    disk = service.get_disk("sdfake3")
+    disk["serial"] = "modified"
+
+    assert service.get_disk("sdfake3")["serial"] != "modified"
+    assert service.get_disk_details.call_count == 102
+
+
+def test__get_disks__changed_while_refreshing(device_service):
+    udev, service = device_service
+
+    service.get_disks()
+    service.disk_changed("sdfake5", "change")
+
+    retrieve_disk = service.retrieve_disk
+
+    def changed_again(name):
+        disk = retrieve_disk(name)
+        # udev event that arrives while the disk is being read
+        service.disk_changed(name, "change")
+        return disk
+
+    with patch.object(service, "retrieve_disk", changed_again):
+        service.refresh_dirty_disks()
+
+    # Newer event is not lost, the disk is read again on next access
+    assert "sdfake5" in service.disks_dirty
+    service.get_disks()
+    assert not service.disks_dirty
+    assert service.get_disk_details.call_count == 104
@@ -1,9 +1,13 @@
+from datetime import datetime, timedelta
 import textwrap
+import time
 
 from asynctest import CoroutineMock, Mock
 import pytest
 
 from middlewared.plugins.disk_.smart_attributes import DiskService as SmartAttributesDiskService
+from middlewared.plugins.disk_.smart_data import DiskService as SmartDataDiskService
+from middlewared.plugins.disk_.sync import DiskService as SyncDiskService
 from middlewared.plugins.disk_.temperature import get_temperature
 from middlewared.pytest.unit.middleware import Middleware
 
@@ -55,3 +59,129 @@ async def test__disk_service__sata_dom_lifetime_left():
     """))
 
     assert abs(await SmartAttributesDiskService(m).sata_dom_lifetime_left("ada1") - 0.8926) < 1e-4
+
+
+@pytest.mark.asyncio
+async def test__disk_service__smart_data__cached():
+    m = Middleware()
+    m["disk.smartctl"] = Mock(return_value="Current Drive Temperature:     31 C")
+
+    service = SmartDataDiskService(m)
+    for i in range(10):
+        assert (await service.smart_data("sda", "STANDBY", None))["temperature"] == 31
+
+    m["disk.smartctl"].assert_called_once_with("sda", ["-a", "-n", "standby"], {"silent": True})
+
+
+@pytest.mark.asyncio
+async def test__disk_service__smart_data__standby():
+    m = Middleware()
+    m["disk.smartctl"] = Mock(return_value="Current Drive Temperature:     31 C")
+
+    service = SmartDataDiskService(m)
+    assert (await service.smart_data("sda", "STANDBY", 0))["available"]
+
+    # Disk went to standby, smartctl -n standby does not wake it up
+    m["disk.smartctl"].return_value = None
+    data = await service.smart_data("sda", "STANDBY", 0)
+    assert not data["available"]
+    assert data["temperature"] == 31
+
+    # Previous attempt is not reused if caller is willing to wake the disk up
+    m["disk.smartctl"].return_value = "Current Drive Temperature:     32 C"
+    assert (await service.smart_data("sda", "NEVER", None))["temperature"] == 32
+
+
+@pytest.mark.asyncio
+async def test__disk_service__smart_data_expire():
+    m = Middleware()
+    m["disk.smartctl"] = Mock(return_value="Current Drive Temperature:     31 C")
+
+    service = SmartDataDiskService(m)
+    await service.smart_data("sda", "STANDBY", None)
+    await service.smart_data("sdb", "STANDBY", None)
+    # State is not shared between instances
+    assert SmartDataDiskService(m).smart_data_cache == {}
+
+    # Removed disk
+    await service.smart_data_expire("sda")
+    assert set(service.smart_data_cache) == set(service.smart_data_locks) == {"sdb"}
+
+    await service.smart_data_expire()
+    assert service.smart_data_cache == service.smart_data_locks == {}
+
+
+def sys_disk(i):
+    return {
+        "name": f"sd{i}", "ident": f"SERIAL{i}", "lunid": None, "serial": f"SERIAL{i}", "rotationrate": 7200,
+        "type": "HDD", "size": 4000787030016, "subsystem": "scsi", "number": i, "model": "MODEL",
+    }
+
+
+def db_disk(i, **kwargs):
+    return dict({
+        "disk_identifier": f"{{serial}}SERIAL{i}", "disk_name": f"sd{i}", "disk_subsystem": "scsi", "disk_number": i,
+        "disk_serial": f"SERIAL{i}", "disk_size": "4000787030016", "disk_expiretime": None, "disk_kmip_uid": None,
+        "disk_model": "MODEL", "disk_rotationrate": 7200, "disk_type": "HDD",
+    }, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test__disk_service__sync_all__bulk():
+    expired = datetime.utcnow() - timedelta(days=1)
+
+    m = Middleware()
+    m["failover.licensed"] = Mock(return_value=False)
+    # 450 existing disks, 50 new disks
+    m["device.get_disks"] = Mock(return_value={f"sd{i}": sys_disk(i) for i in range(500)})
+    m["disk.device_to_identifier"] = Mock(side_effect=lambda name, disks: f"{{serial}}{disks[name]['serial']}")
+    m["datastore.query"] = Mock(return_value=(
+        # 440 unchanged disks
+        [db_disk(i) for i in range(440)] +
+        # 10 renamed disks
+        [db_disk(i, disk_name=f"sdx{i}") for i in range(440, 450)] +
+        # 20 missing disks to expire and 30 missing disks to delete
+        [db_disk(i) for i in range(1000, 1020)] +
+        [db_disk(i, disk_expiretime=expired) for i in range(2000, 2030)]
+    ))
+    m["iscsi.extent.query"] = Mock(return_value=[])
+    m["datastore.bulk"] = Mock()
+    m["enclosure.sync_disks"] = Mock()
+    m["disk.restart_services_after_sync"] = Mock()
+
+    start = time.monotonic()
+    assert await SyncDiskService(m).sync_all(Mock()) == "OK"
+    assert time.monotonic() - start < 5
+
+    m["device.get_disks"].assert_called_once_with()
+    m["datastore.query"].assert_called_once()
+    m["enclosure.sync_disks"].assert_called_once()
+    assert len(m["enclosure.sync_disks"].call_args[0][0]) == 500
+    m["disk.restart_services_after_sync"].assert_called_once_with()
+
+    m["datastore.bulk"].assert_called_once()
+    operations = m["datastore.bulk"].call_args[0][1]
+    assert len([op for op in operations if op["type"] == "DELETE"]) == 30
+    assert len([op for op in operations if op["type"] == "INSERT"]) == 50
+    updates = [op for op in operations if op["type"] == "UPDATE"]
+    assert len(updates) == 30
+    assert sorted(op["data"]["disk_name"] for op in updates if op["data"]["disk_expiretime"] is None) == [
+        f"sd{i}" for i in range(440, 450)
+    ]
+
+
+@pytest.mark.asyncio
+async def test__disk_service__sync_all__nothing_changed():
+    m = Middleware()
+    m["failover.licensed"] = Mock(return_value=False)
+    m["device.get_disks"] = Mock(return_value={f"sd{i}": sys_disk(i) for i in range(10)})
+    m["disk.device_to_identifier"] = Mock(side_effect=lambda name, disks: f"{{serial}}{disks[name]['serial']}")
+    m["datastore.query"] = Mock(return_value=[db_disk(i) for i in range(10)])
+    m["datastore.bulk"] = Mock()
+    m["enclosure.sync_disks"] = Mock()
+    m["disk.restart_services_after_sync"] = Mock()
+
+    await SyncDiskService(m).sync_all(Mock())
+
+    m["datastore.bulk"].assert_not_called()
+    m["disk.restart_services_after_sync"].assert_not_called()
@@ -0,0 +1,222 @@
+import errno
+import os
+from unittest.mock import Mock, patch
+
+import pytest
+
+from middlewared.plugins.filesystem import FilesystemService
+from middlewared.plugins.filesystem_.mounts import MountTable, MountTableCache, parse_mounts
+from middlewared.plugins.filesystem_.tail import TailBrokers, TailSubscriber
+from middlewared.plugins.filesystem_.utils import (
+    ACL_GROUP, ACL_GROUP_OBJ, ACL_MASK, ACL_OTHER, ACL_UNDEFINED_ID, ACL_USER_OBJ, posix_acl_decode, posix_acl_encode,
+    posix_acl_is_trivial,
+)
+
+ENTRIES = 100000
+MOUNTS = """\
+boot-pool/ROOT/default / zfs rw,relatime,xattr,noacl 0 0
+tmpfs /tmp tmpfs rw,nosuid,nodev 0 0
+tank /mnt/tank zfs rw,xattr,posixacl 0 0
+tank/with\\040space /mnt/tank/with\\040space zfs rw,xattr,posixacl 0 0
+tank/data /mnt/tank/data zfs rw,xattr,posixacl 0 0
+tank/data2 /mnt/tank/data zfs rw,xattr,posixacl 0 0
+"""
+TRIVIAL_ACL = [
+    (ACL_USER_OBJ, 7, ACL_UNDEFINED_ID), (ACL_GROUP_OBJ, 5, ACL_UNDEFINED_ID), (ACL_OTHER, 5, ACL_UNDEFINED_ID),
+]
+EXTENDED_ACL = TRIVIAL_ACL + [(ACL_GROUP, 7, 1000), (ACL_MASK, 7, ACL_UNDEFINED_ID)]
+
+
+def test__posix_acl_encode_decode():
+    assert posix_acl_decode(posix_acl_encode(EXTENDED_ACL)) == EXTENDED_ACL
+
+
+@pytest.mark.parametrize("access,default,trivial", [
+    (None, None, True),
+    (TRIVIAL_ACL, None, True),
+    (EXTENDED_ACL, None, False),
+    (None, EXTENDED_ACL, False),
+])
+def test__posix_acl_is_trivial(access, default, trivial):
+    def getxattr(path, name):
+        value = {"system.posix_acl_access": access, "system.posix_acl_default": default}[name]
+        if value is None:
+            raise OSError(errno.ENODATA, os.strerror(errno.ENODATA))
+        return posix_acl_encode(value)
+
+    with patch("middlewared.plugins.filesystem_.utils.os.getxattr", getxattr):
+        assert posix_acl_is_trivial("/mnt/tank/file") == trivial
+
+
+@pytest.fixture(scope="module")
+def large_directory(tmp_path_factory):
+    path = tmp_path_factory.mktemp("listdir")
+    for i in range(ENTRIES):
+        with open(path / f"file_{i:06d}", "w"):
+            pass
+
+    (path / "dir").mkdir()
+    return str(path)
+
+
+@pytest.fixture
+def filesystem_service():
+    service = FilesystemService(Mock())
+    service._acl_is_trivial = Mock(return_value=True)
+    return service
+
+
+def test__listdir__page(large_directory, filesystem_service):
+    result = filesystem_service.listdir.wraps(filesystem_service, large_directory, [["type", "=", "FILE"]], {
+        "order_by": ["-name"],
+        "offset": 10,
+        "limit": 20,
+    })
+
+    assert [entry["name"] for entry in result] == [f"file_{i:06d}" for i in range(ENTRIES - 11, ENTRIES - 31, -1)]
+    assert result[0]["acl"] is False
+    assert result[0]["size"] == 0
+    # Only the entries of the requested page are stat'ed and checked for ACL
+    assert filesystem_service._acl_is_trivial.call_count == 20
+
+
+def test__listdir__name_filter(large_directory, filesystem_service):
+    result = filesystem_service.listdir.wraps(filesystem_service, large_directory, [["name", "^", "file_09999"]], {})
+
+    assert sorted(entry["name"] for entry in result) == [f"file_{i:06d}" for i in range(99990, 100000)]
+    assert filesystem_service._acl_is_trivial.call_count == 10
+
+
+def test__listdir__count(large_directory, filesystem_service):
+    assert filesystem_service.listdir.wraps(filesystem_service, large_directory, [], {"count": True}) == ENTRIES + 1
+    assert not filesystem_service._acl_is_trivial.called
+
+
+def test__listdir__skip_acl(large_directory, filesystem_service):
+    result = filesystem_service.listdir.wraps(filesystem_service, large_directory, [["type", "=", "DIRECTORY"]], {
+        "extra": {"retrieve_acl": False},
+    })
+
+    assert [(entry["name"], entry["acl"]) for entry in result] == [("dir", None)]
+    assert not filesystem_service._acl_is_trivial.called
+
+
+def test__listdir__order_by_stat_field(large_directory, filesystem_service):
+    result = filesystem_service.listdir.wraps(filesystem_service, large_directory, [["size", "=", 0]], {
+        "order_by": ["name"],
+        "limit": 1,
+    })
+
+    assert [entry["name"] for entry in result] == ["file_000000"]
+
+
+@pytest.fixture
+def small_directory(tmp_path):
+    (tmp_path / "a").write_text("")
+    (tmp_path / "b").write_text("")
+    (tmp_path / "c").write_text("data")
+    (tmp_path / "d").write_text("data")
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("filters,names", [
+    # `OR` mixing scandir and stat attributes
+    ([["OR", [["size", "=", 0], ["name", "=", "c"]]]], ["a", "b", "c"]),
+    ([["OR", [["size", "=", 0], ["name", "=", "c"], ["name", "=", "d"]]]], ["a", "b", "c", "d"]),
+    ([["OR", [["name", "=", "a"], ["name", "=", "c"]]]], ["a", "c"]),
+    ([["type", "=", "FILE"], ["OR", [["size", "!=", 0], ["name", "=", "a"]]]], ["a", "c", "d"]),
+])
+def test__listdir__or_filters(small_directory, filesystem_service, filters, names):
+    result = filesystem_service.listdir.wraps(filesystem_service, small_directory, filters, {"order_by": ["name"]})
+
+    assert [entry["name"] for entry in result] == names
+
+
+def test__parse_mounts():
+    mounts = parse_mounts(MOUNTS)
+
+    assert mounts[3] == {
+        "source": "tank/with space",
+        "mountpoint": "/mnt/tank/with space",
+        "fstype": "zfs",
+        "options": ["rw", "xattr", "posixacl"],
+    }
+
+
+@pytest.mark.parametrize("path,source", [
+    ("/", "boot-pool/ROOT/default"),
+    ("/root/.ssh", "boot-pool/ROOT/default"),
+    ("/mnt/tank", "tank"),
+    ("/mnt/tank/datafile", "tank"),
+    ("/mnt/tank/with space/file", "tank/with space"),
+    # The last mount on the same mountpoint hides the previous ones
+    ("/mnt/tank/data/a/b/c", "tank/data2"),
+])
+def test__mount_table__lookup(path, source):
+    assert MountTable(parse_mounts(MOUNTS)).lookup(path)["source"] == source
+
+
+def test__mount_table_cache(tmp_path):
+    (tmp_path / "mounts").write_text(MOUNTS)
+    cache = MountTableCache(str(tmp_path / "mounts"))
+
+    table = cache.get()
+    assert cache.get() is table
+
+    cache.invalidate()
+    assert cache.get() is not table
+
+
+def test__tail_brokers__shared(tmp_path):
+    path = tmp_path / "log"
+    path.write_text("1\n2\n3\n4\n")
+    brokers = TailBrokers(interval=3600)
+
+    broker1, subscriber1 = brokers.subscribe(str(path), 2)
+    broker2, subscriber2 = brokers.subscribe(str(path), 1)
+    assert broker1 is broker2
+    assert subscriber1.get(0) == "3\n4\n"
+    assert subscriber2.get(0) == "4\n"
+
+    # Rapid appends are read once and sent to all the subscribers as one chunk
+    with open(path, "a") as f:
+        for i in range(5, 100):
+            f.write(f"{i}\n")
+            f.flush()
+    broker1.poll()
+    assert subscriber1.get(0) == subscriber2.get(0) == "".join(f"{i}\n" for i in range(5, 100))
+
+    brokers.unsubscribe(broker1, subscriber1)
+    assert brokers.brokers
+    brokers.unsubscribe(broker2, subscriber2)
+    assert not brokers.brokers
+    assert broker1.file is None
+
+
+def test__tail_brokers__rotation(tmp_path):
+    path = tmp_path / "log"
+    path.write_text("old\n")
+    brokers = TailBrokers(interval=3600)
+    broker, subscriber = brokers.subscribe(str(path), 0)
+
+    with open(path, "a") as f:
+        f.write("old tail\n")
+    os.rename(path, tmp_path / "log.1")
+    path.write_text("new\n")
+    broker.poll()
+    assert subscriber.get(0) == "old tail\nnew\n"
+
+    path.write_text("t\n")
+    broker.poll()
+    assert subscriber.get(0) == "t\n"
+
+    brokers.unsubscribe(broker, subscriber)
+
+
+def test__tail_subscriber__bounded():
+    subscriber = TailSubscriber(10)
+    subscriber.put("0123456789")
+    subscriber.put("abcde")
+
+    assert subscriber.get(0) == "56789abcde"
+    assert subscriber.dropped == 5
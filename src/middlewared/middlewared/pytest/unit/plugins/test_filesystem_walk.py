@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from middlewared.plugins.filesystem_.utils import (
+    ACL_GROUP, ACL_GROUP_OBJ, ACL_MASK, ACL_OTHER, ACL_UNDEFINED_ID, ACL_USER, ACL_USER_OBJ, POSIX_ACL_XATTR_ACCESS,
+    POSIX_ACL_XATTR_DEFAULT, posix_acl_get, posix_acl_merge,
+)
+from middlewared.plugins.filesystem_.walk import PermissionsWalkAborted, PermissionsWalker
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for d in range(5):
+        (tmp_path / f"dir{d}" / "sub").mkdir(parents=True)
+        for f in range(10):
+            (tmp_path / f"dir{d}" / "sub" / f"file{f}").write_text("")
+    os.symlink("/", tmp_path / "link")
+    return tmp_path
+
+
+def test__posix_acl_merge__mask():
+    acl = [(ACL_USER_OBJ, 7, ACL_UNDEFINED_ID), (ACL_GROUP_OBJ, 5, ACL_UNDEFINED_ID), (ACL_OTHER, 0, ACL_UNDEFINED_ID)]
+
+    assert posix_acl_merge(acl, [(ACL_GROUP, 6, 1001), (ACL_USER, 4, 1000)]) == [
+        (ACL_USER_OBJ, 7, ACL_UNDEFINED_ID),
+        (ACL_USER, 4, 1000),
+        (ACL_GROUP_OBJ, 5, ACL_UNDEFINED_ID),
+        (ACL_GROUP, 6, 1001),
+        (ACL_MASK, 7, ACL_UNDEFINED_ID),
+        (ACL_OTHER, 0, ACL_UNDEFINED_ID),
+    ]
+    assert posix_acl_merge(acl, [(ACL_OTHER, 5, ACL_UNDEFINED_ID)])[-1] == (ACL_OTHER, 5, ACL_UNDEFINED_ID)
+
+
+def test__walk__mode_and_owner(tree):
+    walker = PermissionsWalker(uid=1000, gid=1001, mode=0o750, workers=4)
+    walker.walk(str(tree))
+
+    assert walker.errors == []
+    assert walker.done == 1 + 5 + 1 + 5 + 5 * 10
+    for path in [tree, tree / "dir3", tree / "dir3" / "sub" / "file7"]:
+        st = os.stat(path)
+        assert (st.st_uid, st.st_gid, st.st_mode & 0o7777) == (1000, 1001, 0o750)
+    # Symlinks are not followed
+    assert os.stat("/").st_uid == 0
+    assert os.lstat(tree / "link").st_uid == 1000
+
+
+def test__walk__acl(tree):
+    walker = PermissionsWalker(
+        strip_acl=True,
+        access_acl=[(ACL_GROUP, 7, 1001)],
+        default_acl=[(ACL_USER, 5, 1000)],
+    )
+    try:
+        walker.apply(str(tree / "dir0"))
+        walker.apply(str(tree / "dir0" / "sub" / "file0"))
+    except OSError:
+        pytest.skip("POSIX1e ACLs are not supported")
+
+    if walker.errors:
+        pytest.skip(f"POSIX1e ACLs are not supported: {walker.errors}")
+
+    assert (ACL_GROUP, 7, 1001) in posix_acl_get(str(tree / "dir0"), POSIX_ACL_XATTR_ACCESS)
+    assert (ACL_USER, 5, 1000) in posix_acl_get(str(tree / "dir0"), POSIX_ACL_XATTR_DEFAULT)
+    # Default ACL is only set on directories
+    assert (ACL_GROUP, 7, 1001) in posix_acl_get(str(tree / "dir0" / "sub" / "file0"), POSIX_ACL_XATTR_ACCESS)
+    assert posix_acl_get(str(tree / "dir0" / "sub" / "file0"), POSIX_ACL_XATTR_DEFAULT) is None
+
+    walker = PermissionsWalker(strip_acl=True)
+    walker.walk(str(tree))
+
+    assert posix_acl_get(str(tree / "dir0"), POSIX_ACL_XATTR_ACCESS) is None
+    assert posix_acl_get(str(tree / "dir0"), POSIX_ACL_XATTR_DEFAULT) is None
+
+
+def test__walk__abort(tree):
+    progress = []
+    walker = PermissionsWalker(mode=0o700)
+
+    with pytest.raises(PermissionsWalkAborted):
+        walker.walk(str(tree), progress=lambda done, total: progress.append((done, total)), is_aborted=lambda: True)
@@ -0,0 +1,171 @@
+from asynctest import CoroutineMock, Mock
+import pytest
+
+from middlewared.plugins.iscsi import iSCSITargetExtentService
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.service_exception import ValidationErrors
+
+
+def extent(name, disk, **kwargs):
+    return dict({
+        "name": name,
+        "type": "DISK",
+        "disk": disk,
+        "serial": None,
+        "path": None,
+        "filesize": 0,
+        "blocksize": 512,
+        "pblocksize": False,
+        "avail_threshold": None,
+        "comment": "",
+        "insecure_tpc": True,
+        "xen": False,
+        "rpm": "SSD",
+        "ro": False,
+        "enabled": True,
+    }, **kwargs)
+
+
+@pytest.fixture
+def extent_service():
+    m = Middleware()
+    m.event_register = Mock()
+    m["datastore.query"] = Mock(return_value=[{"id": 1, "name": "existing"}])
+    m["datastore.bulk"] = Mock(side_effect=lambda name, operations, options: list(range(2, len(operations) + 2)))
+    m["interface.query"] = Mock(return_value=[{"state": {"link_address": "00:11:22:33:44:55"}}])
+    m["zfs.dataset.query"] = Mock(return_value=[{"id": f"tank/vol{i}"} for i in range(500)])
+
+    service = iSCSITargetExtentService(m)
+    service.query = CoroutineMock(return_value=[])
+    service._service_change = CoroutineMock()
+    return m, service
+
+
+@pytest.mark.asyncio
+async def test__bulk_create__500_extents(extent_service):
+    m, service = extent_service
+
+    await service.bulk_create.wraps(service, [extent(f"extent{i}", f"zvol/tank/vol{i}") for i in range(500)])
+
+    # Everything that `iscsi.extent.create` would query or do for every extent is done only once
+    assert m["zfs.dataset.query"].call_count == 1
+    assert m["interface.query"].call_count == 1
+    assert m["datastore.query"].call_count == 2
+    service._service_change.assert_called_once_with("iscsitarget", "reload")
+
+    m["datastore.bulk"].assert_called_once()
+    operations = m["datastore.bulk"].call_args[0][1]
+    assert len(operations) == 500
+    assert all(operation["type"] == "INSERT" for operation in operations)
+    assert operations[0]["data"]["path"] == "zvol/tank/vol0"
+    assert len({operation["data"]["serial"] for operation in operations}) == 500
+
+
+@pytest.mark.asyncio
+async def test__bulk_create__validates_all_extents(extent_service):
+    m, service = extent_service
+
+    with pytest.raises(ValidationErrors) as ve:
+        await service.bulk_create.wraps(service, [
+            extent("new", "zvol/tank/vol1"),
+            extent("new", "zvol/tank/vol2"),
+            extent("existing", "zvol/tank/vol3"),
+            extent("missing", "zvol/tank/missing"),
+        ])
+
+    assert [e.attribute for e in ve.value.errors] == [
+        "iscsi_extent_bulk_create.1.name",
+        "iscsi_extent_bulk_create.2.name",
+        "iscsi_extent_bulk_create.3.disk",
+    ]
+    assert not m["datastore.bulk"].called
+    assert not service._service_change.called
+
+
+def existing_extent(id, name, disk, **kwargs):
+    return extent(name, disk, id=id, path=disk, serial=f"serial{id}", naa=f"0x{id}", locked=False, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test__bulk_update(extent_service):
+    m, service = extent_service
+    service.query.return_value = [
+        existing_extent(1, "existing", "zvol/tank/vol1"),
+        existing_extent(2, "other", "zvol/tank/vol2"),
+    ]
+
+    await service.bulk_update.wraps(service, [{"id": 1, "comment": "Updated"}, {"id": 2, "name": "renamed"}])
+
+    assert m["datastore.query"].call_count == 1
+    assert m["zfs.dataset.query"].call_count == 1
+    service._service_change.assert_called_once_with("iscsitarget", "reload")
+
+    m["datastore.bulk"].assert_called_once()
+    operations = m["datastore.bulk"].call_args[0][1]
+    assert [(operation["type"], operation["id"]) for operation in operations] == [("UPDATE", 1), ("UPDATE", 2)]
+    assert operations[0]["data"]["comment"] == "Updated"
+    assert operations[1]["data"]["name"] == "renamed"
+    assert all("locked" not in operation["data"] for operation in operations)
+
+
+@pytest.mark.asyncio
+async def test__bulk_update__validates_all_extents(extent_service):
+    m, service = extent_service
+    service.query.return_value = [
+        existing_extent(1, "existing", "zvol/tank/vol1"),
+        existing_extent(2, "other", "zvol/tank/vol2"),
+    ]
+
+    with pytest.raises(ValidationErrors) as ve:
+        await service.bulk_update.wraps(service, [
+            {"id": 1, "name": "other"},
+            {"id": 2, "disk": "zvol/tank/missing"},
+            {"id": 3},
+        ])
+
+    assert [e.attribute for e in ve.value.errors] == [
+        "iscsi_extent_bulk_update.1.name",
+        "iscsi_extent_bulk_update.1.disk",
+        "iscsi_extent_bulk_update.2.id",
+    ]
+    assert not m["datastore.bulk"].called
+    assert not service._service_change.called
+
+
+@pytest.mark.asyncio
+async def test__bulk_delete(extent_service):
+    m, service = extent_service
+    service.query.return_value = [
+        existing_extent(1, "existing", "zvol/tank/vol1"),
+        existing_extent(2, "other", "zvol/tank/vol2"),
+    ]
+    m["iscsi.targetextent.query"] = Mock(return_value=[{"id": 10, "target": 1, "extent": 1}])
+    m["iscsi.target.active_sessions_for_targets"] = Mock(return_value=[])
+
+    await service.bulk_delete.wraps(service, [1, 2], False, False)
+
+    assert m["datastore.bulk"].call_args_list[0][0][:2] == (
+        "services.iscsitargettoextent", [{"type": "DELETE", "id": 10}],
+    )
+    assert m["datastore.bulk"].call_args_list[1][0][:2] == (
+        "services.iscsitargetextent", [{"type": "DELETE", "id": 1}, {"type": "DELETE", "id": 2}],
+    )
+    service._service_change.assert_called_once_with("iscsitarget", "reload")
+
+
+@pytest.mark.asyncio
+async def test__bulk_delete__validates_all_extents(extent_service):
+    m, service = extent_service
+    service.query.return_value = [existing_extent(1, "existing", "zvol/tank/vol1")]
+    m["iscsi.targetextent.query"] = Mock(return_value=[])
+
+    with pytest.raises(ValidationErrors) as ve:
+        await service.bulk_delete.wraps(service, [1, 2, 3], False, False)
+
+    assert [e.attribute for e in ve.value.errors] == [
+        "iscsi_extent_bulk_delete.1",
+        "iscsi_extent_bulk_delete.2",
+    ]
+    assert not m["iscsi.targetextent.query"].called
+    assert not m["datastore.bulk"].called
+    assert not service._service_change.called
@@ -1,4 +1,6 @@
+from asynctest import CoroutineMock
 from mock import ANY, Mock, patch
+import pytest
 
 from middlewared.plugins.nfs import SharingNFSService
 
@@ -147,3 +149,17 @@ def test__sharing_nfs_service__validate_hosts_and_networks__fs_is_already_export
         )
 
         verrors.add.assert_called_once_with("sharingnfs_update.networks", ANY)
+
+
+@pytest.mark.asyncio
+async def test__sharing_nfs_service__sharing_task_extend__locked():
+    middleware = Mock()
+    middleware.call = CoroutineMock(side_effect=lambda method, data, *args: data)
+
+    service = SharingNFSService(middleware)
+    context = {"locked_datasets": [{"id": "tank/secret", "mountpoint": "/mnt/tank/secret"}], "service_extend": {}}
+
+    assert (await service.sharing_task_extend({"paths": ["/mnt/tank/a", "/mnt/tank/secret/b"]}, context))["locked"]
+    assert not (await service.sharing_task_extend({"paths": ["/mnt/tank/a", "/mnt/tank/secrets"]}, context))["locked"]
+    # Only `datastore_extend` is called, locked state is determined from the context
+    assert [c[0][0] for c in middleware.call.call_args_list] == ["sharing.nfs.extend", "sharing.nfs.extend"]
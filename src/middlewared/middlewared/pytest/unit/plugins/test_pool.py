@@ -1,8 +1,10 @@
 import textwrap
+from unittest.mock import Mock
 
 import pytest
 
-from middlewared.plugins.pool import parse_lsof
+from middlewared.plugins.pool import parse_lsof, PoolService
+from middlewared.pytest.unit.middleware import Middleware
 
 
 @pytest.mark.parametrize("lsof,dirs,result", [
@@ -41,3 +43,50 @@ from middlewared.plugins.pool import parse_lsof
 ])
 def test__parse_lsof(lsof, dirs, result):
     assert parse_lsof(lsof, dirs) == result
+
+
+@pytest.mark.parametrize("select,topology", [
+    ([], True),
+    (["name", "status"], False),
+    (["name", "topology"], True),
+    (["scan"], True),
+])
+@pytest.mark.asyncio
+async def test__pool_service__get_options__topology(select, topology):
+    m = Middleware()
+    m.event_register = Mock()
+    m["zfs.pool.query_status"] = Mock(return_value={})
+
+    ps = PoolService(m)
+    options = await ps.get_options({"select": select, "extra": {}})
+    await ps.pool_extend_context(options["extra"])
+
+    m["zfs.pool.query_status"].assert_called_once_with(topology)
+
+
+@pytest.mark.asyncio
+async def test__pool_service__pool_extend__lightweight():
+    m = Middleware()
+    m.event_register = Mock()
+    m["zfs.pool.query_status"] = Mock(return_value={
+        "tank": {
+            "status": "ONLINE",
+            "healthy": True,
+            "status_detail": None,
+            "properties": {"autotrim": {"value": "off"}},
+        },
+    })
+
+    ps = PoolService(m)
+    ps.transform_topology = Mock()
+    context = await ps.pool_extend_context({"pool_topology": False})
+
+    tank = ps.pool_extend({"id": 1, "name": "tank", "encrypt": 0}, context)
+    backup = ps.pool_extend({"id": 2, "name": "backup", "encrypt": 0}, context)
+
+    assert tank["status"] == "ONLINE"
+    assert tank["path"] == "/mnt/tank"
+    assert "topology" not in tank
+    assert backup["status"] == "OFFLINE"
+    ps.transform_topology.assert_not_called()
+    m["zfs.pool.query_status"].assert_called_once_with(False)
@@ -0,0 +1,75 @@
+import re
+import socket
+import threading
+
+import pytest
+
+from middlewared.plugins.reporting.graphite import (
+    GraphiteHandler, GraphiteNameFilter, GraphiteQueue, parse_graphite_lines,
+)
+
+NAMES = ["cpu-0.cpu-user", "cpu-1.cpu-idle", "disk-sda.disk_octets.read", "interface-eth0.if_octets.rx", "load.load"]
+
+
+def test__parse_graphite_lines():
+    assert parse_graphite_lines(
+        b"nas.cpu-0.cpu-user.value 1.5 1600000000\r\n"
+        b"garbage\r\n"
+        b"nas.load.load.shortterm 0.25 1600000001\r\n"
+    ) == [
+        ("cpu-0.cpu-user", "1.5", 1600000000),
+        ("load.load.shortterm", "0.25", 1600000001),
+    ]
+
+
+@pytest.mark.parametrize("mode,patterns", [
+    ("include", ["cpu-.*", "disk-.*"]),
+    ("exclude", ["cpu-.*", "disk-.*"]),
+    ("include", ["cpu-[01]\\.cpu-idle", "load"]),
+    ("exclude", ["interface-eth.*", ".*octets.*"]),
+])
+def test__graphite_name_filter(mode, patterns):
+    accept = GraphiteNameFilter(mode, patterns)
+    for name in NAMES * 2:
+        matches = any(re.match(pattern, name) for pattern in patterns)
+        assert accept(name) == (matches if mode == "include" else not matches)
+
+
+def test__graphite_queue__drops_oldest():
+    queue = GraphiteQueue(2)
+    for i in range(5):
+        queue.put([i])
+
+    assert queue.get(0) == [[3], [4]]
+    assert queue.dropped == 3
+    assert queue.get(0) == []
+
+
+def test__graphite_handler():
+    lines = b"".join(f"nas.cpu-{i % 8}.cpu-user.value {i} {1600000000 + i}\r\n".encode() for i in range(100000))
+    queue = GraphiteQueue(100000)
+
+    class Handler(GraphiteHandler):
+        queues = [queue]
+        stats = {"received_bytes": 0, "received_metrics": 0, "batches": 0}
+
+    server, client = socket.socketpair()
+
+    def send():
+        # Split in the middle of the lines
+        for i in range(0, len(lines), 1428):
+            client.sendall(lines[i:i + 1428])
+        client.close()
+
+    thread = threading.Thread(target=send)
+    thread.start()
+    Handler(server, None, None)
+    thread.join()
+    server.close()
+
+    items = [item for batch in queue.get(0) for item in batch]
+    assert len(items) == 100000
+    assert items[-1] == ("cpu-7.cpu-user", "99999", 1600099999)
+    assert Handler.stats["received_metrics"] == 100000
+    assert Handler.stats["received_bytes"] == len(lines)
+    assert Handler.stats["batches"] < 1000
@@ -0,0 +1,45 @@
+import itertools
+from unittest.mock import Mock, patch
+
+import pytest
+
+from middlewared.plugins.reporting.events import ProcFile, RealtimeSampler, RealtimeSamplers
+
+
+def test__proc_file(tmp_path):
+    path = tmp_path / "stat"
+    path.write_bytes(b"a" * 100000)
+    f = ProcFile(str(path))
+    try:
+        assert f.read() == b"a" * 100000
+
+        with open(path, "r+b") as w:
+            w.write(b"b")
+        assert f.read()[:2] == b"ba"
+    finally:
+        f.close()
+
+
+@pytest.mark.timeout(10)
+def test__realtime_samplers__shared():
+    counter = itertools.count(1)
+    samplers = RealtimeSamplers()
+
+    with patch.object(RealtimeSampler, "collect", lambda self: {"n": next(counter)}):
+        sampler1 = samplers.subscribe(Mock(), 0.1)
+        sampler2 = samplers.subscribe(Mock(), 0.1)
+        assert sampler1 is sampler2
+
+        generation, sample = sampler1.wait(0)
+        while generation < 3:
+            generation, sample = sampler1.wait(generation)
+
+        # Every subscriber gets the same samples, they are only collected once per interval
+        assert sampler2.wait(generation - 1) == (generation, sample)
+        assert sample["n"] == generation
+
+        samplers.unsubscribe(sampler1)
+        assert samplers.samplers
+        samplers.unsubscribe(sampler2)
+        assert not samplers.samplers
+        assert sampler1.sample is None
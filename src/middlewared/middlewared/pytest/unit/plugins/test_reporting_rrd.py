@@ -0,0 +1,61 @@
+import json
+import subprocess
+from unittest.mock import Mock, patch
+
+from middlewared.plugins.reporting.plugins import LoadPlugin
+from middlewared.plugins.reporting.rrd_utils import RRDExportCache, downsample
+
+ROWS = 10000
+
+
+def xport(*args, **kwargs):
+    return subprocess.CompletedProcess(args, 0, json.dumps({
+        "meta": {"start": 0, "end": ROWS * 10, "step": 10, "legend": ["shortterm", "midterm", "longterm"]},
+        "data": [[i, None if i % 2 else i, None] for i in range(ROWS)],
+    }).encode(), b"")
+
+
+def test__downsample():
+    assert downsample([[1, None], [3, None], [5, 7]], 2) == (
+        [[2, None], [5, 7]],
+        [[1, None], [5, 7]],
+        [[3, None], [5, 7]],
+    )
+
+
+def test__export__max_points():
+    with patch("middlewared.plugins.reporting.rrd_utils.subprocess.run", Mock(side_effect=xport)):
+        data = LoadPlugin(Mock()).export(None, "end-1y", "now", max_points=100)
+
+    assert len(data["data"]) == 100
+    assert data["step"] == 1000
+    assert data["data"][0] == [49.5, 49, None]
+    assert data["data_min"][0] == [0, 0, None]
+    assert data["data_max"][0] == [99, 98, None]
+    # Aggregations are calculated from full resolution data
+    assert data["aggregations"]["max"] == [ROWS - 1, ROWS - 2, None]
+
+
+def test__export__step():
+    run = Mock(side_effect=xport)
+    with patch("middlewared.plugins.reporting.rrd_utils.subprocess.run", run):
+        data = LoadPlugin(Mock()).export(None, "end-1y", "now", step=600)
+
+    assert "--step" in run.call_args[0][0]
+    assert len(data["data"]) == ROWS // 60 + 1
+    assert data["step"] == 600
+
+
+def test__export_cache():
+    cache = RRDExportCache(maxsize=2)
+    cache.put(("load", None, 1), {"step": 10})
+    cache.put(("load", None, 2), {"step": 10})
+    assert cache.get(("load", None, 1)) == {"step": 10}
+
+    cache.put(("load", None, 3), {"step": 10})
+    # Least recently used entry is evicted
+    assert cache.get(("load", None, 2)) is None
+    assert cache.get(("load", None, 1)) is not None
+
+    with patch("middlewared.plugins.reporting.rrd_utils.time.monotonic", Mock(return_value=10 ** 9)):
+        assert cache.get(("load", None, 1)) is None
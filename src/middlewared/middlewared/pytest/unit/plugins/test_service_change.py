@@ -0,0 +1,61 @@
+from asynctest import CoroutineMock, Mock
+import pytest
+
+from middlewared.plugins.service_.change import ServiceService
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.service import CallError
+from middlewared.utils import filter_list
+
+SERVICES = [
+    {"service": "iscsitarget", "state": "RUNNING"},
+    {"service": "nfs", "state": "RUNNING"},
+    {"service": "webdav", "state": "STOPPED"},
+]
+
+
+@pytest.fixture
+def service():
+    m = Middleware()
+    m["etc.generate"] = CoroutineMock()
+    m["service.query"] = Mock(side_effect=lambda filters: filter_list(SERVICES, filters))
+    m["service.reload"] = CoroutineMock(return_value=True)
+    m["service.restart"] = CoroutineMock(return_value=True)
+    return ServiceService(m)
+
+
+@pytest.mark.asyncio
+async def test__schedule_change__coalesced(service):
+    for i in range(50):
+        await service.schedule_change("iscsitarget", "reload")
+    await service.schedule_change("nfs", "reload")
+    await service.schedule_change("nfs", "restart")
+    await service.schedule_change("webdav", "reload")
+
+    await service.flush_changes()
+
+    service.middleware["etc.generate"].assert_called_once_with("rc")
+    service.middleware["service.reload"].assert_called_once_with("iscsitarget")
+    # Restart takes precedence over reload
+    service.middleware["service.restart"].assert_called_once_with("nfs")
+    assert await service.change_stats() == {"scheduled": 53, "coalesced": 50, "applied": 2, "etc_generate": 1}
+    assert service.change_batches == []
+
+
+@pytest.mark.asyncio
+async def test__flush_changes__failed(service):
+    service.middleware["service.reload"].return_value = False
+
+    await service.schedule_change("iscsitarget", "reload")
+    with pytest.raises(CallError) as e:
+        await service.flush_changes(["iscsitarget"])
+
+    assert e.value.errno == CallError.ESERVICESTARTFAILURE
+
+
+@pytest.mark.asyncio
+async def test__flush_changes__other_service(service):
+    await service.schedule_change("iscsitarget", "reload")
+
+    # Nothing to wait for
+    await service.flush_changes(["nfs"])
+    assert not service.middleware["service.reload"].called
@@ -0,0 +1,185 @@
+from asynctest import CoroutineMock, Mock
+import pytest
+
+from middlewared.plugins.smb import SharingSMBService
+from middlewared.pytest.unit.middleware import Middleware
+from middlewared.service_exception import ValidationErrors
+
+
+def share(name, path, **kwargs):
+    return dict({
+        "purpose": "DEFAULT_SHARE",
+        "path": path,
+        "path_suffix": "",
+        "home": False,
+        "name": name,
+        "comment": "",
+        "ro": False,
+        "browsable": True,
+        "timemachine": False,
+        "recyclebin": False,
+        "guestok": False,
+        "abe": False,
+        "hostsallow": [],
+        "hostsdeny": [],
+        "aapl_name_mangling": False,
+        "acl": True,
+        "durablehandle": True,
+        "shadowcopy": True,
+        "streams": True,
+        "fsrvp": False,
+        "auxsmbconf": "",
+        "enabled": True,
+        "cluster_volname": "",
+    }, **kwargs)
+
+
+def existing_share(id, name, path, **kwargs):
+    return share(name, path, id=id, vuid="", locked=False, **kwargs)
+
+
+@pytest.fixture
+def smb_service(tmp_path):
+    m = Middleware()
+    m.event_register = Mock()
+    m["smb.get_smb_ha_mode"] = Mock(return_value="STANDALONE")
+    m["datastore.query"] = Mock(return_value=[{"id": 1, "name": "existing"}, {"id": 2, "name": "other"}])
+    m["datastore.bulk"] = Mock(side_effect=lambda name, operations, options: list(range(3, len(operations) + 3)))
+    m["sharing.smb.reg_addshare"] = Mock()
+    m["sharing.smb.reg_delshare"] = Mock()
+    m["sharing.smb.diff_middleware_and_registry"] = Mock(return_value=None)
+    m["smb.sharesec._delete"] = Mock()
+    m["service.restart"] = Mock()
+
+    service = SharingSMBService(m)
+    service.validate = CoroutineMock()
+    service.query = CoroutineMock(return_value=[])
+    service.close_share = CoroutineMock()
+    service.check_aapl = CoroutineMock(return_value=False)
+    service._service_change = CoroutineMock()
+    return m, service, tmp_path
+
+
+@pytest.mark.asyncio
+async def test__bulk_create(smb_service):
+    m, service, tmp_path = smb_service
+
+    await service.bulk_create.wraps(service, [share(f"share{i}", str(tmp_path / f"share{i}")) for i in range(100)])
+
+    assert m["datastore.query"].call_count == 1
+    m["datastore.bulk"].assert_called_once()
+    operations = m["datastore.bulk"].call_args[0][1]
+    assert len(operations) == 100
+    assert all(operation["type"] == "INSERT" for operation in operations)
+    assert (tmp_path / "share99").is_dir()
+    assert m["sharing.smb.reg_addshare"].call_count == 100
+    service._service_change.assert_called_once_with("cifs", "reload")
+
+
+@pytest.mark.asyncio
+async def test__bulk_create__validates_all_shares(smb_service):
+    m, service, tmp_path = smb_service
+
+    def validate(data, schema_name, verrors, old=None):
+        if data["path"] == "/nonexistent":
+            verrors.add(f"{schema_name}.path", "This path does not exist.")
+
+    service.validate.side_effect = validate
+
+    with pytest.raises(ValidationErrors) as ve:
+        await service.bulk_create.wraps(service, [
+            share("new", str(tmp_path / "new")),
+            share("new", str(tmp_path / "new2")),
+            share("existing", str(tmp_path / "existing")),
+            share("bad", "/nonexistent"),
+        ])
+
+    assert [e.attribute for e in ve.value.errors] == [
+        "sharingsmb_bulk_create.1.name",
+        "sharingsmb_bulk_create.2.name",
+        "sharingsmb_bulk_create.3.path",
+    ]
+    assert not m["datastore.bulk"].called
+    assert not m["sharing.smb.reg_addshare"].called
+    assert not service._service_change.called
+
+
+@pytest.mark.asyncio
+async def test__bulk_update(smb_service):
+    m, service, tmp_path = smb_service
+    service.query.return_value = [
+        existing_share(1, "existing", str(tmp_path)),
+        existing_share(2, "other", str(tmp_path)),
+    ]
+
+    await service.bulk_update.wraps(service, [{"id": 1, "comment": "Updated"}, {"id": 2, "name": "renamed"}])
+
+    m["datastore.bulk"].assert_called_once()
+    operations = m["datastore.bulk"].call_args[0][1]
+    assert [(operation["type"], operation["id"]) for operation in operations] == [("UPDATE", 1), ("UPDATE", 2)]
+    assert operations[0]["data"]["comment"] == "Updated"
+    assert operations[1]["data"]["name"] == "renamed"
+    # Renamed share is removed from the running configuration under its old name
+    service.close_share.assert_called_once_with("other")
+    m["sharing.smb.reg_delshare"].assert_called_once_with("other")
+    service._service_change.assert_called_once_with("cifs", "reload")
+
+
+@pytest.mark.asyncio
+async def test__bulk_update__validates_all_shares(smb_service):
+    m, service, tmp_path = smb_service
+    service.query.return_value = [
+        existing_share(1, "existing", str(tmp_path)),
+        existing_share(2, "other", str(tmp_path)),
+    ]
+
+    with pytest.raises(ValidationErrors) as ve:
+        await service.bulk_update.wraps(service, [{"id": 1, "name": "other"}, {"id": 2}, {"id": 3}])
+
+    assert [e.attribute for e in ve.value.errors] == [
+        "sharingsmb_bulk_update.1.name",
+        "sharingsmb_bulk_update.2.id",
+    ]
+    assert not m["datastore.bulk"].called
+    assert not service._service_change.called
+
+
+@pytest.mark.asyncio
+async def test__bulk_update__one_update_per_share(smb_service):
+    m, service, tmp_path = smb_service
+
+    with pytest.raises(ValidationErrors) as ve:
+        await service.bulk_update.wraps(service, [{"id": 1}, {"id": 1}])
+
+    assert [e.attribute for e in ve.value.errors] == ["sharingsmb_bulk_update.1.id"]
+    assert not service.query.called
+
+
+@pytest.mark.asyncio
+async def test__bulk_delete(smb_service):
+    m, service, tmp_path = smb_service
+    service.query.return_value = [
+        existing_share(1, "existing", str(tmp_path)),
+        existing_share(2, "other", str(tmp_path), timemachine=True),
+    ]
+
+    assert await service.bulk_delete.wraps(service, [1, 2]) == [1, 2]
+
+    m["datastore.bulk"].assert_called_once_with(
+        "sharing.cifs_share", [{"type": "DELETE", "id": 1}, {"type": "DELETE", "id": 2}], {"prefix": "cifs_"},
+    )
+    assert m["sharing.smb.reg_delshare"].call_count == 2
+    m["service.restart"].assert_called_once_with("mdns")
+
+
+@pytest.mark.asyncio
+async def test__bulk_delete__nonexistent_share(smb_service):
+    m, service, tmp_path = smb_service
+    service.query.return_value = [existing_share(1, "existing", str(tmp_path))]
+
+    with pytest.raises(ValidationErrors) as ve:
+        await service.bulk_delete.wraps(service, [1, 3])
+
+    assert [e.attribute for e in ve.value.errors] == ["sharingsmb_bulk_delete.1"]
+    assert not m["datastore.bulk"].called
+    assert not m["sharing.smb.reg_delshare"].called
@@ -0,0 +1,86 @@
+from unittest.mock import Mock, patch
+
+import pytest
+
+from middlewared.plugins.service_.services.systemd_client import SystemdClient
+
+
+def list_units(states):
+    return lambda names: [
+        (name, b"", b"loaded", states[name], b"", b"", b"/org/freedesktop/systemd1/unit/" + name, 0, b"", b"/")
+        for name in names
+    ]
+
+
+@pytest.fixture
+def systemd():
+    states = {b"nfs-server.service": b"active", b"smbd.service": b"inactive"}
+    with patch("middlewared.plugins.service_.services.systemd_client.DBus") as DBus:
+        with patch("middlewared.plugins.service_.services.systemd_client.Manager") as Manager:
+            with patch("middlewared.plugins.service_.services.systemd_client.Unit") as Unit:
+                with patch("middlewared.plugins.service_.services.systemd_client.threading.Thread"):
+                    Manager.return_value.Manager.ListUnitsByNames.side_effect = list_units(states)
+                    Unit.return_value.Service.MainPID = 1000
+                    yield SystemdClient(), DBus, Manager.return_value
+
+
+def test__get_states__batched(systemd):
+    client, DBus, manager = systemd
+    assert client.get_states([b"nfs-server.service", b"smbd.service"]) == {
+        b"nfs-server.service": {"active_state": b"active", "main_pid": 1000},
+        b"smbd.service": {"active_state": b"inactive", "main_pid": 0},
+    }
+    # One connection for all the units
+    DBus.assert_called_once()
+    list_units_by_names = manager.Manager.ListUnitsByNames
+    calls = list_units_by_names.call_count
+
+    # Served from cache
+    assert client.get_states([b"smbd.service"]) == {b"smbd.service": {"active_state": b"inactive", "main_pid": 0}}
+    assert client.cached_state(b"nfs-server.service")["active_state"] == b"active"
+    assert list_units_by_names.call_count == calls
+
+
+def test__properties_changed(systemd):
+    client, DBus, manager = systemd
+    client.get_states([b"smbd.service"])
+
+    msg = Mock(body=(b"org.freedesktop.systemd1.Unit", {b"ActiveState": b"active"}, []))
+    client._on_properties_changed(msg, userdata=b"/org/freedesktop/systemd1/unit/smbd.service")
+
+    assert client.cached_state(b"smbd.service")["active_state"] == b"active"
+
+
+def test__listener(systemd):
+    client, DBus, manager = systemd
+    listener = Mock()
+    client.add_listener(listener)
+    client.get_states([b"smbd.service"])
+
+    for active_state in [b"activating", b"active", b"active"]:
+        msg = Mock(body=(b"org.freedesktop.systemd1.Unit", {b"ActiveState": active_state}, []))
+        client._on_properties_changed(msg, userdata=b"/org/freedesktop/systemd1/unit/smbd.service")
+
+    # Only once the unit has started
+    listener.assert_called_once_with(b"smbd.service", b"active")
+
+
+def test__disconnect_on_error(systemd):
+    client, DBus, manager = systemd
+    manager.Manager.ListUnitsByNames.side_effect = OSError()
+
+    with pytest.raises(OSError):
+        client.get_states([b"smbd.service"])
+
+    assert client.bus is None
+    assert client.states == {}
+
+
+def test__reconnect(systemd):
+    client, DBus, manager = systemd
+    client.get_states([b"smbd.service"])
+    client._disconnect()
+
+    # States of all the followed units are loaded again
+    client.get_states([b"nfs-server.service"])
+    assert set(client.states) == {b"smbd.service", b"nfs-server.service"}
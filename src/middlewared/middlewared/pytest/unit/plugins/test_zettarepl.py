@@ -1,9 +1,17 @@
+from unittest.mock import Mock
+
+from asynctest import CoroutineMock
 import pytest
 
 import middlewared.plugins.zettarepl  # noqa
+from middlewared.plugins.zettarepl import (
+    apply_definition_diff, coalesce_observer_messages, replication_tasks_using, ReplicationTaskLog,
+    ReplicationTaskSnapshotProgress, ReplicationTaskStart,
+)
 import middlewared.plugins.zettarepl_.util  # noqa
 
 from middlewared.pytest.unit.helpers import load_compound_service
+from middlewared.pytest.unit.middleware import Middleware
 
 ZettareplService = load_compound_service("zettarepl")
 
@@ -22,3 +30,188 @@ async def test__reverse_source_target_datasets(source_datasets, target_dataset,
         reversed_source_datasets,
         reversed_target_dataset,
     )
+
+
+def test__apply_definition_diff():
+    definition = {
+        "timezone": "UTC",
+        "periodic-snapshot-tasks": {"task_1": {"dataset": "tank/a"}, "task_2": {"dataset": "tank/b"}},
+        "replication-tasks": {"task_1": {"direction": "push"}},
+    }
+
+    assert apply_definition_diff(definition, {
+        "periodic-snapshot-tasks": {"task_1": None, "task_3": {"dataset": "tank/c"}},
+        "replication-tasks": {"task_1": {"direction": "pull"}},
+    }) == {
+        "timezone": "UTC",
+        "periodic-snapshot-tasks": {"task_2": {"dataset": "tank/b"}, "task_3": {"dataset": "tank/c"}},
+        "replication-tasks": {"task_1": {"direction": "pull"}},
+    }
+    # Original definition is not modified
+    assert definition["periodic-snapshot-tasks"]["task_1"] == {"dataset": "tank/a"}
+
+
+@pytest.mark.asyncio
+async def test__get_definition__partial():
+    m = Middleware()
+    m["system.general.config"] = Mock(return_value={"timezone": "UTC"})
+    m["pool.query"] = Mock(return_value=[
+        {"name": "tank", "status": "ONLINE", "is_decrypted": True},
+        {"name": "backup", "status": "OFFLINE", "is_decrypted": True},
+    ])
+    m["pool.snapshottask.query"] = Mock(return_value=[
+        {
+            "id": 1, "dataset": "tank/work", "recursive": False, "exclude": [], "lifetime_value": 2,
+            "lifetime_unit": "WEEK", "naming_schema": "auto-%Y-%m-%d_%H-%M", "allow_empty": True,
+            "schedule": {"minute": "0", "hour": "*", "dom": "*", "month": "*", "dow": "*", "begin": "00:00",
+                         "end": "23:59"},
+        },
+        {"id": 3, "dataset": "backup/work"},
+    ])
+    m["replication.query"] = Mock(return_value=[])
+
+    zs = ZettareplService(m)
+    definition, hold_tasks = await zs.get_definition({"periodic_snapshot_tasks": [1, 2, 3]})
+
+    assert definition["periodic-snapshot-tasks"]["task_1"]["dataset"] == "tank/work"
+    # Deleted or disabled task
+    assert definition["periodic-snapshot-tasks"]["task_2"] is None
+    # Task on hold
+    assert definition["periodic-snapshot-tasks"]["task_3"] is None
+    assert hold_tasks["periodic_snapshot_task_1"] is None
+    assert hold_tasks["periodic_snapshot_task_3"]["reason"] == "Pool backup is offline."
+
+    assert definition["replication-tasks"] == {}
+    assert "periodic_snapshot_tasks" in zs.get_definition_timings()
+
+
+@pytest.mark.asyncio
+async def test__get_definition__partial_dependent_replication_tasks():
+    m = Middleware()
+    m["system.general.config"] = Mock(return_value={"timezone": "UTC"})
+    m["pool.query"] = Mock(return_value=[{"name": "tank", "status": "ONLINE", "is_decrypted": True}])
+    m["pool.snapshottask.query"] = Mock(return_value=[])
+    m["replication.query"] = Mock(return_value=[
+        {"id": 1, "direction": "PUSH", "transport": "LOCAL", "source_datasets": ["tank/work"],
+         "periodic_snapshot_tasks": [{"id": 2}]},
+        {"id": 2, "direction": "PUSH", "transport": "LOCAL", "source_datasets": ["tank/work"],
+         "periodic_snapshot_tasks": [{"id": 3}]},
+    ])
+
+    zs = ZettareplService(m)
+    zs._replication_task_definition = Mock(side_effect=lambda replication_task, transport: {
+        "periodic-snapshot-tasks": [f"task_{t['id']}" for t in replication_task["periodic_snapshot_tasks"]],
+    })
+    zs._define_transport = CoroutineMock()
+    definition, hold_tasks = await zs.get_definition({"periodic_snapshot_tasks": [2], "replication_tasks": [5]})
+
+    assert definition["periodic-snapshot-tasks"] == {"task_2": None}
+    # Replication task 1 uses changed periodic snapshot task, 5 was deleted, 2 is not affected
+    assert definition["replication-tasks"] == {"task_1": {"periodic-snapshot-tasks": ["task_2"]}, "task_5": None}
+
+
+def test__replication_tasks_using():
+    definition = {
+        "periodic-snapshot-tasks": {"task_1": {}, "task_2": {}},
+        "replication-tasks": {
+            "task_1": {"periodic-snapshot-tasks": ["task_1"]},
+            "task_2": {"periodic-snapshot-tasks": ["task_1", "task_2"]},
+            "task_3": {"periodic-snapshot-tasks": []},
+            "task_4": {},
+        },
+    }
+
+    # Periodic snapshot task is deleted: it is no longer referenced in the database, only in the running definition
+    assert replication_tasks_using(definition, [1]) == {1, 2}
+    assert replication_tasks_using(definition, [2, 5]) == {2}
+    assert replication_tasks_using(definition, []) == set()
+
+
+def test__update_tasks__deleted_periodic_snapshot_task():
+    m = Middleware()
+    zs = ZettareplService(m)
+    zs.definition = {
+        "timezone": "UTC",
+        "periodic-snapshot-tasks": {"task_1": {"dataset": "tank/work"}},
+        "replication-tasks": {"task_1": {"periodic-snapshot-tasks": ["task_1"]}},
+    }
+    zs.definition_hold_tasks = {}
+    zs.is_running = Mock(return_value=True)
+    zs.queue = Mock()
+    m["zettarepl.get_definition"] = Mock(return_value=(
+        {
+            "timezone": "UTC",
+            "periodic-snapshot-tasks": {"task_1": None},
+            "replication-tasks": {"task_1": {"periodic-snapshot-tasks": []}},
+        },
+        {"periodic_snapshot_task_1": None, "replication_task_1": None},
+    ))
+    m["zettarepl.notify_definition"] = Mock()
+
+    zs.update_tasks({"periodic_snapshot_tasks": [1]})
+
+    m["zettarepl.get_definition"].assert_called_once_with({"periodic_snapshot_tasks": [1], "replication_tasks": [1]})
+    assert zs.definition["replication-tasks"] == {"task_1": {"periodic-snapshot-tasks": []}}
+    zs.queue.put.assert_called_once()
+
+
+def test__update_tasks__definition_changed_while_generating_diff():
+    m = Middleware()
+    zs = ZettareplService(m)
+    zs.definition = {
+        "timezone": "UTC",
+        "periodic-snapshot-tasks": {"task_1": {"dataset": "tank/work"}},
+        "replication-tasks": {},
+    }
+    zs.definition_hold_tasks = {}
+    zs.is_running = Mock(return_value=True)
+    zs.queue = Mock()
+    full_definition = {
+        "timezone": "UTC",
+        "periodic-snapshot-tasks": {"task_1": {"dataset": "tank/work"}, "task_2": {"dataset": "tank/home"}},
+        "replication-tasks": {},
+    }
+
+    def get_definition(tasks=None):
+        if tasks is None:
+            return full_definition, {}
+
+        # Diff is generated without holding the lock so the definition can be replaced concurrently
+        assert not zs.lock.locked()
+        zs.definition = dict(zs.definition)
+        return {"periodic-snapshot-tasks": {"task_1": {"dataset": "tank/data"}}}, {}
+
+    m["zettarepl.get_definition"] = Mock(side_effect=get_definition)
+    m["zettarepl.set_error"] = Mock()
+    m["zettarepl.notify_definition"] = Mock()
+
+    zs.update_tasks({"periodic_snapshot_tasks": [1]})
+
+    # Stale diff is discarded and the whole definition is regenerated instead
+    assert zs.definition is full_definition
+    zs.queue.put.assert_called_once_with(("tasks", full_definition))
+    m["zettarepl.notify_definition"].assert_called_once_with(full_definition, {})
+
+
+def test__coalesce_observer_messages():
+    def progress(task_id, bytes_sent):
+        return ReplicationTaskSnapshotProgress(task_id, "tank/work", "auto-1", 0, 1, bytes_sent, 100)
+
+    messages = [
+        progress("task_1", 10),
+        progress("task_2", 10),
+        ReplicationTaskLog("task_1", "log"),
+        progress("task_1", 20),
+        progress("task_2", 20),
+        ReplicationTaskStart("task_2"),
+        progress("task_1", 30),
+        progress("task_2", 30),
+    ]
+
+    assert coalesce_observer_messages(messages) == [
+        messages[2],  # logs are kept
+        messages[4],  # last progress before task state change is kept
+        messages[5],
+        messages[6],
+        messages[7],
+    ]
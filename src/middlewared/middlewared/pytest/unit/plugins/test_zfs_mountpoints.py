@@ -0,0 +1,105 @@
+from unittest.mock import Mock
+
+import pytest
+
+from middlewared.plugins.zfs_.mountpoints import MountpointTrie, ZFSMountpointsService
+from middlewared.pytest.unit.middleware import Middleware
+
+
+def dataset(id, mountpoint, mounted=True, encrypted=False, key_loaded=True, children=None):
+    return {
+        "id": id,
+        "mountpoint": mountpoint,
+        "encrypted": encrypted,
+        "key_loaded": key_loaded,
+        "properties": {"mounted": {"value": "yes" if mounted else "no"}},
+        "children": children or [],
+    }
+
+
+DATASETS = [
+    dataset("boot-pool/ROOT/default", "/"),
+    dataset("tank", "/mnt/tank", children=[
+        dataset("tank/data", "/mnt/tank/data", children=[
+            dataset("tank/data/nested", "/mnt/tank/data/sub/nested"),
+        ]),
+        dataset("tank/secret", "/mnt/tank/secret", mounted=False, encrypted=True, key_loaded=False, children=[
+            dataset("tank/secret/child", "/mnt/tank/secret/child", mounted=False, encrypted=True, key_loaded=False),
+        ]),
+        dataset("tank/open", "/mnt/tank/open", encrypted=True),
+        dataset("tank/legacy", "legacy"),
+        dataset("tank/zvol", None),
+    ]),
+]
+
+
+@pytest.mark.parametrize("path,owner,mountpoint,children", [
+    ("/mnt/tank/data/file", "tank/data", "/mnt/tank/data", False),
+    ("/mnt/tank/data", "tank/data", "/mnt/tank/data", True),
+    ("/mnt/tank/data/sub", "tank/data", "/mnt/tank/data", True),
+    ("/mnt/tank/data/sub/nested/a/b", "tank/data/nested", "/mnt/tank/data/sub/nested", False),
+    ("/mnt/tank/secret/child/file", "tank", "/mnt/tank", False),
+    ("/mnt/tank/", "tank", "/mnt/tank", True),
+    ("/mnt/other", "boot-pool/ROOT/default", "/", False),
+])
+def test__mountpoint_trie__resolve(path, owner, mountpoint, children):
+    trie = MountpointTrie()
+    trie.add({"id": "boot-pool/ROOT/default", "mountpoint": "/", "mounted": True})
+    trie.add({"id": "tank", "mountpoint": "/mnt/tank", "mounted": True})
+    trie.add({"id": "tank/data", "mountpoint": "/mnt/tank/data", "mounted": True})
+    trie.add({"id": "tank/data/nested", "mountpoint": "/mnt/tank/data/sub/nested", "mounted": True})
+    trie.add({"id": "tank/secret", "mountpoint": "/mnt/tank/secret", "mounted": False})
+    trie.add({"id": "tank/secret/child", "mountpoint": "/mnt/tank/secret/child", "mounted": False})
+
+    result = trie.resolve(path)
+
+    assert result["dataset"] == owner
+    assert result["mountpoint"] == mountpoint
+    assert result["children"] == children
+
+
+@pytest.fixture
+def mountpoints_service():
+    m = Middleware()
+    m["zfs.dataset.query"] = Mock(return_value=DATASETS)
+    m["cache.get"] = Mock(side_effect=KeyError("about_to_lock_dataset"))
+    return m, ZFSMountpointsService(m)
+
+
+@pytest.mark.asyncio
+async def test__mountpoints__resolve_locked(mountpoints_service):
+    m, service = mountpoints_service
+
+    result = await service.resolve("/mnt/tank/secret/child/file")
+
+    assert result["dataset"] == "tank"
+    assert result["locked"] == ["tank/secret", "tank/secret/child"]
+    assert (await service.resolve("/mnt/tank/open/file"))["locked"] == []
+    assert (await service.resolve("/mnt/tank/data"))["locked"] == []
+    # The trie is built once
+    assert m["zfs.dataset.query"].call_count == 1
+
+
+@pytest.mark.asyncio
+async def test__mountpoints__about_to_lock_dataset(mountpoints_service):
+    m, service = mountpoints_service
+    m["cache.get"] = Mock(return_value="tank/open")
+
+    assert (await service.resolve("/mnt/tank/open/file"))["locked"] == ["tank/open"]
+    assert await service.locked_datasets() == [
+        {"id": "tank/secret", "mountpoint": "/mnt/tank/secret"},
+        {"id": "tank/secret/child", "mountpoint": "/mnt/tank/secret/child"},
+        {"id": "tank/open", "mountpoint": "/mnt/tank/open"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test__mountpoints__invalidate(mountpoints_service):
+    m, service = mountpoints_service
+
+    await service.resolve("/mnt/tank/data")
+    await service.invalidate()
+    m["zfs.dataset.query"].return_value = [dataset("tank", "/mnt/tank")]
+
+    assert (await service.resolve("/mnt/tank/data"))["dataset"] == "tank"
+    assert m["zfs.dataset.query"].call_count == 2
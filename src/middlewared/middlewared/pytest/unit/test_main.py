@@ -1,16 +1,20 @@
 # -*- coding=utf-8 -*-
+import argparse
 import asyncio
 import json
 import logging
+import threading
 from unittest.mock import Mock, patch
 
 from asyncmock import AsyncMock  # FIXME: python 3.8
 import pytest
 
-from middlewared.main import Application, Middleware
-from middlewared.service import accepts, job, CoreService, CRUDService
+from middlewared.main import Application, Middleware, thread_pool_arg
+from middlewared.service import accepts, job, CoreService, CRUDService, Service, threaded
+from middlewared.service_exception import ValidationErrors
 from middlewared.plugins.datastore.read import DatastoreService
-from middlewared.schema import Dict, Str
+from middlewared.schema import Dict, Int, Str
+from middlewared.validators import Range
 
 
 class MockService(CRUDService):
@@ -84,3 +88,98 @@ async def test__job_service(caplog, method):
     result = json.loads(await fut)
 
     assert result["result"][0]["arguments"] == [{"password": "********"}]
+
+
+class TrustedService(Service):
+    class Config:
+        private = True
+
+    @accepts(Dict("data", Int("value", validators=[Range(min=1)]), Int("default", default=1)))
+    async def echo(self, data):
+        return data
+
+
+@pytest.mark.asyncio
+async def test__trusted_call():
+    with patch("middlewared.main.multiprocessing"):
+        middleware = Middleware()
+    middleware.loop = asyncio.get_event_loop()
+    middleware.add_service(TrustedService(middleware))
+
+    data = {"value": 0}
+    with pytest.raises(ValidationErrors):
+        await middleware.call("trusted.echo", data)
+
+    result = await middleware.call("trusted.echo", data, trusted=True)
+
+    assert result is data
+    assert result == {"value": 0, "default": 1}
+
+
+class IsolatedService(Service):
+    class Config:
+        private = True
+        thread_pool = 'isolated'
+
+    def thread(self):
+        return threading.current_thread().name
+
+    @threaded('device')
+    def device_thread(self):
+        return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test__isolated_thread_pools():
+    with patch("middlewared.main.multiprocessing"):
+        middleware = Middleware()
+    middleware.loop = asyncio.get_event_loop()
+    middleware.add_service(IsolatedService(middleware))
+
+    assert (await middleware.call("isolated.thread")).startswith("IoThread-isolated-")
+    assert (await middleware.call("isolated.device_thread")).startswith("IoThread-device-")
+
+    device = middleware.get_thread_pool("device")
+    isolated = middleware.get_thread_pool("isolated")
+    assert middleware.get_thread_pool("device") is device
+    assert len({id(device), id(isolated), id(middleware.run_in_thread_executor)}) == 3
+    assert device.max_workers == 8
+    assert isolated.max_workers == 10
+
+    # Blocking all the workers of one pool does not affect the others
+    event = threading.Event()
+    futures = [device.submit(event.wait, 5) for i in range(device.max_workers + 2)]
+    assert (await middleware.call("isolated.thread")).startswith("IoThread-isolated-")
+    event.set()
+    for future in futures:
+        future.result(5)
+
+    assert {pool.thread_name_prefix for pool in middleware.get_thread_pools()} == {
+        "IoThread", "IoThread-device", "IoThread-isolated",
+    }
+
+
+def test__thread_pools_override():
+    with patch("middlewared.main.multiprocessing"):
+        middleware = Middleware(thread_pools={"device": {"max_workers": 2}, "isolated": {"max_workers": 3}})
+
+    assert middleware.get_thread_pool("device").max_workers == 2
+    assert middleware.get_thread_pool("device").min_workers == 1
+    assert middleware.get_thread_pool("isolated").max_workers == 3
+    assert middleware.get_thread_pool("other").max_workers == 10
+
+
+@pytest.mark.parametrize("value,result", [
+    ("device=16", ("device", 16)),
+    ("device", None),
+    ("device=", None),
+    ("=16", None),
+    ("device=0", None),
+    ("device=x", None),
+])
+def test__thread_pool_arg(value, result):
+    if result is None:
+        with pytest.raises(argparse.ArgumentTypeError):
+            thread_pool_arg(value)
+    else:
+        assert thread_pool_arg(value) == result
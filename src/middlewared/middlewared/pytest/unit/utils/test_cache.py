@@ -0,0 +1,55 @@
+from unittest.mock import patch
+
+import pytest
+
+from middlewared.utils.cache import LRUCache
+
+
+def test__lru_cache__evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+
+    cache.put('c', 3)
+
+    assert 'a' in cache
+    assert 'b' not in cache
+    assert 'c' in cache
+    assert cache.stats()['evictions'] == 1
+
+
+def test__lru_cache__max_bytes():
+    cache = LRUCache(max_bytes=1024)
+    for i in range(100):
+        cache.put(i, 'x' * 100)
+
+    assert cache.stats()['bytes'] <= 1024
+    assert 99 in cache
+    assert 0 not in cache
+
+
+def test__lru_cache__expire():
+    cache = LRUCache()
+    with patch('middlewared.utils.cache.time.monotonic', return_value=100):
+        cache.put('a', 1, 10)
+        cache.put('b', 2)
+
+    with patch('middlewared.utils.cache.time.monotonic', return_value=200):
+        assert cache.expire() == 1
+        assert 'a' not in cache
+        assert cache.get('b') == 2
+
+    assert cache.stats()['bytes'] == cache.entries['b'].size
+
+
+def test__lru_cache__hits_misses():
+    cache = LRUCache()
+    cache.put('a', 1)
+    cache.get('a')
+    with pytest.raises(KeyError):
+        cache.get('b')
+
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+import middlewared.logger  # noqa
+from middlewared.utils.io_thread_pool_executor import IoThreadPoolExecutor
+
+
+def submit_busy(executor, event, count):
+    futures = []
+    for i in range(count):
+        futures.append(executor.submit(lambda i=i: event.wait(5) and i))
+        # Free worker that did not pick up its work item yet would get this one too
+        wait_for(lambda: executor.stats()["busy_workers"] == min(i + 1, executor.max_workers or count))
+
+    return futures
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test__io_thread_pool_executor__max_workers():
+    executor = IoThreadPoolExecutor("test", 0, max_workers=2)
+    event = threading.Event()
+
+    futures = submit_busy(executor, event, 5)
+
+    stats = executor.stats()
+    assert stats["workers"] == 2
+    # Work items that did not get a worker are queued instead of starting more workers
+    assert stats["queue_depth"] == 3
+    assert stats["saturation"] == 1
+    assert stats["saturated"] == 3
+    assert stats["submitted"] == 5
+    assert stats["completed"] == 0
+
+    event.set()
+    assert [future.result(5) for future in futures] == [0, 1, 2, 3, 4]
+    wait_for(lambda: executor.stats()["completed"] == 5)
+
+    stats = executor.stats()
+    assert stats["workers"] == 2
+    assert stats["busy_workers"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test__io_thread_pool_executor__unbounded():
+    executor = IoThreadPoolExecutor("test", 0)
+    event = threading.Event()
+
+    futures = submit_busy(executor, event, 5)
+
+    stats = executor.stats()
+    assert stats["workers"] == 5
+    assert stats["saturation"] is None
+    assert stats["saturated"] == 0
+
+    event.set()
+    for future in futures:
+        future.result(5)
+
+
+@pytest.mark.parametrize("max_workers,keep_workers", [
+    (3, 3),
+    # Not more than the workers that exist
+    (None, 1),
+])
+def test__io_thread_pool_executor__adaptive_keep_workers(max_workers, keep_workers):
+    executor = IoThreadPoolExecutor("test", 1, max_workers=max_workers, target_wait=0.05)
+
+    for i in range(50):
+        executor._record_wait(1)
+
+    assert executor.keep_workers == keep_workers
+    assert executor.stats()["wait_max"] == 1
+    assert executor.stats()["wait_ewma"] > 0.05
+
+    for i in range(100):
+        executor._record_wait(0)
+
+    assert executor.keep_workers == 1
+    assert executor.stats()["wait_ewma"] < 0.025
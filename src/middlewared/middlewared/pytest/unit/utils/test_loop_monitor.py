@@ -0,0 +1,19 @@
+from middlewared.utils.loop_monitor import LoopMonitor
+
+
+def test__loop_monitor__stats():
+    monitor = LoopMonitor(max_offenders=2)
+    monitor.record(0.001)
+    monitor.record(3, {"method": "disk.sync", "stack": []})
+    monitor.record(5, {"method": "pool.query", "stack": []})
+    monitor.record(4, {"method": "smart.test", "stack": []})
+    # Milder than the offenders already kept
+    monitor.record(2.5, {"method": "vm.query", "stack": []})
+
+    stats = monitor.stats()
+
+    assert stats["samples"] == 5
+    assert stats["max_lag"] == 5
+    assert stats["histogram"][0]["count"] == 1
+    assert [offender["method"] for offender in stats["offenders"]] == ["pool.query", "smart.test"]
+    assert [offender["method"] for offender in monitor.stats(1)["offenders"]] == ["pool.query"]
@@ -0,0 +1,31 @@
+import pytest
+
+from middlewared.utils.method_stats import MethodStats
+
+
+def test__method_stats__record():
+    stats = MethodStats()
+    stats.record("pool.query", "loop", 0.002)
+    stats.record("pool.query", "loop", 0.2, error=True)
+    stats.record("pool.query", "thread", 0.0001)
+
+    dump = {(stat["method"], stat["executor"]): stat for stat in stats.dump()}
+
+    loop = dump[("pool.query", "loop")]
+    assert loop["calls"] == 2
+    assert loop["errors"] == 1
+    assert loop["max_time"] == 0.2
+    assert loop["average_time"] == pytest.approx(0.101)
+    assert [bucket["count"] for bucket in loop["histogram"] if bucket["count"]] == [1, 1]
+    assert loop["histogram"][1] == {"le": 0.005, "count": 1}
+
+    assert dump[("pool.query", "thread")]["histogram"][0] == {"le": 0.001, "count": 1}
+
+
+def test__method_stats__measure_error():
+    stats = MethodStats()
+    with pytest.raises(ValueError):
+        with stats.measure("disk.query", "job"):
+            raise ValueError()
+
+    assert stats.dump()[0]["errors"] == 1
@@ -0,0 +1,52 @@
+import os
+
+from middlewared.utils.open_files import OpenFilesIndex, process_open_files
+
+
+def fake_process(proc, pid, name, cwd="/", fds=None, maps=None):
+    base = proc / str(pid)
+    (base / "fd").mkdir(parents=True)
+    (base / "comm").write_text(f"{name}\n")
+    os.symlink(cwd, base / "cwd")
+    os.symlink("/", base / "root")
+    os.symlink(f"/usr/bin/{name}", base / "exe")
+    for i, path in enumerate(fds or []):
+        os.symlink(path, base / "fd" / str(i))
+    (base / "maps").write_text("".join(
+        f"7f0000000000-7f0000001000 r--p 00000000 00:1a 1234                       {path}\n"
+        for path in maps or []
+    ) + "7ffd00000000-7ffd00021000 rw-p 00000000 00:00 0                          [stack]\n")
+
+
+def test__process_open_files(tmp_path):
+    fake_process(
+        tmp_path, 10, "smbd", cwd="/mnt/tank",
+        fds=["/dev/null", "socket:[1234]", "/mnt/tank/a (deleted)", "/mnt/tank/foo (old)/x"],
+        maps=["/mnt/tank/lib.so"],
+    )
+
+    name, paths = process_open_files(10, str(tmp_path))
+
+    assert name == "smbd"
+    assert paths == {"/mnt/tank", "/", "/usr/bin/smbd", "/dev/null", "/mnt/tank/a", "/mnt/tank/foo (old)/x",
+                     "/mnt/tank/lib.so"}
+
+
+def test__process_open_files__exited(tmp_path):
+    assert process_open_files(10, str(tmp_path)) is None
+
+
+def test__open_files_index__processes(tmp_path):
+    fake_process(tmp_path, 10, "smbd", fds=["/mnt/tank/data/file"])
+    fake_process(tmp_path, 11, "minio", cwd="/mnt/tank2")
+    fake_process(tmp_path, 12, "python3", maps=["/mnt/tank/lib.so"])
+    fake_process(tmp_path, 13, "qemu", fds=["/dev/zvol/tank/vol1"])
+    fake_process(tmp_path, 14, "bash", cwd="/mnt/tank")
+    (tmp_path / "self").mkdir()
+
+    index = OpenFilesIndex.scan(str(tmp_path), workers=2)
+
+    assert index.processes(["/mnt/tank"]) == {10: "smbd", 12: "python3", 14: "bash"}
+    assert index.processes(["/mnt/tank/data/", "/dev/zvol/tank"]) == {10: "smbd", 13: "qemu"}
+    assert index.processes(["/mnt/tank2"]) == {11: "minio"}
+    assert index.processes(["/mnt/tank3"]) == {}
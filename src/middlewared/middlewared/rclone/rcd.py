@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import os
+import subprocess
+import uuid
+
+import aiohttp
+import psutil
+
+from middlewared.service_exception import CallError
+from middlewared.utils import Popen
+
+logger = logging.getLogger(__name__)
+
+RCD_SOCKET = "/var/run/rclone-rcd.sock"
+RCD_CONFIG = "/var/run/rclone-rcd.conf"
+RCD_LOG = "/var/log/rclone-rcd.log"
+RCD_PIDFILE = "/var/run/rclone-rcd.pid"
+
+
+class RcloneRcd:
+    """
+    Long-lived `rclone rcd` process controlled through its JSON remote control API on a local unix socket.
+
+    All requests share a single HTTP connection pool so browsing remotes does not require spawning a new rclone
+    process (and establishing a new connection to the cloud provider) for every call.
+    """
+
+    def __init__(self, socket_path=RCD_SOCKET, config_path=RCD_CONFIG, pidfile=RCD_PIDFILE):
+        self.socket_path = socket_path
+        self.config_path = config_path
+        self.pidfile = pidfile
+
+        self.proc = None
+        self.session = None
+        self.lock = asyncio.Lock()
+
+    def is_running(self):
+        return self.proc is not None and self.proc.returncode is None
+
+    async def start(self):
+        async with self.lock:
+            if self.is_running():
+                return
+
+            # Daemon left behind by middleware that was not shut down cleanly
+            await asyncio.get_event_loop().run_in_executor(None, self._kill_stale)
+
+            for path in [self.socket_path, self.config_path]:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+            # Make sure only root can read it as there is sensitive data
+            with open(os.open(self.config_path, os.O_WRONLY | os.O_CREAT, 0o600), "w"):
+                pass
+
+            with open(RCD_LOG, "ab") as log:
+                self.proc = await Popen([
+                    "rclone", "rcd",
+                    "--config", self.config_path,
+                    "--rc-addr", f"unix://{self.socket_path}",
+                    "--rc-no-auth",
+                    "-v",
+                ], stdout=log, stderr=subprocess.STDOUT)
+
+            with open(self.pidfile, "w") as f:
+                f.write(str(self.proc.pid))
+
+            self.session = aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=self.socket_path))
+
+            for i in range(50):
+                try:
+                    await self._call("rc/noop")
+                except (aiohttp.ClientError, OSError):
+                    if not self.is_running():
+                        break
+
+                    await asyncio.sleep(0.1)
+                else:
+                    return
+
+        await self.stop()
+        raise CallError("rclone remote control daemon failed to start")
+
+    async def stop(self):
+        async with self.lock:
+            if self.session is not None:
+                await self.session.close()
+                self.session = None
+
+            if self.is_running():
+                self.proc.terminate()
+                try:
+                    await asyncio.wait_for(self.proc.wait(), 10)
+                except asyncio.TimeoutError:
+                    self.proc.kill()
+
+            self.proc = None
+
+            try:
+                os.unlink(self.pidfile)
+            except FileNotFoundError:
+                pass
+
+    def _kill_stale(self):
+        try:
+            with open(self.pidfile) as f:
+                pid = int(f.read())
+        except (FileNotFoundError, ValueError):
+            return
+
+        try:
+            proc = psutil.Process(pid)
+            if proc.name() == "rclone":
+                logger.info("Terminating stale rclone remote control daemon (pid %d)", pid)
+                proc.terminate()
+                proc.wait(10)
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.TimeoutExpired:
+            proc.kill()
+
+    async def call(self, endpoint, **params):
+        """
+        Calls remote control `endpoint` (e.g. `operations/list`) and returns its JSON response.
+        """
+        if not self.is_running():
+            raise CallError("rclone remote control daemon is not running")
+
+        try:
+            return await self._call(endpoint, **params)
+        except (aiohttp.ClientError, OSError) as e:
+            raise CallError(f"Error communicating with rclone remote control daemon: {e!r}")
+
+    async def _call(self, endpoint, **params):
+        async with self.session.post(f"http://rclone/{endpoint}", json=params) as response:
+            result = await response.json(content_type=None)
+            if response.status != 200:
+                raise CallError(result.get("error") or f"rclone {endpoint} failed with status {response.status}")
+
+            return result
+
+    async def create_remote(self, parameters):
+        """
+        Registers remote with `parameters` (passwords must already be obscured) and returns its name.
+        """
+        name = f"middleware_{uuid.uuid4().hex}"
+        parameters = dict(parameters)
+        type = parameters.pop("type")
+        await self.call("config/create", name=name, type=type, parameters=parameters,
+                        opt={"noObscure": True, "nonInteractive": True})
+        return name
+
+    async def delete_remote(self, name):
+        try:
+            await self.call("config/delete", name=name)
+        except CallError as e:
+            logger.warning("Error deleting rclone remote %r: %r", name, e)
+
+    async def get_remote(self, name):
+        return await self.call("config/get", name=name)
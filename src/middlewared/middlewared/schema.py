@@ -963,10 +963,13 @@ def accepts(*schema):
             args_index += f._skip_arg
         assert len(schema) == f.__code__.co_argcount - args_index  # -1 for self
 
-        def clean_and_validate_args(args, kwargs):
+        def clean_and_validate_args(args, kwargs, trusted=False):
             args = list(args)
-            args = args[:args_index] + copy.deepcopy(args[args_index:])
-            kwargs = copy.deepcopy(kwargs)
+            if not trusted:
+                args = args[:args_index] + copy.deepcopy(args[args_index:])
+                kwargs = copy.deepcopy(kwargs)
+            else:
+                kwargs = kwargs.copy()
 
             verrors = ValidationErrors()
 
@@ -978,10 +981,11 @@ def accepts(*schema):
                 value = attr.clean(args[args_index + i])
                 args[args_index + i] = value
 
-                try:
-                    attr.validate(value)
-                except ValidationErrors as e:
-                    verrors.extend(e)
+                if not trusted:
+                    try:
+                        attr.validate(value)
+                    except ValidationErrors as e:
+                        verrors.extend(e)
 
                 i += 1
 
@@ -1005,10 +1009,11 @@ def accepts(*schema):
                 value = attr.clean(value)
                 kwargs[kwarg] = value
 
-                try:
-                    attr.validate(value)
-                except ValidationErrors as e:
-                    verrors.extend(e)
+                if not trusted:
+                    try:
+                        attr.validate(value)
+                    except ValidationErrors as e:
+                        verrors.extend(e)
 
             if verrors:
                 raise verrors
@@ -1019,16 +1024,27 @@ def accepts(*schema):
             async def nf(*args, **kwargs):
                 args, kwargs = clean_and_validate_args(args, kwargs)
                 return await f(*args, **kwargs)
+
+            async def trusted_call(*args, **kwargs):
+                args, kwargs = clean_and_validate_args(args, kwargs, trusted=True)
+                return await f(*args, **kwargs)
         else:
             def nf(*args, **kwargs):
                 args, kwargs = clean_and_validate_args(args, kwargs)
                 return f(*args, **kwargs)
 
+            def trusted_call(*args, **kwargs):
+                args, kwargs = clean_and_validate_args(args, kwargs, trusted=True)
+                return f(*args, **kwargs)
+
         from middlewared.utils.type import copy_function_metadata
         copy_function_metadata(f, nf)
         nf.accepts = list(schema)
         nf.wraps = f
         nf.wrap = wrap
+        # Arguments are not copied nor validated (only cleaned so defaults are populated), used for internal calls
+        # from trusted callers that hand over ownership of the arguments
+        nf.trusted_call = trusted_call
 
         return nf
 
@@ -2,6 +2,7 @@ from collections import defaultdict, namedtuple
 from functools import wraps
 
 import asyncio
+import copy
 import errno
 import inspect
 import json
@@ -22,6 +23,8 @@ from middlewared.schema import accepts, Bool, Dict, Int, List, Ref, Str
 from middlewared.service_exception import CallException, CallError, ValidationError, ValidationErrors  # noqa
 from middlewared.utils import filter_list, osc
 from middlewared.utils.debug import get_frame_details, get_threads_stacks
+from middlewared.utils.path import path_in_locked_datasets
+from middlewared.utils.profile import profile_wrap
 from middlewared.logger import Logger, reconfigure_logging, stop_logging
 from middlewared.job import Job
 from middlewared.pipe import Pipes
@@ -223,7 +226,8 @@ class ServiceBase(type):
                          slowly deprecate old name.
       - private: whether or not the service is deemed private
       - verbose_name: human-friendly singular name for the service
-      - thread_pool: thread pool to use for threaded methods
+      - thread_pool: thread pool to use for threaded methods (or name of an isolated thread pool, see
+                     `Middleware.get_thread_pool`)
       - process_pool: process pool to run service methods
 
     """
@@ -282,28 +286,17 @@ class Service(object, metaclass=ServiceBase):
 
 
 class ServiceChangeMixin:
-    async def _service_change(self, service, verb):
-
-        svc_state = (await self.middleware.call(
-            'service.query',
-            [('service', '=', service)],
-            {'get': True}
-        ))['state'].lower()
-
-        # For now its hard to keep track of which services change rc.conf.
-        # To be safe run this every time any service is updated.
-        # This adds up ~180ms so its seems a reasonable workaround for the time being.
-        await self.middleware.call('etc.generate', 'rc')
-
-        if svc_state == 'running':
-            started = await self.middleware.call(f'service.{verb}', service)
-
-            if not started:
-                raise CallError(
-                    f'The {service} service failed to start',
-                    CallError.ESERVICESTARTFAILURE,
-                    [service],
-                )
+    async def _service_change(self, service, verb, flush=False):
+        """
+        Reloads or restarts `service` (depending on `verb`) if it is running.
+
+        The change is applied in the background shortly after so that changes made in a row are coalesced (see
+        `service.schedule_change`). Use `flush=True` to wait for it to be applied.
+        """
+        await self.middleware.call('service.schedule_change', service, verb)
+
+        if flush:
+            await self.middleware.call('service.flush_changes', [service])
 
 
 class CompoundService(Service):
@@ -368,14 +361,14 @@ class ConfigService(ServiceChangeMixin, Service):
     @private
     async def _get_or_insert(self, datastore, options):
         try:
-            return await self.middleware.call('datastore.config', datastore, options)
+            return await self.middleware.call('datastore.config', datastore, options.copy(), trusted=True)
         except IndexError:
             async with get_or_insert_lock:
                 try:
-                    return await self.middleware.call('datastore.config', datastore, options)
+                    return await self.middleware.call('datastore.config', datastore, options.copy(), trusted=True)
                 except IndexError:
                     await self.middleware.call('datastore.insert', datastore, {})
-                    return await self.middleware.call('datastore.config', datastore, options)
+                    return await self.middleware.call('datastore.config', datastore, options.copy(), trusted=True)
 
 
 class SystemServiceService(ConfigService):
@@ -401,7 +394,9 @@ class SystemServiceService(ConfigService):
                                    f'services.{self._config.service_model or self._config.service}', old['id'], new,
                                    {'prefix': self._config.datastore_prefix})
 
-        fut = self._service_change(self._config.service, verb or self._config.service_verb)
+        fut = self._service_change(
+            self._config.service, verb or self._config.service_verb, flush=self._config.service_verb_sync,
+        )
         if self._config.service_verb_sync:
             await fut
         else:
@@ -454,14 +449,14 @@ class CRUDService(ServiceChangeMixin, Service):
             datastore_options.pop('count', None)
             datastore_options.pop('get', None)
             result = await self.middleware.call(
-                'datastore.query', self._config.datastore, [], datastore_options
+                'datastore.query', self._config.datastore, [], datastore_options, trusted=True,
             )
             return await self.middleware.run_in_thread(
                 filter_list, result, filters, options
             )
         else:
             return await self.middleware.call(
-                'datastore.query', self._config.datastore, filters, options,
+                'datastore.query', self._config.datastore, filters, options, trusted=True,
             )
 
     @pass_app(rest=True)
@@ -596,7 +591,7 @@ class SharingTaskService(CRUDService):
     @private
     async def sharing_task_extend_context(self, extra):
         return {
-            'locked_datasets': await self.middleware.call('zfs.dataset.locked_datasets'),
+            'locked_datasets': await self.middleware.call('zfs.mountpoints.locked_datasets'),
             'service_extend': (await self.middleware.call(self._config.datastore_extend_context, extra))
             if self._config.datastore_extend_context else {}
         }
@@ -610,9 +605,7 @@ class SharingTaskService(CRUDService):
 
     @private
     async def sharing_task_determine_locked(self, data, locked_datasets):
-        return await self.middleware.call(
-            'pool.dataset.path_in_locked_datasets', data[self.path_field], locked_datasets
-        )
+        return path_in_locked_datasets(data[self.path_field], locked_datasets)
 
     @private
     async def sharing_task_extend(self, data, context):
@@ -621,9 +614,7 @@ class SharingTaskService(CRUDService):
         if self._config.datastore_extend:
             data = await self.middleware.call(self._config.datastore_extend, *args)
 
-        data[self.locked_field] = await self.middleware.call(
-            f'{self._config.namespace}.sharing_task_determine_locked', data, context['locked_datasets']
-        )
+        data[self.locked_field] = await self.sharing_task_determine_locked(data, context['locked_datasets'])
 
         return data
 
@@ -1223,6 +1214,65 @@ class CoreService(Service):
     async def profile(self, method, params=None):
         return await self.middleware.call(method, *(params or []), profile=True)
 
+    @filterable
+    def method_stats(self, filters=None, options=None):
+        """
+        Get calls count, errors count, throughput and latency histogram (in seconds) of every method called since
+        middleware start (or last statistics reset).
+
+        Statistics are split by `executor` where the method was run: `loop` (event loop), `thread` (thread pool),
+        `process` (process pool) or `job`.
+        """
+        return filter_list(self.middleware.method_stats.dump(), filters, options)
+
+    @private
+    def method_stats_reset(self):
+        self.middleware.method_stats.reset()
+
+    @private
+    async def call_overhead(self, method, params=None, iterations=1000, profile=False):
+        """
+        Benchmark per-call overhead (in microseconds) of calling `method` `iterations` times through regular and
+        trusted internal call paths.
+
+        When `profile` is set, cProfile statistics of both runs are returned instead.
+        """
+        params = params or []
+
+        async def run(trusted):
+            # Trusted calls are allowed to modify arguments so each call must be given its own copy
+            calls_params = [copy.deepcopy(params) for i in range(iterations)]
+            start = time.perf_counter()
+            for call_params in calls_params:
+                await self.middleware.call(method, *call_params, trusted=trusted)
+            return (time.perf_counter() - start) / iterations * 1e6
+
+        if profile:
+            return {
+                'regular': await profile_wrap(run)(False),
+                'trusted': await profile_wrap(run)(True),
+            }
+
+        return {
+            'regular': await run(False),
+            'trusted': await run(True),
+        }
+
+    @filterable
+    def thread_pools(self, filters=None, options=None):
+        """
+        Get workers count, queue depth, saturation and queue wait time statistics of middleware thread pools.
+        """
+        return filter_list([pool.stats() for pool in self.middleware.get_thread_pools()], filters, options)
+
+    @private
+    def loop_lag(self, limit=None):
+        """
+        Returns event loop lag histogram (in seconds) and the worst recorded loop blockages (`limit` of them) along
+        with the stack and service method that caused them.
+        """
+        return self.middleware.loop_lag.stats(limit)
+
     @private
     def threads_stacks(self):
         return get_threads_stacks()
@@ -0,0 +1,161 @@
+from collections import namedtuple, OrderedDict
+import sys
+import threading
+import time
+
+CacheEntry = namedtuple('CacheEntry', ['value', 'timeout', 'size'])
+
+
+def approximate_size(obj, max_depth=8):
+    """
+    Returns an approximate amount of memory (in bytes) held by `obj`.
+
+    Containers are walked recursively (up to `max_depth` levels deep), objects referenced
+    more than once are only accounted for once.
+    """
+    seen = set()
+
+    def walk(o, depth):
+        if id(o) in seen:
+            return 0
+        seen.add(id(o))
+
+        size = sys.getsizeof(o, 0)
+        if depth >= max_depth:
+            return size
+
+        if isinstance(o, dict):
+            size += sum(walk(k, depth + 1) + walk(v, depth + 1) for k, v in o.items())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            size += sum(walk(i, depth + 1) for i in o)
+        elif hasattr(o, '__dict__'):
+            size += walk(o.__dict__, depth + 1)
+
+        return size
+
+    return walk(obj, 0)
+
+
+class LRUCache:
+    """
+    Thread-safe key/value cache with per-entry TTL and LRU eviction.
+
+    `max_entries` and `max_bytes` bound the cache size (`None` meaning unbounded), least recently used
+    entries are evicted once any of the limits is exceeded. Expired entries are removed either lazily when
+    accessed or actively by calling `expire`.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __contains__(self, key):
+        with self.lock:
+            return self._get_entry(key, time.monotonic(), False) is not None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Raises:
+            KeyError: not found in the cache or has expired
+        """
+        with self.lock:
+            entry = self._get_entry(key, time.monotonic(), True)
+            if entry is None:
+                self.misses += 1
+                raise KeyError(key)
+
+            self.hits += 1
+            return entry.value
+
+    def put(self, key, value, timeout=0):
+        size = approximate_size(value)
+        with self.lock:
+            self._remove(key)
+
+            self.entries[key] = CacheEntry(value, time.monotonic() + timeout if timeout > 0 else 0, size)
+            self.bytes += size
+
+            self._evict()
+
+    def pop(self, key):
+        with self.lock:
+            entry = self._get_entry(key, time.monotonic(), False)
+            self._remove(key)
+
+        if entry is not None:
+            return entry.value
+
+    def expire(self):
+        """
+        Removes all expired entries and returns their count.
+        """
+        now = time.monotonic()
+        with self.lock:
+            expired = [key for key, entry in self.entries.items() if 0 < entry.timeout <= now]
+            for key in expired:
+                self._remove(key)
+
+            self.expirations += len(expired)
+            return len(expired)
+
+    def resize(self, max_entries=None, max_bytes=None):
+        with self.lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+
+            self._evict()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+    def _get_entry(self, key, now, touch):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        if 0 < entry.timeout <= now:
+            self._remove(key)
+            self.expirations += 1
+            return None
+
+        if touch:
+            self.entries.move_to_end(key)
+
+        return entry
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def _evict(self):
+        # The most recently inserted entry is never evicted, even if it alone exceeds `max_bytes`
+        while len(self.entries) > 1 and (
+            (self.max_entries is not None and len(self.entries) > self.max_entries) or
+            (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            key, entry = self.entries.popitem(last=False)
+            self.bytes -= entry.size
+            self.evictions += 1
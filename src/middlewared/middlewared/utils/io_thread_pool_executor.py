@@ -4,6 +4,7 @@ import logging
 import queue
 import random
 import threading
+import time
 
 import middlewared.utils.osc as osc
 
@@ -16,6 +17,7 @@ class WorkItem(object):
         self.fn = fn
         self.args = args
         self.kwargs = kwargs
+        self.submitted = time.monotonic()
 
     def run(self):
         if not self.future.set_running_or_notify_cancel():
@@ -61,15 +63,36 @@ class Worker:
 
 
 class IoThreadPoolExecutor(_base.Executor):
-    def __init__(self, thread_name_prefix, min_workers):
+    """
+    Thread pool that starts a new worker whenever a work item is submitted and there are no free workers (up to
+    `max_workers`, `None` meaning unbounded) and shuts down idle workers.
+
+    The number of idle workers kept alive adapts between `min_workers` and `max_workers` based on how long work
+    items wait in the queue before being picked up (exponentially weighted moving average): while it exceeds
+    `target_wait` seconds, idle workers are kept around instead of being shut down.
+    """
+
+    ewma_weight = 0.1
+
+    def __init__(self, thread_name_prefix, min_workers, max_workers=None, target_wait=0.05):
         self.thread_name_prefix = thread_name_prefix
         self.counter = itertools.count()
 
         self.work_queue = queue.Queue()
 
         self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.target_wait = target_wait
+        self.keep_workers = min_workers
         self.workers = []
         self.workers_busy_lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.saturated = 0
+        self.wait_ewma = 0.0
+        self.wait_max = 0.0
+
         for i in range(self.min_workers):
             self._start_worker()
 
@@ -81,10 +104,15 @@ class IoThreadPoolExecutor(_base.Executor):
 
         start_worker = False
         with self.workers_busy_lock:
+            self.submitted += 1
             if not any([not worker.busy for worker in self.workers]):
-                logger.trace("Starting new worker in namespace %r because there are no free workers",
-                             self.thread_name_prefix)
-                start_worker = True
+                if self.max_workers is None or len(self.workers) < self.max_workers:
+                    logger.trace("Starting new worker in namespace %r because there are no free workers",
+                                 self.thread_name_prefix)
+                    start_worker = True
+                else:
+                    # Work item will have to wait for a worker to become free
+                    self.saturated += 1
         if start_worker:
             self._start_worker()
 
@@ -96,12 +124,14 @@ class IoThreadPoolExecutor(_base.Executor):
 
     def get_work_item(self, worker):
         with self.workers_busy_lock:
+            if worker.busy:
+                self.completed += 1
             worker.busy = False
 
         while True:
             timeout = None
             free_workers = sum([1 for worker in self.workers if not worker.busy])
-            if free_workers > self.min_workers:
+            if free_workers > self.keep_workers:
                 logger.trace("Will probably need to shutdown %r because there are %d free workers",
                              worker, free_workers)
                 timeout = random.uniform(4.0, 6.0)
@@ -111,7 +141,7 @@ class IoThreadPoolExecutor(_base.Executor):
             except queue.Empty:
                 with self.workers_busy_lock:
                     free_workers = sum([1 for worker in self.workers if not worker.busy])
-                    if free_workers > self.min_workers:
+                    if free_workers > self.keep_workers:
                         logger.trace("Shutting down %r because there are %d free workers", worker, free_workers)
                         self.remove_worker(worker)
                         return None
@@ -121,9 +151,38 @@ class IoThreadPoolExecutor(_base.Executor):
             else:
                 with self.workers_busy_lock:
                     worker.busy = True
+                    self._record_wait(time.monotonic() - work_item.submitted)
 
                 return work_item
 
+    def _record_wait(self, wait):
+        self.wait_ewma += self.ewma_weight * (wait - self.wait_ewma)
+        self.wait_max = max(self.wait_max, wait)
+
+        if self.wait_ewma > self.target_wait:
+            self.keep_workers = min(self.keep_workers + 1, self.max_workers or len(self.workers))
+        elif self.wait_ewma < self.target_wait / 2:
+            self.keep_workers = max(self.keep_workers - 1, self.min_workers)
+
+    def stats(self):
+        with self.workers_busy_lock:
+            busy = sum([1 for worker in self.workers if worker.busy])
+            return {
+                'name': self.thread_name_prefix,
+                'workers': len(self.workers),
+                'busy_workers': busy,
+                'min_workers': self.min_workers,
+                'max_workers': self.max_workers,
+                'keep_workers': self.keep_workers,
+                'queue_depth': self.work_queue.qsize(),
+                'saturation': busy / self.max_workers if self.max_workers else None,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'saturated': self.saturated,
+                'wait_ewma': self.wait_ewma,
+                'wait_max': self.wait_max,
+            }
+
     def remove_worker(self, worker):
         try:
             self.workers.remove(worker)
@@ -0,0 +1,124 @@
+import bisect
+import heapq
+import itertools
+import logging
+import re
+import sys
+import threading
+import time
+import traceback
+
+from middlewared.utils import osc
+
+logger = logging.getLogger(__name__)
+
+# Loop lag histogram buckets upper bounds (in seconds), last bucket holds everything slower
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)
+
+
+class LoopMonitor:
+    """
+    Measures event loop lag by periodically scheduling a callback in the loop and timing how long it takes for it
+    to run.
+
+    When the loop has not run the callback for `threshold` seconds the loop thread stack is captured, attributed to
+    the service method that is currently running and kept if it is one of the `max_offenders` worst offenders.
+    """
+
+    ignore_frames = (
+        (
+            re.compile(r'\s+File ".+/middlewared/main\.py", line [0-9]+, in run_in_thread\s+'
+                       'return await self.loop.run_in_executor'),
+            'run_in_thread'
+        ),
+    )
+
+    def __init__(self, interval=0.5, threshold=2, max_offenders=50):
+        self.interval = interval
+        self.threshold = threshold
+
+        self.lock = threading.Lock()
+        self.histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.max_offenders = max_offenders
+        # Min-heap of `(lag, sequence number, offender)` so the mildest offender is the one that is evicted
+        self.offenders = []
+        self.offenders_seq = itertools.count()
+
+    def run(self, loop, loop_thread_id):
+        osc.set_thread_name('loop_monitor')
+        while True:
+            time.sleep(self.interval)
+
+            event = threading.Event()
+            start = time.monotonic()
+            loop.call_soon_threadsafe(event.set)
+
+            offender = None
+            while not event.wait(self.threshold):
+                if offender is None:
+                    offender = self.capture(loop_thread_id)
+
+            lag = time.monotonic() - start
+            self.record(lag, offender)
+
+    def capture(self, loop_thread_id):
+        frame = sys._current_frames().get(loop_thread_id)
+        if frame is None:
+            return None
+
+        stack = traceback.format_stack(frame, limit=10)
+        method = self.get_method_name(frame)
+        for regex, name in self.ignore_frames:
+            if any(regex.match(s) for s in stack):
+                logger.warning('%s seems to be blocking event loop', name)
+                break
+        else:
+            logger.warning(''.join([f'Task seems blocked ({method or "unknown method"}):\n'] + stack))
+
+        return {
+            'time': time.time(),
+            'method': method,
+            'stack': stack,
+        }
+
+    def get_method_name(self, frame):
+        # Lazy import to avoid circular dependency
+        from middlewared.service import Service
+
+        while frame is not None:
+            obj = frame.f_locals.get('self')
+            if isinstance(obj, Service):
+                return f'{obj._config.namespace}.{frame.f_code.co_name}'
+            frame = frame.f_back
+
+    def record(self, lag, offender=None):
+        with self.lock:
+            self.count += 1
+            self.total += lag
+            if lag > self.max:
+                self.max = lag
+            self.histogram[bisect.bisect_left(HISTOGRAM_BUCKETS, lag)] += 1
+
+            if offender is not None:
+                offender['lag'] = lag
+                item = (lag, next(self.offenders_seq), offender)
+                if len(self.offenders) < self.max_offenders:
+                    heapq.heappush(self.offenders, item)
+                else:
+                    heapq.heappushpop(self.offenders, item)
+
+    def stats(self, limit=None):
+        with self.lock:
+            return {
+                'samples': self.count,
+                'average_lag': self.total / self.count if self.count else 0,
+                'max_lag': self.max,
+                'histogram': [
+                    {'le': le, 'count': count}
+                    for le, count in zip(HISTOGRAM_BUCKETS + (None,), self.histogram)
+                ],
+                'offenders': [offender for lag, seq, offender in sorted(self.offenders, reverse=True)[:limit]],
+            }
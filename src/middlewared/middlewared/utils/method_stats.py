@@ -0,0 +1,85 @@
+import bisect
+from collections import defaultdict
+import threading
+import time
+
+# Latency histogram buckets upper bounds (in seconds), last bucket holds everything slower
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+
+
+class MethodStat:
+    __slots__ = ('calls', 'errors', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+
+class MethodStatMeasure:
+    __slots__ = ('stats', 'name', 'executor', 'start')
+
+    def __init__(self, stats, name, executor):
+        self.stats = stats
+        self.name = name
+        self.executor = executor
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stats.record(self.name, self.executor, time.monotonic() - self.start, exc_type is not None)
+
+
+class MethodStats:
+    """
+    Per-method (and per-executor type) call counters and latency histograms.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = defaultdict(MethodStat)
+        self.started = time.monotonic()
+
+    def measure(self, name, executor):
+        return MethodStatMeasure(self, name, executor)
+
+    def record(self, name, executor, duration, error=False):
+        with self.lock:
+            stat = self.stats[(name, executor)]
+            stat.calls += 1
+            if error:
+                stat.errors += 1
+            stat.total += duration
+            if duration > stat.max:
+                stat.max = duration
+            stat.histogram[bisect.bisect_left(HISTOGRAM_BUCKETS, duration)] += 1
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.started = time.monotonic()
+
+    def dump(self):
+        with self.lock:
+            uptime = max(time.monotonic() - self.started, 1e-9)
+            return [
+                {
+                    'method': name,
+                    'executor': executor,
+                    'calls': stat.calls,
+                    'errors': stat.errors,
+                    'calls_per_second': stat.calls / uptime,
+                    'total_time': stat.total,
+                    'average_time': stat.total / stat.calls,
+                    'max_time': stat.max,
+                    'histogram': [
+                        {'le': le, 'count': count}
+                        for le, count in zip(HISTOGRAM_BUCKETS + (None,), stat.histogram)
+                    ],
+                }
+                for (name, executor), stat in self.stats.items()
+            ]
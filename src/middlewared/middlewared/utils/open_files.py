@@ -0,0 +1,107 @@
+import bisect
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+PROC = '/proc'
+DELETED_SUFFIX = ' (deleted)'
+
+
+def process_open_files(pid, proc=PROC):
+    """
+    Returns command name and paths of all files opened by process `pid` (including its current and root directories,
+    executable and memory mapped files) or `None` if the process has exited.
+    """
+    base = os.path.join(proc, str(pid))
+    try:
+        with open(os.path.join(base, 'comm')) as f:
+            name = f.read().rstrip('\n')
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+
+    paths = set()
+    for link in ('cwd', 'root', 'exe'):
+        try:
+            paths.add(os.readlink(os.path.join(base, link)))
+        except OSError:
+            pass
+
+    try:
+        fds = os.listdir(os.path.join(base, 'fd'))
+    except OSError:
+        fds = []
+    for fd in fds:
+        try:
+            paths.add(os.readlink(os.path.join(base, 'fd', fd)))
+        except OSError:
+            pass
+
+    try:
+        with open(os.path.join(base, 'maps')) as f:
+            for line in f:
+                # address perms offset dev inode pathname
+                fields = line.split(maxsplit=5)
+                if len(fields) == 6:
+                    paths.add(fields[5].rstrip('\n'))
+    except OSError:
+        pass
+
+    # Deleted files are reported as `/path (deleted)`, sockets, pipes and anonymous mappings are not paths at all
+    return name, {
+        path[:-len(DELETED_SUFFIX)] if path.endswith(DELETED_SUFFIX) else path
+        for path in paths
+        if path.startswith('/')
+    }
+
+
+class OpenFilesIndex:
+    """
+    Paths of all files opened by all processes in the system, sorted so processes that have files open under a
+    specific directory can be found with a binary search.
+    """
+
+    def __init__(self, files):
+        self.created = time.monotonic()
+        self.names = {}
+        self.files = []
+        for pid, (name, paths) in files.items():
+            self.names[pid] = name
+            self.files.extend((path, pid) for path in paths)
+
+        self.files.sort()
+        self.paths = [path for path, pid in self.files]
+
+    @classmethod
+    def scan(cls, proc=PROC, workers=8):
+        pids = [int(pid) for pid in os.listdir(proc) if pid.isdigit()]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            files = dict(zip(pids, executor.map(lambda pid: process_open_files(pid, proc), pids, chunksize=64)))
+
+        return cls({pid: data for pid, data in files.items() if data is not None})
+
+    def age(self):
+        return time.monotonic() - self.created
+
+    def processes(self, dirs):
+        """
+        Returns `{pid: name}` of processes that have files open in any of `dirs` (or the `dirs` themselves).
+        """
+        result = {}
+        for dir in dirs:
+            dir = os.path.normpath(dir)
+            prefix = dir.rstrip('/') + '/'
+
+            i = bisect.bisect_left(self.paths, dir)
+            while i < len(self.paths) and self.paths[i] == dir:
+                pid = self.files[i][1]
+                result[pid] = self.names[pid]
+                i += 1
+
+            # All paths that start with `prefix` are contiguous in the sorted list
+            i = bisect.bisect_left(self.paths, prefix)
+            while i < len(self.paths) and self.paths[i].startswith(prefix):
+                pid = self.files[i][1]
+                result[pid] = self.names[pid]
+                i += 1
+
+        return result
@@ -4,9 +4,16 @@ import os
 
 logger = logging.getLogger(__name__)
 
-__all__ = ["is_child"]
+__all__ = ["is_child", "path_in_locked_datasets"]
 
 
 def is_child(child: str, parent: str):
     rel = os.path.relpath(child, parent)
     return rel == "." or not rel.startswith("..")
+
+
+def path_in_locked_datasets(path: str, locked_datasets: list):
+    """
+    Whether `path` is located in any of `locked_datasets` (as returned by `zfs.dataset.locked_datasets`).
+    """
+    return any(is_child(path, d["mountpoint"]) for d in locked_datasets if d["mountpoint"])
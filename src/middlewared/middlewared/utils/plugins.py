@@ -77,6 +77,7 @@ class LoadPluginsMixin(object):
         self._schemas = Schemas()
         self._services = {}
         self._services_aliases = {}
+        self._method_lookup_cache = {}
 
     def _load_plugins(self, on_module_begin=None, on_module_end=None, on_modules_loaded=None):
         from middlewared.service import Service, CompoundService, ABSTRACT_SERVICES
@@ -131,6 +132,7 @@ class LoadPluginsMixin(object):
         resolve_methods(self._schemas, to_resolve)
 
     def add_service(self, service):
+        self._method_lookup_cache.clear()
         self._services[service._config.namespace] = service
         if service._config.namespace_alias:
             self._services_aliases[service._config.namespace_alias] = service
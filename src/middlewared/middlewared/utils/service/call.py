@@ -10,7 +10,16 @@ __all__ = ["ServiceCallMixin"]
 
 
 class ServiceCallMixin:
+    # Must be provided by child class, `None` disables method lookup caching
+    _method_lookup_cache = None
+
     def _method_lookup(self, name):
+        if self._method_lookup_cache is not None:
+            try:
+                return self._method_lookup_cache[name]
+            except KeyError:
+                pass
+
         if '.' not in name:
             raise CallError('Invalid method name', errno.EBADMSG)
 
@@ -26,4 +35,7 @@ class ServiceCallMixin:
         except AttributeError:
             raise CallError(f'Method {method_name!r} not found in {service!r}', CallError.ENOMETHOD)
 
+        if self._method_lookup_cache is not None:
+            self._method_lookup_cache[name] = serviceobj, methodobj
+
         return serviceobj, methodobj